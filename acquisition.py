@@ -0,0 +1,85 @@
+import threading
+import queue
+import time
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# What to do when the consumer falls behind and the frame queue is full
+OVERFLOW_DROP_OLDEST = 'drop-oldest' # Discard the oldest queued frame so serial reads never stall
+OVERFLOW_BLOCK = 'block' # Wait for space in the queue, the OS serial buffer absorbs the backlog
+
+# Background thread that owns the data port. It does nothing but read complete raw frames with a
+# UARTFramer and push (hostTimestamp, frameData) tuples into a bounded queue, so slow consumer
+# stages (parsing, fall detection, printing, writing files) can never stall serial reads.
+class FrameAcquisitionThread(threading.Thread):
+    def __init__(self, framer, maxQueueSize=64, overflowPolicy=OVERFLOW_DROP_OLDEST):
+        threading.Thread.__init__(self, name='FrameAcquisition', daemon=True)
+        if (overflowPolicy not in (OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK)):
+            raise ValueError('Unknown overflow policy: %s' % (overflowPolicy))
+        self.framer = framer
+        self.overflowPolicy = overflowPolicy
+        self.frameQueue = queue.Queue(maxsize=maxQueueSize)
+        self.stopEvent = threading.Event()
+
+        # Counters
+        self.framesProduced = 0
+        self.framesDropped = 0
+        self.maxQueueDepth = 0
+        self.readTimeouts = 0
+
+    def run(self):
+        while (not self.stopEvent.is_set()):
+            frameData = self.framer.readFrame()
+            if (frameData is None):
+                # readFrame already logged the timeout
+                self.readTimeouts += 1
+                continue
+            self.framesProduced += 1
+            self._put((time.time(), frameData))
+
+    def _put(self, item):
+        if (self.overflowPolicy == OVERFLOW_BLOCK):
+            # Wake up periodically so stop() is honoured while the consumer is stalled
+            while (not self.stopEvent.is_set()):
+                try:
+                    self.frameQueue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+        else:
+            while True:
+                try:
+                    self.frameQueue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.frameQueue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    self.framesDropped += 1
+                    if (self.framesDropped == 1 or self.framesDropped % 100 == 0):
+                        log.warning('Frame queue full, %d frames dropped so far' % (self.framesDropped))
+        self.maxQueueDepth = max(self.maxQueueDepth, self.frameQueue.qsize())
+
+    # Get the next (hostTimestamp, frameData) tuple. Raises queue.Empty if timeout expires first
+    def get(self, timeout=None):
+        return self.frameQueue.get(timeout=timeout)
+
+    def getQueueDepth(self):
+        return self.frameQueue.qsize()
+
+    def getStats(self):
+        return {
+            'framesProduced': self.framesProduced,
+            'framesDropped': self.framesDropped,
+            'queueDepth': self.frameQueue.qsize(),
+            'maxQueueDepth': self.maxQueueDepth,
+            'queueCapacity': self.frameQueue.maxsize,
+            'readTimeouts': self.readTimeouts,
+        }
+
+    def stop(self, timeout=None):
+        self.stopEvent.set()
+        self.join(timeout)
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from parseFrame import parseStandardFrame
+from uart_framer import UARTFramer
+
+# asyncio front end for a connected UARTParser, so one event loop can serve serial ingestion,
+# alert dispatch and local socket consumers without a thread per concern:
+#
+#     radar = AsyncRadar(parser)
+#     async for outputDict in radar.frames():
+#         ...
+#
+# On POSIX the data port's file descriptor is registered with the event loop (add_reader) and only
+# read when the OS says bytes are waiting, so the loop never blocks in serial.read. Where the loop
+# has no reader support (eg. the Windows proactor loop) blocking framer reads run in an executor instead.
+# Parsing runs in an executor by default so a large frame doesn't hold up the other tasks.
+class AsyncRadar():
+    def __init__(self, parser, executor=None, offloadParsing=True, parseFunction=parseStandardFrame, maxQueueSize=64):
+        self.parser = parser
+        self.port = parser.dataCom
+        if (parser.dataFramer is None):
+            parser.dataFramer = UARTFramer(self.port)
+        self.framer = parser.dataFramer
+        self.executor = executor
+        self.offloadParsing = offloadParsing
+        self.parseFunction = parseFunction
+        self.maxQueueSize = maxQueueSize
+        self.frameQueue = None
+        self.loop = None
+        self.readerTask = None
+        self.usingReader = False
+        self.closed = False
+
+        # Counters
+        self.framesDropped = 0
+
+    def start(self):
+        if (self.loop is not None):
+            return
+        self.loop = asyncio.get_running_loop()
+        self.frameQueue = asyncio.Queue(maxsize=self.maxQueueSize)
+        try:
+            self.loop.add_reader(self.port.fileno(), self._onReadable)
+            self.usingReader = True
+        except (NotImplementedError, AttributeError, ValueError):
+            log.info('Event loop cannot watch the serial port, reading it from an executor instead')
+            self.readerTask = self.loop.create_task(self._readInExecutor())
+
+    def close(self):
+        self.closed = True
+        if (self.loop is None):
+            return
+        if (self.usingReader):
+            self.loop.remove_reader(self.port.fileno())
+            self.usingReader = False
+        if (self.readerTask is not None):
+            self.readerTask.cancel()
+        self._put((time.time(), None)) # Wake up any consumer waiting on the queue
+
+    # Reader callback, only called when data is waiting so os.read returns immediately
+    def _onReadable(self):
+        try:
+            data = os.read(self.port.fileno(), 65536)
+        except OSError as e:
+            data = b''
+            log.error('Serial port read failed: %s' % (e))
+        if (len(data) == 0):
+            # The port went away (eg. USB unplugged), stop watching it
+            log.error('Serial port closed')
+            self.close()
+            return
+        self.framer.feed(data)
+        frameData = self.framer.nextFrame()
+        while (frameData is not None):
+            self._put((time.time(), frameData))
+            frameData = self.framer.nextFrame()
+
+    async def _readInExecutor(self):
+        while (not self.closed):
+            frameData = await self.loop.run_in_executor(self.executor, self.framer.readFrame)
+            if (frameData is not None):
+                self._put((time.time(), frameData))
+
+    # Never wait on the consumer, drop the oldest frame instead
+    def _put(self, item):
+        while True:
+            try:
+                self.frameQueue.put_nowait(item)
+                return
+            except asyncio.QueueFull:
+                self.frameQueue.get_nowait()
+                self.framesDropped += 1
+                if (self.framesDropped == 1 or self.framesDropped % 100 == 0):
+                    log.warning('Async frame queue full, %d frames dropped so far' % (self.framesDropped))
+
+    # Yield (hostTimestamp, frameData) for every complete raw frame
+    async def rawFrames(self):
+        self.start()
+        while True:
+            timestamp, frameData = await self.frameQueue.get()
+            if (frameData is None):
+                return
+            yield timestamp, frameData
+
+    # Yield the parsed output dict of every frame
+    async def frames(self):
+        async for timestamp, frameData in self.rawFrames():
+            if (self.offloadParsing):
+                outputDict = await self.loop.run_in_executor(self.executor, self.parseFunction, frameData)
+            else:
+                outputDict = self.parseFunction(frameData)
+            yield outputDict
+
+    def getStats(self):
+        stats = self.framer.getStats()
+        stats['framesDropped'] = self.framesDropped
+        stats['queueDepth'] = self.frameQueue.qsize() if self.frameQueue is not None else 0
+        return stats
@@ -0,0 +1,350 @@
+import struct
+import math
+import sys
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from tlv_defines import *
+from parseTLVs import POINT_DTYPE, POINT_EXT_DTYPE, SIDE_INFO_DTYPE, SPHERICAL_POINT_DTYPE, COMPRESSED_SPHERICAL_POINT_DTYPE, \
+    TRACK_DTYPE, TRACK_2D_DTYPE, TRACK_HEIGHT_DTYPE, countPoints
+from parseFrame import FRAME_HEADER_STRUCT, TLV_HEADER_STRUCT
+from uart_framer import UARTFramer
+from replay import ReplaySource, REPLAY_UNTHROTTLED
+
+# Batch parsing for offline analysis. Instead of one parseStandardFrame call (and one outputDict) per frame,
+# a whole recording is turned into a handful of columnar tables:
+#
+#     batch = parseCapture('binData/<timestamp>')
+#     batch['frames']     one row per frame: frameNum, timestamp, timeCPUCycles, numDetectedObj, error
+#     batch['points']     every point of every frame: frame, x, y, z, doppler, snr, noise, track (255 if none)
+#     batch['tracks']     frame, frameNum, tid, x, y, z, velX ... accZ, g, confidence, key (+ ec)
+#     batch['heights']    frame, frameNum, tid, maxZ, minZ
+#     batch['pointOffsets'], batch['trackOffsets'], batch['heightOffsets']
+#                         points of frame i are rows pointOffsets[i]:pointOffsets[i+1], and so on
+#
+# Each table is a dict of equal length 1D numpy arrays. The 'frame' column is the row of the frame in batch['frames'].
+# Only the frame and TLV headers are walked in Python. All TLVs of one type across the batch are joined into
+# one buffer and decoded with a single np.frombuffer call, with the same maths as the per-frame parsers.
+
+# Decompression factors sent at the start of the compressed point cloud TLVs
+POINT_EXT_UNIT_DTYPE = np.dtype([('xyz', '<f4'), ('doppler', '<f4'), ('snr', '<f4'), ('noise', '<f4'), ('reserved', '<i2', (2,))])
+COMPRESSED_POINT_UNIT_DTYPE = np.dtype([('elevation', '<f4'), ('azimuth', '<f4'), ('doppler', '<f4'), ('range', '<f4'), ('snr', '<f4')])
+
+# TLV type -> (unit header dtype or None, point dtype)
+POINT_TLVS = {
+    MMWDEMO_OUTPUT_MSG_DETECTED_POINTS:         (None, POINT_DTYPE),
+    MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS:        (None, SPHERICAL_POINT_DTYPE),
+    MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS:       (COMPRESSED_POINT_UNIT_DTYPE, COMPRESSED_SPHERICAL_POINT_DTYPE),
+    MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS:     (POINT_EXT_UNIT_DTYPE, POINT_EXT_DTYPE)
+}
+SIDE_INFO_TLVS = (MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO,)
+# Point TLVs that carry their own SNR / noise
+SNR_POINT_TLVS = (MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS, MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS)
+NOISE_POINT_TLVS = (MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS,)
+INDEX_TLVS = (MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_INDEX, MMWDEMO_OUTPUT_EXT_MSG_TARGET_INDEX)
+TRACK_TLVS = {
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST:  TRACK_DTYPE,
+    MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST:             TRACK_DTYPE,
+    MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST_2D_BSD:      TRACK_2D_DTYPE
+}
+HEIGHT_TLVS = (MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT,)
+
+POINT_COLUMNS = ('x', 'y', 'z', 'doppler', 'snr', 'noise')
+TRACK_COLUMNS = ('x', 'y', 'z', 'velX', 'velY', 'velZ', 'accX', 'accY', 'accZ', 'g', 'confidence')
+
+# Yield (timestamp, frameData) from a raw buffer, a raw .bin dump, a directory of them, or a capture directory.
+# Raw buffers have no timestamps (nan), raw dumps get the frame period timing ReplaySource reconstructs
+def iterSourceFrames(source):
+    if (isinstance(source, (bytes, bytearray, memoryview))):
+        framer = UARTFramer()
+        framer.feed(source)
+        frameData = framer.nextFrame()
+        while (frameData is not None):
+            yield math.nan, frameData
+            frameData = framer.nextFrame()
+    else:
+        for recordedTime, frameData in ReplaySource(source, REPLAY_UNTHROTTLED):
+            yield recordedTime, frameData
+
+# Concatenated aranges: starts[i] .. starts[i]+counts[i] for every i, without a Python loop
+def _ranges(starts, counts):
+    total = int(counts.sum())
+    if (total == 0):
+        return np.zeros(0, np.int64)
+    ends = np.cumsum(counts)
+    return np.repeat(starts - (ends - counts), counts) + np.arange(total)
+
+# Join the byte ranges of the given frames into one buffer. Each entry of tlvs is (frameView, offset, length)
+def _join(tlvs, rows, headerSize, recordSize, counts):
+    return b''.join(tlvs[row][0][tlvs[row][1] + headerSize:tlvs[row][1] + headerSize + count * recordSize] for row, count in zip(rows, counts))
+
+def _joinHeaders(tlvs, rows, headerSize):
+    return b''.join(tlvs[row][0][tlvs[row][1]:tlvs[row][1] + headerSize] for row in rows)
+
+class _BatchBuilder():
+    def __init__(self, includeCovariance=False):
+        self.includeCovariance = includeCovariance
+        self.frameNums = []
+        self.timestamps = []
+        self.timeCPUCycles = []
+        self.numDetectedObj = []
+        self.errors = []
+        # TLV type -> {frame row: (frameView, payload offset, length)}. Like parseStandardFrame, the last TLV of a type in a frame wins
+        self.tlvs = {}
+
+    # Walk the frame and TLV headers, the only per-frame Python work
+    def addFrame(self, timestamp, frameData):
+        frameView = memoryview(frameData)
+        row = len(self.frameNums)
+        self.timestamps.append(timestamp)
+        try:
+            magic, version, totalPacketLen, platform, frameNum, timeCPUCycles, numDetectedObj, numTLVs, subFrameNum = FRAME_HEADER_STRUCT.unpack_from(frameView, 0)
+        except struct.error:
+            self.frameNums.append(0)
+            self.timeCPUCycles.append(0)
+            self.numDetectedObj.append(0)
+            self.errors.append(1)
+            return
+        self.frameNums.append(frameNum)
+        self.timeCPUCycles.append(timeCPUCycles)
+        self.numDetectedObj.append(numDetectedObj)
+
+        error = 0
+        found = []
+        offset = FRAME_HEADER_STRUCT.size
+        for i in range(numTLVs):
+            try:
+                tlvType, tlvLength = TLV_HEADER_STRUCT.unpack_from(frameView, offset)
+            except struct.error:
+                error = 2
+                found = []
+                break
+            offset += TLV_HEADER_STRUCT.size
+            found.append((tlvType, offset, tlvLength))
+            offset += tlvLength
+        if (error == 0 and 32 * math.ceil(offset / 32) != totalPacketLen):
+            error = 3
+        self.errors.append(error)
+        for tlvType, tlvOffset, tlvLength in found:
+            self.tlvs.setdefault(tlvType, {})[row] = (frameView, tlvOffset, tlvLength)
+
+    # (rows, TLV entries) of every frame holding one of tlvTypes, last type in the frame winning
+    def _frameTLVs(self, tlvTypes):
+        byRow = {}
+        for tlvType in tlvTypes:
+            for row, entry in self.tlvs.get(tlvType, {}).items():
+                # Like parseStandardFrame, the last of these TLVs in the frame wins
+                if (row not in byRow or entry[1] > byRow[row][1][1]):
+                    byRow[row] = (tlvType, entry)
+        return byRow
+
+    def _points(self, numFrames):
+        numDetectedObj = np.asarray(self.numDetectedObj, np.int64)
+        pointTLVs = self._frameTLVs(POINT_TLVS.keys())
+        counts = np.zeros(numFrames, np.int64)
+        for row, (tlvType, (frameView, offset, tlvLength)) in pointTLVs.items():
+            unitDtype, pointDtype = POINT_TLVS[tlvType]
+            headerSize = unitDtype.itemsize if unitDtype is not None else 0
+            counts[row] = countPoints(frameView[offset:offset + tlvLength], tlvLength, headerSize, pointDtype.itemsize, numDetectedObj[row])
+        offsets = np.zeros(numFrames + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        total = int(offsets[-1])
+        points = {'frame': np.repeat(np.arange(numFrames, dtype=np.int64), counts)}
+        for column in POINT_COLUMNS:
+            points[column] = np.zeros(total)
+        points['track'] = np.full(total, 255, np.uint8)
+
+        for tlvType, (unitDtype, pointDtype) in POINT_TLVS.items():
+            rows = np.array([row for row, (rowType, entry) in pointTLVs.items() if rowType == tlvType], np.int64)
+            if (len(rows) == 0):
+                continue
+            entries = dict((row, entry) for row, (rowType, entry) in pointTLVs.items() if rowType == tlvType)
+            rowCounts = counts[rows]
+            headerSize = unitDtype.itemsize if unitDtype is not None else 0
+            records = np.frombuffer(_join(entries, rows, headerSize, pointDtype.itemsize, rowCounts), pointDtype)
+            dest = _ranges(offsets[rows], rowCounts)
+            if (unitDtype is not None):
+                units = np.repeat(np.frombuffer(_joinHeaders(entries, rows, headerSize), unitDtype), rowCounts)
+            self._decodePoints(tlvType, records, units if unitDtype is not None else None, points, dest)
+
+        # SNR and noise for the plain point cloud, in 0.1 dB steps. The TLVs are applied in frame order like
+        # parseStandardFrame does, so a point TLV after the side info keeps the SNR and noise it carries itself
+        for row, (tlvType, (frameView, offset, tlvLength)) in self._frameTLVs(SIDE_INFO_TLVS).items():
+            count = min(countPoints(frameView[offset:offset + tlvLength], tlvLength, 0, SIDE_INFO_DTYPE.itemsize, numDetectedObj[row]), counts[row])
+            sideInfo = np.frombuffer(frameView[offset:offset + count * SIDE_INFO_DTYPE.itemsize], SIDE_INFO_DTYPE)
+            pointType, pointEntry = pointTLVs.get(row, (None, (None, -1, 0)))
+            pointsAfter = pointEntry[1] > offset
+            if (not (pointsAfter and pointType in SNR_POINT_TLVS)):
+                points['snr'][offsets[row]:offsets[row] + count] = sideInfo['snr'] * 0.1
+            if (not (pointsAfter and pointType in NOISE_POINT_TLVS)):
+                points['noise'][offsets[row]:offsets[row] + count] = sideInfo['noise'] * 0.1
+
+        # Track each point was associated with. The target index TLV describes the previous frame's point cloud,
+        # so it is matched to the previous row when that is the previous frame
+        frameNums = self.frameNums
+        for row, (tlvType, (frameView, offset, tlvLength)) in self._frameTLVs(INDEX_TLVS).items():
+            if (row == 0 or frameNums[row - 1] != frameNums[row] - 1):
+                continue
+            count = min(len(frameView) - offset, tlvLength, counts[row - 1])
+            points['track'][offsets[row - 1]:offsets[row - 1] + count] = np.frombuffer(frameView[offset:offset + count], np.uint8)
+        return points, offsets
+
+    # Same maths as the per-frame point cloud parsers in parseTLVs.py
+    def _decodePoints(self, tlvType, records, units, points, dest):
+        if (tlvType == MMWDEMO_OUTPUT_MSG_DETECTED_POINTS):
+            for column in ('x', 'y', 'z', 'doppler'):
+                points[column][dest] = records[column]
+        elif (tlvType == MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS):
+            for column in ('x', 'y', 'z'):
+                points[column][dest] = records[column] * units['xyz'].astype(np.float64)
+            points['doppler'][dest] = records['doppler'] * units['doppler'].astype(np.float64)
+            points['snr'][dest] = records['snr'] * units['snr'].astype(np.float64)
+            points['noise'][dest] = records['noise'] * units['noise'].astype(np.float64)
+        else:
+            if (tlvType == MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS):
+                rng = records['range'].astype(np.float64)
+                azimuth = records['azimuth'].astype(np.float64)
+                elevation = records['elevation'].astype(np.float64)
+                points['doppler'][dest] = records['doppler']
+            else:
+                rng = records['range'] * units['range'].astype(np.float64)
+                azimuth = records['azimuth'] * units['azimuth'].astype(np.float64)
+                elevation = records['elevation'] * units['elevation'].astype(np.float64)
+                points['doppler'][dest] = records['doppler'] * units['doppler'].astype(np.float64)
+                points['snr'][dest] = records['snr'] * units['snr'].astype(np.float64)
+            cosElevation = np.cos(elevation)
+            points['x'][dest] = rng * np.sin(azimuth) * cosElevation
+            points['y'][dest] = rng * np.cos(azimuth) * cosElevation
+            points['z'][dest] = rng * np.sin(elevation)
+
+    def _tracks(self, numFrames, frameNums):
+        trackTLVs = self._frameTLVs(TRACK_TLVS.keys())
+        counts = np.zeros(numFrames, np.int64)
+        for row, (tlvType, (frameView, offset, tlvLength)) in trackTLVs.items():
+            counts[row] = countPoints(frameView[offset:offset + tlvLength], tlvLength, 0, TRACK_TLVS[tlvType].itemsize, sys.maxsize)
+        offsets = np.zeros(numFrames + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        total = int(offsets[-1])
+        frames = np.repeat(np.arange(numFrames, dtype=np.int64), counts)
+        tracks = {'frame': frames, 'frameNum': frameNums[frames], 'tid': np.zeros(total, np.uint32)}
+        for column in TRACK_COLUMNS:
+            # 2D tracks have no Z
+            tracks[column] = np.full(total, np.nan)
+        if (self.includeCovariance):
+            # (N, 4, 4), 2D tracks fill the top left 3x3
+            tracks['ec'] = np.full((total, 4, 4), np.nan, np.float32)
+
+        for trackDtype in (TRACK_DTYPE, TRACK_2D_DTYPE):
+            entries = dict((row, entry) for row, (tlvType, entry) in trackTLVs.items() if TRACK_TLVS[tlvType] is trackDtype)
+            if (len(entries) == 0):
+                continue
+            rows = np.array(sorted(entries.keys()), np.int64)
+            rowCounts = counts[rows]
+            records = np.frombuffer(_join(entries, rows, 0, trackDtype.itemsize, rowCounts), trackDtype)
+            dest = _ranges(offsets[rows], rowCounts)
+            tracks['tid'][dest] = records['tid']
+            axes = ('x', 'y', 'z')[:records['pos'].shape[1]]
+            for i, axis in enumerate(axes):
+                tracks[axis][dest] = records['pos'][:, i]
+                tracks['vel' + axis.upper()][dest] = records['vel'][:, i]
+                tracks['acc' + axis.upper()][dest] = records['acc'][:, i]
+            tracks['g'][dest] = records['g']
+            tracks['confidence'][dest] = records['confidence']
+            if (self.includeCovariance):
+                size = records['ec'].shape[1]
+                tracks['ec'][dest, :size, :size] = records['ec']
+
+        # (frameNum, tid) packed into one sortable key, see findTrackRows
+        tracks['key'] = (tracks['frameNum'].astype(np.uint64) << np.uint64(32)) | tracks['tid'].astype(np.uint64)
+        return tracks, offsets
+
+    def _heights(self, numFrames, frameNums):
+        entries = dict((row, entry) for row, (tlvType, entry) in self._frameTLVs(HEIGHT_TLVS).items())
+        counts = np.zeros(numFrames, np.int64)
+        for row, (frameView, offset, tlvLength) in entries.items():
+            counts[row] = countPoints(frameView[offset:offset + tlvLength], tlvLength, 0, TRACK_HEIGHT_DTYPE.itemsize, sys.maxsize)
+        offsets = np.zeros(numFrames + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        rows = np.array(sorted(entries.keys()), np.int64)
+        records = np.frombuffer(_join(entries, rows, 0, TRACK_HEIGHT_DTYPE.itemsize, counts[rows]), TRACK_HEIGHT_DTYPE)
+        frames = np.repeat(np.arange(numFrames, dtype=np.int64), counts)
+        heights = {
+            'frame': frames,
+            'frameNum': frameNums[frames],
+            'tid': records['tid'].copy(),
+            'maxZ': records['maxZ'].astype(np.float64),
+            'minZ': records['minZ'].astype(np.float64)
+        }
+        return heights, offsets
+
+    def build(self):
+        numFrames = len(self.frameNums)
+        frameNums = np.asarray(self.frameNums, np.uint32)
+        batch = {}
+        batch['frames'] = {
+            'frameNum': frameNums,
+            'timestamp': np.asarray(self.timestamps, np.float64),
+            'timeCPUCycles': np.asarray(self.timeCPUCycles, np.uint32),
+            'numDetectedObj': np.asarray(self.numDetectedObj, np.uint32),
+            'error': np.asarray(self.errors, np.uint8)
+        }
+        batch['points'], batch['pointOffsets'] = self._points(numFrames)
+        batch['tracks'], batch['trackOffsets'] = self._tracks(numFrames, frameNums)
+        batch['heights'], batch['heightOffsets'] = self._heights(numFrames, frameNums)
+        return batch
+
+# Yield batches of framesPerBatch frames, so recordings larger than memory can be processed a piece at a time
+def iterBatches(source, framesPerBatch=50000, includeCovariance=False):
+    builder = _BatchBuilder(includeCovariance)
+    for timestamp, frameData in iterSourceFrames(source):
+        builder.addFrame(timestamp, frameData)
+        if (len(builder.frameNums) >= framesPerBatch):
+            yield builder.build()
+            builder = _BatchBuilder(includeCovariance)
+    if (len(builder.frameNums) > 0):
+        yield builder.build()
+
+# Join batches into one, shifting the frame columns and offsets
+def concatenateBatches(batches):
+    batches = list(batches)
+    if (len(batches) == 0):
+        return _BatchBuilder().build()
+    if (len(batches) == 1):
+        return batches[0]
+    frameBase = np.cumsum([0] + [len(b['frames']['frameNum']) for b in batches[:-1]])
+    batch = {}
+    batch['frames'] = dict((column, np.concatenate([b['frames'][column] for b in batches])) for column in batches[0]['frames'])
+    for table, offsetsKey in (('points', 'pointOffsets'), ('tracks', 'trackOffsets'), ('heights', 'heightOffsets')):
+        batch[table] = {}
+        for column in batches[0][table]:
+            if (column == 'frame'):
+                batch[table][column] = np.concatenate([b[table][column] + base for b, base in zip(batches, frameBase)])
+            else:
+                batch[table][column] = np.concatenate([b[table][column] for b in batches])
+        rowBase = np.cumsum([0] + [b[offsetsKey][-1] for b in batches[:-1]])
+        batch[offsetsKey] = np.concatenate([batches[0][offsetsKey][:1]] + [b[offsetsKey][1:] + base for b, base in zip(batches, rowBase)])
+    return batch
+
+# Parse a whole recording (raw buffer, .bin dump, directory of dumps or capture directory) into columnar tables
+def parseCapture(source, framesPerBatch=50000, includeCovariance=False):
+    return concatenateBatches(iterBatches(source, framesPerBatch, includeCovariance))
+
+# Rows of batch['tracks'] for each (frameNum, tid) pair, -1 where there is no such track.
+# frameNum restarts when the device is reset, so in long recordings the first match is returned
+def findTrackRows(tracks, frameNums, tids):
+    keys = tracks['key']
+    order = np.argsort(keys, kind='stable')
+    sortedKeys = keys[order]
+    queries = (np.asarray(frameNums, np.uint64) << np.uint64(32)) | np.asarray(tids, np.uint64)
+    positions = np.searchsorted(sortedKeys, queries)
+    positions = np.minimum(positions, max(len(sortedKeys) - 1, 0))
+    if (len(sortedKeys) == 0):
+        return np.full(np.shape(queries), -1, np.int64)
+    return np.where(sortedKeys[positions] == queries, order[positions], -1)
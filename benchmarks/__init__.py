@@ -0,0 +1,2 @@
+# Synthetic frame generator (frame_generator.py) and the parser / pipeline benchmark suite (suite.py).
+# Run from the repository root: python -m benchmarks.suite --help
@@ -0,0 +1,272 @@
+import math
+import re
+import struct
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from tlv_defines import *
+from parseTLVs import *
+from parseFrame import parserFunctions, FRAME_HEADER_STRUCT, TLV_HEADER_STRUCT
+from tlv_schema import tlvSchemas
+from uart_framer import UART_MAGIC_WORD
+
+MAGIC_WORD = struct.unpack('Q', UART_MAGIC_WORD)[0]
+FRAME_VERSION = 0x03060000
+PLATFORM_XWR6843 = 0xA6843
+# timeCPUCycles counts at this rate
+CPU_CLOCK_HZ = 200e6
+
+# What the 3D people tracking demo on the IWR6843 sends every frame
+PEOPLE_TRACKING_TLVS = [
+    MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS,
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST,
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_INDEX,
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT,
+    MMWDEMO_OUTPUT_MSG_PRESCENCE_INDICATION
+]
+# Every TLV type parseStandardFrame has a parser for
+ALL_TLVS = sorted(parserFunctions.keys())
+
+# Ways a frame can be damaged on the wire, see FrameGenerator.corrupt
+CORRUPT_FLIP = 'flip'           # a run of random bytes overwritten inside the frame
+CORRUPT_TRUNCATE = 'truncate'   # the frame is cut short and the next one starts straight after
+CORRUPT_NOISE = 'noise'         # garbage bytes on the line before the frame
+CORRUPTION_KINDS = [CORRUPT_FLIP, CORRUPT_TRUNCATE, CORRUPT_NOISE]
+
+# Synthetic radar frames in the wire format parseStandardFrame reads, with plausible values in every TLV.
+#
+#     generator = FrameGenerator(numPoints=150, numTracks=5)
+#     frameData = generator.frame(1)                                  # people tracking TLVs
+#     frameData = generator.frame(2, tlvTypes=ALL_TLVS)               # every TLV type with a parser
+#     stream = generator.stream(1000, corruptionRate=0.01)            # bytes as read from the data port
+#
+# Frames are deterministic for a given seed.
+class FrameGenerator():
+    def __init__(self, numPoints=100, numTracks=4, tlvTypes=PEOPLE_TRACKING_TLVS, framePeriod=55.0, numRangeBins=256, seed=0):
+        self.numPoints = numPoints
+        self.numTracks = numTracks
+        self.tlvTypes = tlvTypes
+        self.framePeriod = framePeriod # ms
+        self.numRangeBins = numRangeBins
+        self.rng = np.random.default_rng(seed)
+
+        # TLV type -> function(numPoints, numTracks) returning the payload
+        self.payloadFunctions = {
+            MMWDEMO_OUTPUT_MSG_DETECTED_POINTS:                     self._points,
+            MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO:           self._sideInfo,
+            MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS:                    self._sphericalPoints,
+            MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS:                   self._compressedPoints,
+            MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS:                 self._extPoints,
+            MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST:          self._tracks,
+            MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST:                     self._tracks,
+            MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST_2D_BSD:              self._tracks2D,
+            MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT:           self._heights,
+            MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_INDEX:            self._trackIndexes,
+            MMWDEMO_OUTPUT_EXT_MSG_TARGET_INDEX:                    self._trackIndexes,
+            MMWDEMO_OUTPUT_MSG_RANGE_PROFILE:                       self._rangeProfile,
+            MMWDEMO_OUTPUT_EXT_MSG_RANGE_PROFILE_MAJOR:             self._rangeProfile,
+            MMWDEMO_OUTPUT_EXT_MSG_RANGE_PROFILE_MINOR:             self._rangeProfile,
+            MMWDEMO_OUTPUT_EXT_MSG_ADC_SAMPLES:                     self._adcSamples,
+            MMWDEMO_OUTPUT_EXT_MSG_CLASSIFIER_INFO:                 self._classifier,
+            MMWDEMO_OUTPUT_EXT_MSG_ENHANCED_PRESENCE_INDICATION:    self._enhancedPresence,
+            MMWDEMO_OUTPUT_MSG_OCCUPANCY_STATE_MACHINE:             self._structPayload(OCC_STATE_MACH_STRUCT),
+            MMWDEMO_OUTPUT_MSG_VITALSIGNS:                          self._vitals,
+            MMWDEMO_OUTPUT_MSG_GESTURE_FEATURES_6843:               self._structPayload(GESTURE_FEATURES_6843_STRUCT),
+            MMWDEMO_OUTPUT_MSG_GESTURE_OUTPUT_PROB_6843:            self._structPayload(GESTURE_PROB_6843_STRUCT),
+            MMWDEMO_OUTPUT_MSG_GESTURE_FEATURES_6432:               self._structPayload(GESTURE_FEATURES_6432_STRUCT),
+            MMWDEMO_OUTPUT_MSG_GESTURE_CLASSIFIER_6432:             self._structPayload(GESTURE_CLASSIFIER_6432_STRUCT),
+            MMWDEMO_OUTPUT_EXT_MSG_VELOCITY:                        self._velocity,
+            MMWDEMO_OUTPUT_EXT_MSG_RX_CHAN_COMPENSATION_INFO:       self._structPayload(RX_CHAN_COMP_STRUCT),
+            MMWDEMO_OUTPUT_MSG_EXT_STATS:                           self._structPayload(EXT_STATS_STRUCT),
+            MMWDEMO_OUTPUT_EXT_MSG_STATS_BSD:                       self._structPayload(EXT_STATS_BSD_STRUCT),
+            MMWDEMO_OUTPUT_EXT_MSG_CAM_TRIGGERS:                    self._camTriggers
+        }
+        for tlvType, schema in tlvSchemas.items():
+            self.payloadFunctions[tlvType] = self._schemaPayload(schema)
+
+    # ================================================== Payloads ==================================================
+
+    def _uniform(self, low, high, count):
+        return self.rng.uniform(low, high, count)
+
+    def _integers(self, low, high, count):
+        return self.rng.integers(low, high, count, endpoint=True)
+
+    def _points(self, numPoints, numTracks):
+        points = np.zeros(numPoints, POINT_DTYPE)
+        points['x'] = self._uniform(-3, 3, numPoints)
+        points['y'] = self._uniform(0.3, 6, numPoints)
+        points['z'] = self._uniform(0, 2.5, numPoints)
+        points['doppler'] = self._uniform(-2, 2, numPoints)
+        return points.tobytes()
+
+    def _sideInfo(self, numPoints, numTracks):
+        sideInfo = np.zeros(numPoints, SIDE_INFO_DTYPE)
+        sideInfo['snr'] = self._integers(50, 600, numPoints)
+        sideInfo['noise'] = self._integers(50, 300, numPoints)
+        return sideInfo.tobytes()
+
+    def _sphericalPoints(self, numPoints, numTracks):
+        points = np.zeros(numPoints, SPHERICAL_POINT_DTYPE)
+        points['range'] = self._uniform(0.3, 6, numPoints)
+        points['azimuth'] = self._uniform(-1, 1, numPoints)
+        points['elevation'] = self._uniform(-0.5, 0.5, numPoints)
+        points['doppler'] = self._uniform(-2, 2, numPoints)
+        return points.tobytes()
+
+    # Units (elevation, azimuth, doppler, range, snr) as sent by the people tracking demo
+    def _compressedPoints(self, numPoints, numTracks):
+        units = COMPRESSED_POINT_UNIT_STRUCT.pack(0.01, 0.01, 0.00028, 0.00025, 0.04)
+        points = np.zeros(numPoints, COMPRESSED_SPHERICAL_POINT_DTYPE)
+        points['elevation'] = self._integers(-50, 50, numPoints)
+        points['azimuth'] = self._integers(-100, 100, numPoints)
+        points['doppler'] = self._integers(-7000, 7000, numPoints)
+        points['range'] = self._integers(1200, 24000, numPoints)
+        points['snr'] = self._integers(100, 2000, numPoints)
+        return units + points.tobytes()
+
+    def _extPoints(self, numPoints, numTracks):
+        units = POINT_EXT_UNIT_STRUCT.pack(0.00025, 0.00028, 0.04, 0.1, 0, 0)
+        points = np.zeros(numPoints, POINT_EXT_DTYPE)
+        points['x'] = self._integers(-12000, 12000, numPoints)
+        points['y'] = self._integers(1200, 24000, numPoints)
+        points['z'] = self._integers(0, 10000, numPoints)
+        points['doppler'] = self._integers(-7000, 7000, numPoints)
+        points['snr'] = self._integers(0, 255, numPoints)
+        points['noise'] = self._integers(0, 255, numPoints)
+        return units + points.tobytes()
+
+    def _trackRecords(self, dtype, numTracks, dimensions):
+        tracks = np.zeros(numTracks, dtype)
+        tracks['tid'] = np.arange(numTracks)
+        tracks['pos'] = self.rng.uniform((-3, 0.3, 0)[:dimensions], (3, 6, 2)[:dimensions], (numTracks, dimensions))
+        tracks['vel'] = self._uniform(-1, 1, (numTracks, dimensions))
+        tracks['acc'] = self._uniform(-0.5, 0.5, (numTracks, dimensions))
+        tracks['ec'] = np.eye(tracks['ec'].shape[-1]) * 0.01
+        tracks['g'] = 3
+        tracks['confidence'] = self._uniform(0.5, 1, numTracks)
+        return tracks.tobytes()
+
+    def _tracks(self, numPoints, numTracks):
+        return self._trackRecords(TRACK_DTYPE, numTracks, 3)
+
+    def _tracks2D(self, numPoints, numTracks):
+        return self._trackRecords(TRACK_2D_DTYPE, numTracks, 2)
+
+    def _heights(self, numPoints, numTracks):
+        heights = np.zeros(numTracks, TRACK_HEIGHT_DTYPE)
+        heights['tid'] = np.arange(numTracks)
+        heights['maxZ'] = self._uniform(1.4, 1.9, numTracks)
+        heights['minZ'] = self._uniform(0, 0.3, numTracks)
+        return heights.tobytes()
+
+    # Track ID per point, 253-255 meaning the point wasn't associated with a track
+    def _trackIndexes(self, numPoints, numTracks):
+        indexes = self._integers(0, numTracks - 1, numPoints) if numTracks > 0 else np.full(numPoints, 255)
+        indexes[self.rng.random(numPoints) < 0.2] = 255
+        return indexes.astype(np.uint8).tobytes()
+
+    def _rangeProfile(self, numPoints, numTracks):
+        return self._integers(0, 1 << 20, self.numRangeBins).astype('<u4').tobytes()
+
+    def _adcSamples(self, numPoints, numTracks):
+        return self._integers(-2048, 2047, 2 * self.numRangeBins).astype('<i2').tobytes()
+
+    def _classifier(self, numPoints, numTracks):
+        return self._integers(0, 128, numTracks * NUM_CLASSES_IN_CLASSIFIER).astype(np.uint8).tobytes()
+
+    # Zone count, then 2 bits per zone
+    def _enhancedPresence(self, numPoints, numTracks):
+        numZones = 8
+        return bytes([numZones]) + self._integers(0, 255, math.ceil(numZones / 4)).astype(np.uint8).tobytes()
+
+    def _vitals(self, numPoints, numTracks):
+        return VITALS_STRUCT.pack(0, 17, *self._uniform(0, 100, VITALS_STRUCT.size // 4 - 1))
+
+    def _velocity(self, numPoints, numTracks):
+        return struct.pack('1f1?', self._uniform(0, 10, 1)[0], True)
+
+    # Bit mask of the active tracks, then 3 more words
+    def _camTriggers(self, numPoints, numTracks):
+        return CAM_TRIGGERS_STRUCT.pack((1 << min(numTracks, 32)) - 1, 0, 0, 0)
+
+    # Payload for a fixed layout struct, filled with small random values of the right type
+    def _structPayload(self, layout):
+        codes = []
+        for count, code in re.findall(r'(\d*)([a-zA-Z?])', layout.format):
+            codes.extend(code * (int(count) if count else 1))
+        def payload(numPoints, numTracks):
+            values = []
+            for code in codes:
+                if (code in 'fd'):
+                    values.append(float(self.rng.uniform(0, 1)))
+                elif (code == '?'):
+                    values.append(True)
+                else:
+                    values.append(int(self.rng.integers(0, 100)))
+            return layout.pack(*values)
+        return payload
+
+    def _schemaPayload(self, schema):
+        def payload(numPoints, numTracks):
+            if (schema.repeat is False):
+                numRecords = 1
+            elif (schema.repeat is True):
+                numRecords = self.numRangeBins
+            else:
+                numRecords = schema.repeat
+            return self._integers(0, 255, numRecords * schema.size).astype(np.uint8).tobytes()
+        return payload
+
+    def payload(self, tlvType, numPoints=None, numTracks=None):
+        return self.payloadFunctions[tlvType](self.numPoints if numPoints is None else numPoints, self.numTracks if numTracks is None else numTracks)
+
+    # ================================================== Frames ==================================================
+
+    # One complete frame, padded to a multiple of 32 bytes like the device does
+    def frame(self, frameNum, tlvTypes=None, numPoints=None, numTracks=None):
+        numPoints = self.numPoints if numPoints is None else numPoints
+        numTracks = self.numTracks if numTracks is None else numTracks
+        tlvs = []
+        for tlvType in (self.tlvTypes if tlvTypes is None else tlvTypes):
+            payload = self.payload(tlvType, numPoints, numTracks)
+            tlvs.append(TLV_HEADER_STRUCT.pack(tlvType, len(payload)) + payload)
+        body = b''.join(tlvs)
+        totalPacketLen = 32 * math.ceil((FRAME_HEADER_STRUCT.size + len(body)) / 32)
+        timeCPUCycles = int(frameNum * self.framePeriod / 1000 * CPU_CLOCK_HZ) % (1 << 32)
+        header = FRAME_HEADER_STRUCT.pack(MAGIC_WORD, FRAME_VERSION, totalPacketLen, PLATFORM_XWR6843, frameNum, timeCPUCycles, numPoints, len(tlvs), 0)
+        frameData = header + body
+        return frameData + bytes(totalPacketLen - len(frameData))
+
+    def frames(self, numFrames, firstFrameNum=1, tlvTypes=None):
+        return [self.frame(frameNum, tlvTypes) for frameNum in range(firstFrameNum, firstFrameNum + numFrames)]
+
+    # Damage a frame as a noisy UART link would. Returns the bytes to put on the line
+    def corrupt(self, frameData, kind=None):
+        if (kind is None):
+            kind = CORRUPTION_KINDS[self.rng.integers(len(CORRUPTION_KINDS))]
+        frameData = bytearray(frameData)
+        if (kind == CORRUPT_FLIP):
+            start = int(self.rng.integers(FRAME_HEADER_STRUCT.size - 32, len(frameData)))
+            length = min(int(self.rng.integers(1, 16)), len(frameData) - start)
+            frameData[start:start + length] = self._integers(0, 255, length).astype(np.uint8).tobytes()
+        elif (kind == CORRUPT_TRUNCATE):
+            frameData = frameData[:int(self.rng.integers(8, len(frameData)))]
+        elif (kind == CORRUPT_NOISE):
+            frameData = bytearray(self._integers(0, 255, int(self.rng.integers(1, 256))).astype(np.uint8).tobytes()) + frameData
+        else:
+            raise ValueError('Unknown corruption kind ' + str(kind))
+        return bytes(frameData)
+
+    # numFrames frames back to back as read from the data port, each corrupted with probability corruptionRate
+    def stream(self, numFrames, corruptionRate=0.0, firstFrameNum=1, tlvTypes=None):
+        chunks = []
+        for frameData in self.frames(numFrames, firstFrameNum, tlvTypes):
+            if (corruptionRate > 0 and self.rng.random() < corruptionRate):
+                frameData = self.corrupt(frameData)
+            chunks.append(frameData)
+        return b''.join(chunks)
@@ -0,0 +1,257 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from benchmarks.frame_generator import FrameGenerator, PEOPLE_TRACKING_TLVS, ALL_TLVS
+from uart_framer import UARTFramer
+from parseFrame import parseStandardFrame, parseRadarFrame, parserFunctions, iterTLVs
+from lazy_frame import LazyFrame
+from buffer_pool import BufferPool
+from tlv_schema import benchmarkDecoders
+from capture import CaptureWriter
+from tracking_writer import TrackingLogWriter
+from column_store import ColumnStoreWriter
+from fall_detection import FallDetection
+from main import FRAME_SUBSCRIPTIONS
+
+SUITE_VERSION = 1
+READ_CHUNK_SIZE = 4096 # roughly what one serial read returns at 921600 baud
+# Relative slowdown of a timing, compared to the baseline, reported as a regression
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Benchmarks of the code that runs on every frame, on synthetic frames from FrameGenerator.
+#
+#     python -m benchmarks.suite --output results.json
+#     python -m benchmarks.suite --compare results.json        # exits with 1 if anything got slower
+#
+# Every timing is the best of repeats runs, reported in microseconds per frame (or per call) so
+# results from different frame counts compare. Each benchmark returns a flat dict of numbers.
+
+# Best (lowest) time of repeats runs of function(), in seconds
+def _bestOf(function, repeats):
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if (best is None or elapsed < best):
+            best = elapsed
+    return best
+
+# Magic word search and framing of a UART byte stream, fed in serial read sized chunks
+def benchSync(stream, repeats):
+    chunks = [stream[i:i + READ_CHUNK_SIZE] for i in range(0, len(stream), READ_CHUNK_SIZE)]
+    results = {}
+    def run():
+        framer = UARTFramer()
+        for chunk in chunks:
+            framer.feed(chunk)
+            while (framer.nextFrame() is not None):
+                pass
+        results.update(framer.getStats())
+    elapsed = _bestOf(run, repeats)
+    return {
+        'frames': results['framesRead'],
+        'bytes': len(stream),
+        'resyncs': results['resyncs'],
+        'usPerFrame': elapsed / max(results['framesRead'], 1) * 1e6,
+        'MBPerSec': len(stream) / elapsed / 1e6,
+    }
+
+# Whole frame parsing, the way each consumer does it
+def benchParseFrame(frames, repeats):
+    pool = BufferPool()
+    def parsePooled(frameData):
+        buffers = pool.acquire()
+        frame = parseRadarFrame(frameData, buffers.outputBuffers)
+        frame.buffers = buffers
+        frame.release()
+    def parseLazy(frameData):
+        # Read what main.py reads
+        frame = LazyFrame(frameData, FRAME_SUBSCRIPTIONS)
+        for key in FRAME_SUBSCRIPTIONS:
+            if (key in frame):
+                frame[key]
+    parsers = {
+        'parseStandardFrame': parseStandardFrame,
+        'parseRadarFrame': parseRadarFrame,
+        'parseRadarFramePooled': parsePooled,
+        'lazyFrameSubscribed': parseLazy,
+    }
+    results = {}
+    for name, parse in parsers.items():
+        elapsed = _bestOf(lambda: [parse(frameData) for frameData in frames], repeats)
+        results[name + '.usPerFrame'] = elapsed / len(frames) * 1e6
+    return results
+
+# Each TLV parser on its own, over the payloads found in frames
+def benchTLVParsers(frames, repeats):
+    payloads = {}
+    for frameData in frames:
+        for tlvType, offset, tlvLength in iterTLVs(frameData):
+            payloads.setdefault(tlvType, []).append(bytes(frameData[offset:offset + tlvLength]))
+    results = {}
+    # Most parsers take a microsecond or two, so they are run more often than the other benchmarks
+    for tlvType, result in benchmarkDecoders(parserFunctions, payloads, repeats * 20).items():
+        results['%d.%s.usPerCall' % (tlvType, result['name'])] = result['usPerCall']
+    return results
+
+def benchFallDetection(frames, repeats):
+    parsed = [parseStandardFrame(frameData) for frameData in frames]
+    inputs = [(outputDict['heightData'], outputDict['trackData']) for outputDict in parsed if 'heightData' in outputDict and 'trackData' in outputDict]
+    def run():
+        fallDetection = FallDetection()
+        for heights, tracks in inputs:
+            fallDetection.step(heights, tracks)
+    elapsed = _bestOf(run, repeats)
+    return {'frames': len(inputs), 'usPerFrame': elapsed / max(len(inputs), 1) * 1e6}
+
+# Writing raw frames to a capture, the JSON chunk main.py used to write every framesPerFile frames, and the
+# tracking log writer that replaced it: what queueing costs the caller, and the writer thread's own time per frame.
+# columnStore is the same frames through column_store.ColumnStoreWriter, one chunk written on stop()
+def benchPersistence(frames, repeats, framesPerFile=100):
+    directory = tempfile.mkdtemp(prefix='benchmark_')
+    try:
+        def writeCapture():
+            with CaptureWriter(os.path.join(directory, 'capture_%f' % time.perf_counter())) as writer:
+                for frameData in frames:
+                    writer.write(frameData, 0.0)
+        captureElapsed = _bestOf(writeCapture, repeats)
+
+        frameJSONs = []
+        frameArrays = []
+        for outputDict in (parseStandardFrame(frameData) for frameData in frames[:framesPerFile]):
+            frameArrays.append((outputDict.get('trackData', np.zeros((0, 16), np.float32)), outputDict.get('heightData', np.zeros((0, 3), np.float32))))
+            frameJSON = {'frameNumber': outputDict.get('frameNum', 0), 'timestamp': 0.0, 'CurrTime': time.ctime(0)}
+            frameJSON['HeightData'] = outputDict['heightData'].tolist() if 'heightData' in outputDict else []
+            frameJSON['PointsDetected'] = outputDict.get('numDetectedPoints', 0)
+            frameJSONs.append(frameJSON)
+        data = {'cfg': [], 'demo': '3D People Tracking', 'device': 'xWR6843', 'data': frameJSONs}
+        def writeJSON():
+            with open(os.path.join(directory, 'replay.json'), 'w') as fp:
+                fp.write(json.dumps(data, indent=4))
+        jsonElapsed = _bestOf(writeJSON, repeats)
+
+        enqueueElapsed = [None]
+        def writeLog():
+            writer = TrackingLogWriter(os.path.join(directory, 'log_%f' % time.perf_counter()), data['cfg'], data['demo'], data['device'])
+            start = time.perf_counter()
+            for frameJSON in frameJSONs:
+                writer.write(frameJSON)
+            elapsed = time.perf_counter() - start
+            if (enqueueElapsed[0] is None or elapsed < enqueueElapsed[0]):
+                enqueueElapsed[0] = elapsed
+            writer.start()
+            writer.stop()
+        logElapsed = _bestOf(writeLog, repeats)
+
+        def writeStore():
+            store = ColumnStoreWriter(os.path.join(directory, 'store_%f' % time.perf_counter()))
+            store.start()
+            for frameJSON, (trackData, heightData) in zip(frameJSONs, frameArrays):
+                store.append(frameJSON['frameNumber'], frameJSON['timestamp'], frameJSON['PointsDetected'], trackData, heightData)
+            store.stop()
+        storeElapsed = _bestOf(writeStore, repeats)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'capture.usPerFrame': captureElapsed / len(frames) * 1e6,
+        'json.usPerFrame': jsonElapsed / len(frameJSONs) * 1e6,
+        'trackingLogQueue.usPerFrame': enqueueElapsed[0] / len(frameJSONs) * 1e6,
+        'trackingLog.usPerFrame': logElapsed / len(frameJSONs) * 1e6,
+        'columnStore.usPerFrame': storeElapsed / len(frameJSONs) * 1e6,
+    }
+
+def _gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def runSuite(numFrames=500, numPoints=150, numTracks=5, corruptionRate=0.01, repeats=5, seed=0):
+    generator = FrameGenerator(numPoints, numTracks, PEOPLE_TRACKING_TLVS, seed=seed)
+    frames = generator.frames(numFrames)
+    allTLVFrames = generator.frames(max(numFrames // 10, 1), tlvTypes=ALL_TLVS)
+    stream = generator.stream(numFrames, corruptionRate)
+
+    results = {}
+    results['sync'] = benchSync(stream, repeats)
+    results['parseFrame'] = benchParseFrame(frames, repeats)
+    results['tlvParsers'] = benchTLVParsers(allTLVFrames, repeats)
+    results['fallDetection'] = benchFallDetection(frames, repeats)
+    results['persistence'] = benchPersistence(frames, repeats)
+    return {
+        'suiteVersion': SUITE_VERSION,
+        'commit': _gitCommit(),
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'config': {'numFrames': numFrames, 'numPoints': numPoints, 'numTracks': numTracks, 'corruptionRate': corruptionRate, 'repeats': repeats, 'seed': seed},
+        'results': results,
+    }
+
+# Timings (keys containing 'usPer') more than threshold slower than in baseline, as a list of
+# {'benchmark', 'metric', 'baseline', 'current', 'change'}
+def compareResults(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    regressions = []
+    for benchmark, metrics in current['results'].items():
+        baselineMetrics = baseline.get('results', {}).get(benchmark, {})
+        for metric, value in metrics.items():
+            if ('usPer' not in metric or metric not in baselineMetrics or baselineMetrics[metric] <= 0):
+                continue
+            change = value / baselineMetrics[metric] - 1
+            if (change > threshold):
+                regressions.append({'benchmark': benchmark, 'metric': metric, 'baseline': baselineMetrics[metric], 'current': value, 'change': change})
+    return regressions
+
+def main(argv=None):
+    argParser = argparse.ArgumentParser(description='Parser and pipeline benchmarks on synthetic frames, written as JSON')
+    argParser.add_argument('--frames', type=int, default=500, help='frames per benchmark')
+    argParser.add_argument('--points', type=int, default=150, help='points per frame')
+    argParser.add_argument('--tracks', type=int, default=5, help='tracks per frame')
+    argParser.add_argument('--corruption', type=float, default=0.01, help='fraction of corrupted frames in the UART stream')
+    argParser.add_argument('--repeats', type=int, default=5, help='runs per benchmark, the best one is reported')
+    argParser.add_argument('--seed', type=int, default=0)
+    argParser.add_argument('--output', help='write the results to this file instead of stdout')
+    argParser.add_argument('--compare', metavar='BASELINE', help='results file of an earlier run to check for regressions')
+    argParser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD, help='slowdown reported as a regression (0.1 = 10%%)')
+    args = argParser.parse_args(argv)
+
+    # The corrupted frames make the framer and parsers log, which would only slow the benchmarks down
+    logging.disable(logging.WARNING)
+    results = runSuite(args.frames, args.points, args.tracks, args.corruption, args.repeats, args.seed)
+    logging.disable(logging.NOTSET)
+
+    regressions = []
+    if (args.compare is not None):
+        with open(args.compare, 'r') as fp:
+            regressions = compareResults(json.load(fp), results, args.threshold)
+        results['regressions'] = regressions
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+    if (args.output is not None):
+        with open(args.output, 'w') as fp:
+            fp.write(output)
+    else:
+        print(output)
+    for regression in regressions:
+        log.warning('%s %s: %.2f -> %.2f us (%+.0f%%)' % (regression['benchmark'], regression['metric'], regression['baseline'], regression['current'], regression['change'] * 100))
+    return 1 if len(regressions) > 0 else 0
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
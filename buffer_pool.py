@@ -0,0 +1,99 @@
+import threading
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from tlv_defines import *
+from parseFrame import POINT_CLOUD_BUFFER
+from radar_config import DEFAULT_MAX_POINTS, DEFAULT_MAX_TRACKS
+
+# Frames that can hold buffers at the same time. More than that and frames are parsed into new arrays
+DEFAULT_POOL_SIZE = 4
+
+TRACK_BUFFER_TLVS = (MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST, MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST, MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST_2D_BSD)
+HEIGHT_BUFFER_TLVS = (MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT,)
+
+# The arrays one frame is parsed into: the point cloud, track rows and height rows, each sized for the
+# cfg's maximum. outputBuffers is passed to parseStandardFrame / LazyFrame
+class FrameBuffers():
+    def __init__(self, pool, maxPoints, maxTracks):
+        self.pool = pool
+        self.inUse = False
+        self.pointCloud = np.zeros((maxPoints, 7), np.float64)
+        self.trackData = np.zeros((maxTracks, 16), np.float64)
+        self.heightData = np.zeros((maxTracks, 3), np.float64)
+        self.outputBuffers = {POINT_CLOUD_BUFFER: self.pointCloud}
+        for tlvType in TRACK_BUFFER_TLVS:
+            self.outputBuffers[tlvType] = self.trackData
+        for tlvType in HEIGHT_BUFFER_TLVS:
+            self.outputBuffers[tlvType] = self.heightData
+
+    # True if value is a view of one of these buffers
+    def owns(self, value):
+        if (not isinstance(value, np.ndarray)):
+            return False
+        return np.may_share_memory(value, self.pointCloud) or np.may_share_memory(value, self.trackData) or np.may_share_memory(value, self.heightData)
+
+    # Copy every output of a frame that is a view of these buffers, so the frame stays valid once they are reused
+    def copyOutputs(self, outputDict):
+        for key in list(outputDict.keys()):
+            value = outputDict[key]
+            if (self.owns(value)):
+                outputDict[key] = value.copy()
+
+    def release(self):
+        self.pool.release(self)
+
+# A fixed set of FrameBuffers reused from frame to frame instead of allocating new arrays for every frame.
+#
+#     pool = BufferPool(config.maxPoints, config.maxTracks)   # config is a radar_config.RadarConfig
+#     buffers = pool.acquire()                    # None when every buffer is in use
+#     frame = parseRadarFrame(frameData, buffers.outputBuffers)
+#     frame.buffers = buffers
+#     ...
+#     frame.release()                             # the frame's arrays may now be overwritten by another frame
+#
+# A frame owns its buffers until it is released. Consumers that keep a frame (or its arrays) after the next one
+# is parsed must call frame.retain() first, which copies the pooled arrays and releases the buffers.
+# UARTParser does the acquiring when its bufferPool is set.
+class BufferPool():
+    def __init__(self, maxPoints=DEFAULT_MAX_POINTS, maxTracks=DEFAULT_MAX_TRACKS, numBuffers=DEFAULT_POOL_SIZE):
+        self.maxPoints = maxPoints
+        self.maxTracks = maxTracks
+        self.buffers = [FrameBuffers(self, maxPoints, maxTracks) for i in range(numBuffers)]
+        self.free = list(self.buffers)
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.misses = 0
+
+    # Take a free set of buffers, or None if all of them are held by unreleased frames
+    def acquire(self):
+        with self.lock:
+            if (len(self.free) == 0):
+                self.misses += 1
+                if (self.misses == 1):
+                    log.warning('Buffer pool exhausted, frames are being parsed into new arrays. Are frames being released?')
+                return None
+            buffers = self.free.pop()
+            buffers.inUse = True
+            self.acquired += 1
+            return buffers
+
+    def release(self, buffers):
+        with self.lock:
+            if (not buffers.inUse):
+                log.warning('Frame buffers released twice')
+                return
+            buffers.inUse = False
+            self.free.append(buffers)
+
+    def getStats(self):
+        stats = {}
+        stats['size'] = len(self.buffers)
+        stats['free'] = len(self.free)
+        stats['acquired'] = self.acquired
+        stats['misses'] = self.misses
+        return stats
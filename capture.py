@@ -0,0 +1,290 @@
+import os
+import mmap
+import struct
+import time
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Raw capture format
+# A recording is a directory of segments. Each segment is a pair of files:
+#   segment_NNNNN.bin  file header, then one record per frame: record header + the frame's raw UART bytes
+#   segment_NNNNN.idx  one fixed size entry per frame: offset of the frame bytes in the .bin, host timestamp, frameNum, length
+# Appending a frame costs one record write, independent of how much has been recorded so far,
+# and the raw bytes can be parsed again later with parseStandardFrame at full fidelity.
+CAPTURE_FILE_MAGIC = b'AICAPT01'
+CAPTURE_FILE_HEADER = struct.Struct('<8sII') # magic, version, record header size
+CAPTURE_VERSION = 1
+RECORD_HEADER = struct.Struct('<dII') # host timestamp (s since epoch), frameNum, frame length in bytes
+INDEX_ENTRY = struct.Struct('<QdII') # frame data offset, host timestamp, frameNum, frame length in bytes
+
+SEGMENT_PREFIX = 'segment_'
+SEGMENT_DATA_EXTENSION = '.bin'
+SEGMENT_INDEX_EXTENSION = '.idx'
+
+# frameNum position in the frame header (after magic word, version, totalPacketLen and platform)
+FRAME_NUM_OFFSET = 20
+
+DEFAULT_MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_SEGMENT_SECONDS = 60 * 60
+
+def segmentName(segmentNum):
+    return SEGMENT_PREFIX + '%05d' % (segmentNum)
+
+# Segment base paths (without extension) of a recording, in recording order
+def listSegments(directory):
+    names = [f[:-len(SEGMENT_DATA_EXTENSION)] for f in os.listdir(directory) if f.startswith(SEGMENT_PREFIX) and f.endswith(SEGMENT_DATA_EXTENSION)]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+def isCaptureDirectory(path):
+    return os.path.isdir(path) and len(listSegments(path)) > 0
+
+def frameNumFromFrame(frameData):
+    if (len(frameData) < FRAME_NUM_OFFSET + 4):
+        return 0
+    return struct.unpack_from('<I', frameData, FRAME_NUM_OFFSET)[0]
+
+# Writes raw frames into a capture directory, rolling to a new segment by size or by time
+class CaptureWriter():
+    def __init__(self, directory, maxSegmentBytes=DEFAULT_MAX_SEGMENT_BYTES, maxSegmentSeconds=DEFAULT_MAX_SEGMENT_SECONDS):
+        self.directory = directory
+        self.maxSegmentBytes = maxSegmentBytes
+        self.maxSegmentSeconds = maxSegmentSeconds
+        self.segmentNum = -1
+        self.dataFile = None
+        self.indexFile = None
+        self.segmentBytes = 0
+        self.segmentStartTime = 0
+        self.framesWritten = 0
+        os.makedirs(directory, exist_ok=True)
+        # Continue numbering after any segments already in the directory
+        existing = listSegments(directory)
+        if (len(existing) > 0):
+            self.segmentNum = int(os.path.basename(existing[-1])[len(SEGMENT_PREFIX):])
+
+    def _openSegment(self, timestamp):
+        self._closeSegment()
+        self.segmentNum += 1
+        basePath = os.path.join(self.directory, segmentName(self.segmentNum))
+        self.dataFile = open(basePath + SEGMENT_DATA_EXTENSION, 'wb')
+        self.indexFile = open(basePath + SEGMENT_INDEX_EXTENSION, 'wb')
+        self.dataFile.write(CAPTURE_FILE_HEADER.pack(CAPTURE_FILE_MAGIC, CAPTURE_VERSION, RECORD_HEADER.size))
+        self.segmentBytes = CAPTURE_FILE_HEADER.size
+        self.segmentStartTime = timestamp
+        log.info('Recording to ' + basePath + SEGMENT_DATA_EXTENSION)
+
+    def _closeSegment(self):
+        if (self.dataFile is not None):
+            self.dataFile.close()
+            self.indexFile.close()
+            self.dataFile = None
+            self.indexFile = None
+
+    # Append one raw frame. timestamp defaults to now
+    def write(self, frameData, timestamp=None):
+        if (timestamp is None):
+            timestamp = time.time()
+        if (self.dataFile is None
+                or self.segmentBytes + RECORD_HEADER.size + len(frameData) > self.maxSegmentBytes
+                or timestamp - self.segmentStartTime >= self.maxSegmentSeconds):
+            self._openSegment(timestamp)
+
+        frameNum = frameNumFromFrame(frameData)
+        dataOffset = self.segmentBytes + RECORD_HEADER.size
+        self.dataFile.write(RECORD_HEADER.pack(timestamp, frameNum, len(frameData)))
+        self.dataFile.write(frameData)
+        self.indexFile.write(INDEX_ENTRY.pack(dataOffset, timestamp, frameNum, len(frameData)))
+        self.segmentBytes = dataOffset + len(frameData)
+        self.framesWritten += 1
+
+    def flush(self):
+        if (self.dataFile is not None):
+            self.dataFile.flush()
+            self.indexFile.flush()
+
+    def close(self):
+        self._closeSegment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Sequentially yield (timestamp, frameNum, frameData) from one segment's .bin file.
+# Only needs the data file, so it also recovers recordings whose index was lost
+def iterSegmentRecords(dataPath):
+    with open(dataPath, 'rb') as fp:
+        fileHeader = fp.read(CAPTURE_FILE_HEADER.size)
+        if (len(fileHeader) < CAPTURE_FILE_HEADER.size):
+            return
+        magic, version, recordHeaderSize = CAPTURE_FILE_HEADER.unpack(fileHeader)
+        if (magic != CAPTURE_FILE_MAGIC):
+            log.error('Not a capture segment: ' + dataPath)
+            return
+        while True:
+            recordHeader = fp.read(recordHeaderSize)
+            if (len(recordHeader) < recordHeaderSize):
+                return
+            timestamp, frameNum, length = RECORD_HEADER.unpack_from(recordHeader)
+            frameData = fp.read(length)
+            if (len(frameData) < length):
+                log.warning('Capture segment ends with a partial frame: ' + dataPath)
+                return
+            yield timestamp, frameNum, frameData
+
+# Sequentially yield (timestamp, frameNum, frameData) for a whole capture directory
+def iterCapture(directory):
+    for basePath in listSegments(directory):
+        for record in iterSegmentRecords(basePath + SEGMENT_DATA_EXTENSION):
+            yield record
+
+# Regenerate a segment's .idx file from its .bin file, eg. after a crash left the index short
+def rebuildIndex(basePath):
+    dataOffset = CAPTURE_FILE_HEADER.size
+    numFrames = 0
+    with open(basePath + SEGMENT_INDEX_EXTENSION, 'wb') as indexFile:
+        for timestamp, frameNum, frameData in iterSegmentRecords(basePath + SEGMENT_DATA_EXTENSION):
+            dataOffset += RECORD_HEADER.size
+            indexFile.write(INDEX_ENTRY.pack(dataOffset, timestamp, frameNum, len(frameData)))
+            dataOffset += len(frameData)
+            numFrames += 1
+    return numFrames
+
+# numpy view of INDEX_ENTRY, so an index file can be memory-mapped and searched without loading it
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('timestamp', '<f8'), ('frameNum', '<u4'), ('length', '<u4')])
+
+# One segment of a recording opened for random access. The data file is only mapped on first use
+class _Segment():
+    def __init__(self, basePath):
+        self.basePath = basePath
+        indexPath = basePath + SEGMENT_INDEX_EXTENSION
+        numEntries = os.path.getsize(indexPath) // INDEX_DTYPE.itemsize if os.path.exists(indexPath) else 0
+        if (numEntries > 0):
+            self.index = np.memmap(indexPath, dtype=INDEX_DTYPE, mode='r', shape=(numEntries,))
+        else:
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+        self.dataFile = None
+        self.dataMap = None
+        self.dataView = None
+        self._frameNumsSorted = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def frameNumsSorted(self):
+        if (self._frameNumsSorted is None):
+            # frameNum restarts if the device is reset part way through a segment
+            self._frameNumsSorted = bool(np.all(np.diff(self.index['frameNum'].astype(np.int64)) >= 0))
+        return self._frameNumsSorted
+
+    def frame(self, i):
+        if (self.dataView is None):
+            self.dataFile = open(self.basePath + SEGMENT_DATA_EXTENSION, 'rb')
+            self.dataMap = mmap.mmap(self.dataFile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.dataView = memoryview(self.dataMap)
+        entry = self.index[i]
+        offset = int(entry['offset'])
+        return float(entry['timestamp']), int(entry['frameNum']), self.dataView[offset:offset + int(entry['length'])]
+
+    def close(self):
+        if (self.dataView is not None):
+            self.dataView.release()
+            try:
+                self.dataMap.close()
+            except BufferError:
+                # Frames handed out are still referenced, the map is closed when they are garbage collected
+                pass
+            self.dataFile.close()
+            self.dataView = None
+        # Dropping the reference unmaps the index
+        self.index = np.empty(0, dtype=INDEX_DTYPE)
+
+# Random access to a capture directory for incident review.
+# Segment data files are memory-mapped and the .idx files are searched with binary search, so seeking
+# to a timestamp or frame number in a multi-day recording is O(log n) and touches only a few pages.
+# Frames are returned as zero-copy memoryview slices of the mapped file, which parseStandardFrame accepts directly.
+# Release (or drop) any frames you hold before calling close().
+class CaptureReader():
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = [_Segment(basePath) for basePath in listSegments(directory)]
+        self.segments = [segment for segment in self.segments if len(segment) > 0]
+        # Global frame number of the first frame in each segment
+        self.segmentStarts = np.cumsum([0] + [len(segment) for segment in self.segments])
+        self.segmentFirstTimes = np.array([segment.index['timestamp'][0] for segment in self.segments])
+        self.segmentFirstFrameNums = np.array([segment.index['frameNum'][0] for segment in self.segments], dtype=np.int64)
+
+    def __len__(self):
+        return int(self.segmentStarts[-1])
+
+    def _locate(self, i):
+        if (i < 0):
+            i += len(self)
+        if (i < 0 or i >= len(self)):
+            raise IndexError('Frame %d is outside the recording' % (i))
+        segmentNum = int(np.searchsorted(self.segmentStarts, i, side='right')) - 1
+        return segmentNum, i - int(self.segmentStarts[segmentNum])
+
+    # (timestamp, frameNum, frameData) of the i-th frame in the recording
+    def frameAt(self, i):
+        segmentNum, localIndex = self._locate(i)
+        return self.segments[segmentNum].frame(localIndex)
+
+    def __getitem__(self, i):
+        return self.frameAt(i)
+
+    # Position of the first frame recorded at or after timestamp (seconds since epoch, or a datetime)
+    def findTimestamp(self, timestamp):
+        if (hasattr(timestamp, 'timestamp')):
+            timestamp = timestamp.timestamp()
+        segmentNum = max(int(np.searchsorted(self.segmentFirstTimes, timestamp, side='right')) - 1, 0)
+        while (segmentNum < len(self.segments)):
+            localIndex = int(np.searchsorted(self.segments[segmentNum].index['timestamp'], timestamp, side='left'))
+            if (localIndex < len(self.segments[segmentNum])):
+                return int(self.segmentStarts[segmentNum]) + localIndex
+            segmentNum += 1
+        return len(self)
+
+    # Position of the first frame with this frameNum, or None if it was not recorded
+    def findFrameNum(self, frameNum):
+        candidates = np.flatnonzero(self.segmentFirstFrameNums <= frameNum)
+        # Check the most likely segment first, then fall back to the others (the device may have been reset)
+        order = list(candidates[::-1]) + [s for s in range(len(self.segments)) if s not in candidates]
+        for segmentNum in order:
+            segment = self.segments[segmentNum]
+            frameNums = segment.index['frameNum']
+            if (segment.frameNumsSorted()):
+                localIndex = int(np.searchsorted(frameNums, frameNum, side='left'))
+                if (localIndex < len(segment) and frameNums[localIndex] == frameNum):
+                    return int(self.segmentStarts[segmentNum]) + localIndex
+            else:
+                matches = np.flatnonzero(frameNums == frameNum)
+                if (len(matches) > 0):
+                    return int(self.segmentStarts[segmentNum]) + int(matches[0])
+        return None
+
+    # Lazily yield (timestamp, frameNum, frameData) for frames start..stop-1
+    def iterFrames(self, start=0, stop=None):
+        if (stop is None or stop > len(self)):
+            stop = len(self)
+        for i in range(max(start, 0), stop):
+            yield self.frameAt(i)
+
+    # Lazily yield the frames recorded within secondsBefore/secondsAfter of timestamp
+    def framesAround(self, timestamp, secondsBefore=5.0, secondsAfter=5.0):
+        if (hasattr(timestamp, 'timestamp')):
+            timestamp = timestamp.timestamp()
+        return self.iterFrames(self.findTimestamp(timestamp - secondsBefore), self.findTimestamp(timestamp + secondsAfter))
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
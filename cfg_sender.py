@@ -0,0 +1,124 @@
+import time
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# How long a cfg line may take to be acknowledged. sensorStart and calibration lines are the slow ones
+DEFAULT_ACK_TIMEOUT = 2.0
+# Port read timeout while waiting for an ack, short so the deadline above is kept
+ACK_POLL_INTERVAL = 0.02
+# At this baud rate the device drops characters sent back to back, they are written one at a time
+CHARACTER_PACED_BAUD_RATE = 1250000
+CHARACTER_DELAY = .001
+
+# Status of a cfg line
+CFG_LINE_DONE = 'done'
+CFG_LINE_ERROR = 'error'
+CFG_LINE_TIMEOUT = 'timeout'
+
+# The lines of a cfg that are sent: no blank lines or % comments, each ending in \n
+def normaliseCfg(cfg):
+    lines = []
+    for line in cfg:
+        if (line.strip() == '' or line.lstrip()[0] == '%'):
+            continue
+        lines.append(line if line.endswith('\n') else line + '\n')
+    return lines
+
+# cfg that stops the sensor and clears the running cfg before anything else, so it can be applied to a device
+# that is already streaming another one. Most cfgs start with these two lines already
+def withSensorReset(cfg):
+    lines = normaliseCfg(cfg)
+    commands = [line.split()[0] for line in lines[:2]]
+    if (commands != ['sensorStop', 'flushCfg']):
+        lines = ['sensorStop\n', 'flushCfg\n'] + [line for line in lines if line.split()[0] not in ('sensorStop', 'flushCfg')]
+    return lines
+
+# (status, the line that says so) of the device's response to one cfg line, or None while it is incomplete. The CLI
+# echoes the line, may print some information, then prints "Done", "Error <code>" or "'<cmd>' is not recognized as a CLI command"
+def ackStatus(response):
+    # Only complete lines, a partial "Do" is not an ack yet
+    for line in response.split('\n')[:-1]:
+        line = line.strip()
+        if (line == 'Done'):
+            return CFG_LINE_DONE, line
+        if (line.startswith('Error') or 'not recognized as a CLI command' in line):
+            return CFG_LINE_ERROR, line
+    return None
+
+def _writeLine(cliCom, line):
+    if (cliCom.baudrate == CHARACTER_PACED_BAUD_RATE):
+        for char in [*line]:
+            time.sleep(CHARACTER_DELAY) # Character delay. Required for demos which are 1250000 baud by default else characters are skipped
+            cliCom.write(char.encode())
+    else:
+        cliCom.write(line.encode())
+
+# Write one line to the CLI port and wait for the device to acknowledge it.
+# Returns (status, message, response) with status one of the CFG_LINE_* values, message the device's "Done" / error
+# line (everything it sent if it timed out) and response all of its output
+def sendCommand(cliCom, line, timeout=DEFAULT_ACK_TIMEOUT):
+    _writeLine(cliCom, line)
+    response = ''
+    deadline = time.monotonic() + timeout
+    while True:
+        data = cliCom.read(max(cliCom.in_waiting, 1))
+        if (len(data) > 0):
+            response += data.decode(errors='replace')
+            ack = ackStatus(response)
+            if (ack is not None):
+                return ack[0], ack[1], response
+        if (time.monotonic() > deadline):
+            return CFG_LINE_TIMEOUT, response, response
+
+# sendCommand without the full response
+def sendCfgLine(cliCom, line, timeout=DEFAULT_ACK_TIMEOUT):
+    status, message, response = sendCommand(cliCom, line, timeout)
+    return status, message
+
+# Send a cfg (list of lines) to the device, each line as soon as the previous one is acknowledged.
+# Errors and timeouts are logged with the line that caused them and sending carries on with the next line,
+# as the device does, unless stopOnError is set. Returns
+#
+#     {'ok': bool, 'time': seconds for the whole cfg, 'errors': [(lineNumber, line, status, message)],
+#      'lines': [(line, status, seconds)]}
+#
+# lineNumber counts from 1 over the lines actually sent (see normaliseCfg)
+def sendCfgLines(cliCom, cfg, timeout=DEFAULT_ACK_TIMEOUT, stopOnError=False):
+    lines = normaliseCfg(cfg)
+    result = {'ok': True, 'errors': [], 'lines': []}
+    portTimeout = cliCom.timeout
+    cliCom.timeout = ACK_POLL_INTERVAL
+    # Anything left over from before (prompts, a previous session) would be mistaken for an ack
+    cliCom.reset_input_buffer()
+    startTime = time.monotonic()
+    try:
+        for lineNumber, line in enumerate(lines, 1):
+            lineStart = time.monotonic()
+            status, message = sendCfgLine(cliCom, line, timeout)
+            result['lines'].append((line, status, time.monotonic() - lineStart))
+            if (status != CFG_LINE_DONE):
+                result['ok'] = False
+                result['errors'].append((lineNumber, line.strip(), status, message.strip()))
+                if (status == CFG_LINE_TIMEOUT):
+                    log.error('cfg line %d "%s" was not acknowledged within %.1f s' % (lineNumber, line.strip(), timeout))
+                else:
+                    log.error('cfg line %d "%s" failed: %s' % (lineNumber, line.strip(), message))
+                if (stopOnError):
+                    break
+
+            # The baudRate line changes the CLI baud rate on the next cfg line to enable greater data streaming off the xWRL device
+            splitLine = line.split()
+            if (splitLine[0] == 'baudRate' and status == CFG_LINE_DONE):
+                try:
+                    cliCom.baudrate = int(splitLine[1])
+                except (IndexError, ValueError):
+                    log.error('Error - Invalid baud rate')
+                    result['ok'] = False
+                    break
+    finally:
+        cliCom.timeout = portTimeout
+    result['time'] = time.monotonic() - startTime
+    log.info('Sent %d cfg lines in %.2f s, %d failed' % (len(result['lines']), result['time'], len(result['errors'])))
+    return result
@@ -0,0 +1,385 @@
+import argparse
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from metrics import StreamingHistogram
+
+STORE_VERSION = 2
+STORE_INFO_FILE = 'store.json'
+CHUNK_PATTERN = 'chunk_*.npz'
+META_KEY = '__meta__'
+# A chunk is closed once it spans this much time or holds this many frames, whichever comes first
+DEFAULT_CHUNK_SECONDS = 300.0
+DEFAULT_CHUNK_FRAMES = 20000
+DEFAULT_MAX_QUEUED_CHUNKS = 4
+
+# Columns of each table as column: (dtype, stored as, scale, delta). 'frame' is the row of the frame in the frames
+# table. The names match batch.py's tables
+#   dtype       what the reader returns
+#   stored as   the dtype in the chunk. With a scale, round(value * scale) is stored, eg. metres as int16
+#               millimetres. A column that doesn't fit (NaN or out of range) is stored as dtype instead
+#   delta       the differences of consecutive values are stored, mostly the same small number for counters and
+#               clocks, which compresses to almost nothing
+STORE_COLUMNS = {
+    'frames': {
+        'frameNum': (np.uint32, np.int64, None, True),
+        'timestamp': (np.float64, np.int64, 1e6, True),
+        'numDetectedPoints': (np.uint16, np.uint16, None, False),
+        'numTracks': (np.uint16, np.uint16, None, False),
+    },
+    'tracks': {
+        'frame': (np.uint32, np.int64, None, True),
+        'tid': (np.uint16, np.uint16, None, False),
+        'x': (np.float32, np.int16, 1000, False), 'y': (np.float32, np.int16, 1000, False), 'z': (np.float32, np.int16, 1000, False),
+        'velX': (np.float32, np.float16, None, False), 'velY': (np.float32, np.float16, None, False), 'velZ': (np.float32, np.float16, None, False),
+        'accX': (np.float32, np.float16, None, False), 'accY': (np.float32, np.float16, None, False), 'accZ': (np.float32, np.float16, None, False),
+        'g': (np.float32, np.float16, None, False), 'confidence': (np.float32, np.float16, None, False),
+    },
+    'heights': {
+        'frame': (np.uint32, np.int64, None, True),
+        'tid': (np.uint16, np.uint16, None, False),
+        'maxZ': (np.float32, np.int16, 1000, False),
+        'minZ': (np.float32, np.int16, 1000, False),
+    },
+}
+# Track columns only stored with trackState=True. Without them a track is its id and position, as in the JSON logs
+TRACK_STATE_COLUMNS = ('velX', 'velY', 'velZ', 'accX', 'accY', 'accZ', 'g', 'confidence')
+# trackData column of each track column, see parseTLVs.parseTrackTLV
+TRACK_DATA_COLUMNS = {'tid': 0, 'x': 1, 'y': 2, 'z': 3, 'velX': 4, 'velY': 5, 'velZ': 6, 'accX': 7, 'accY': 8, 'accZ': 9, 'g': 10, 'confidence': 11}
+HEIGHT_DATA_COLUMNS = {'tid': 0, 'maxZ': 1, 'minZ': 2}
+
+# (stored values, True) for a column, or (values as dtype, False) if they don't fit the stored type
+def _encodeColumn(values, dtype, stored, scale, delta):
+    values = np.asarray(values, dtype)
+    encoded = values
+    if (scale is not None):
+        encoded = np.round(values.astype(np.float64) * scale)
+        if (not np.all(np.isfinite(encoded))):
+            return values, False
+        if (np.issubdtype(stored, np.integer) and len(encoded) > 0 and (encoded.min() < np.iinfo(stored).min or encoded.max() > np.iinfo(stored).max)):
+            return values, False
+    encoded = encoded.astype(stored)
+    if (delta):
+        encoded = np.diff(encoded, prepend=encoded.dtype.type(0))
+    return encoded, True
+
+def _decodeColumn(values, dtype, stored, scale, delta):
+    if (delta):
+        values = np.cumsum(values, dtype=stored)
+    if (scale is not None):
+        values = values / scale
+    return values.astype(dtype)
+
+def _chunkName(index, startTime, endTime):
+    # Times in the name let a reader pick chunks without opening them
+    return 'chunk_%06d_%015d_%015d.npz' % (index, int(startTime * 1000), int(endTime * 1000))
+
+# (startTime, endTime) of a chunk from its file name
+def _chunkTimes(path):
+    parts = os.path.basename(path)[:-len('.npz')].split('_')
+    return int(parts[2]) / 1000.0, int(parts[3]) / 1000.0
+
+# Save tables ({table: {column: array}}) as chunk number index, each column encoded as STORE_COLUMNS says. Each
+# array is its own member of the zip archive, which is what lets the reader decompress only the columns it is asked for
+def writeChunk(directory, tables, index, meta=None):
+    timestamps = np.asarray(tables['frames']['timestamp'], np.float64)
+    # Captures recorded without timestamps have NaN ones, their chunks are named by time 0
+    known = timestamps[np.isfinite(timestamps)]
+    startTime = float(known[0]) if len(known) > 0 else 0.0
+    endTime = float(known[-1]) if len(known) > 0 else 0.0
+    arrays = {}
+    rawColumns = []
+    for table, columns in STORE_COLUMNS.items():
+        for column, encoding in columns.items():
+            # Tables may leave columns out, eg. the track state
+            if (column not in tables[table]):
+                continue
+            arrays[table + '.' + column], encoded = _encodeColumn(tables[table][column], *encoding)
+            if (not encoded):
+                rawColumns.append(table + '.' + column)
+    chunkMeta = {'version': STORE_VERSION, 'numFrames': len(timestamps), 'startTime': startTime, 'endTime': endTime, 'rawColumns': rawColumns}
+    chunkMeta.update(meta or {})
+    arrays[META_KEY] = np.array(json.dumps(chunkMeta))
+    path = os.path.join(directory, _chunkName(index, startTime, endTime))
+    # Written under another name first, a reader never sees half a chunk
+    tempPath = path + '.tmp'
+    with open(tempPath, 'wb') as fp:
+        np.savez_compressed(fp, **arrays)
+    os.replace(tempPath, path)
+    return path
+
+# trackData columns stored, with or without the track state
+def _trackColumns(trackState):
+    return dict((column, index) for column, index in TRACK_DATA_COLUMNS.items() if trackState or column not in TRACK_STATE_COLUMNS)
+
+# Frames collected for the chunk being filled. Track rows hold the trackColumns columns, in trackData order
+class _ChunkBuilder():
+    def __init__(self, trackColumns):
+        self.trackColumns = trackColumns
+        self.frameNums = []
+        self.timestamps = []
+        self.numDetectedPoints = []
+        self.tracks = []
+        self.heights = []
+        self.enqueueTimes = []
+
+    def __len__(self):
+        return len(self.frameNums)
+
+    def _rows(self, rowArrays, columnMap, width):
+        counts = [len(rows) for rows in rowArrays]
+        rows = np.concatenate(rowArrays) if sum(counts) > 0 else np.zeros((0, width), np.float32)
+        table = {'frame': np.repeat(np.arange(len(counts), dtype=np.uint32), counts)}
+        for column, index in columnMap.items():
+            table[column] = rows[:, index]
+        return table
+
+    def build(self):
+        tracks = self._rows(self.tracks, self.trackColumns, len(self.trackColumns))
+        return {
+            'frames': {
+                'frameNum': self.frameNums,
+                'timestamp': self.timestamps,
+                'numDetectedPoints': self.numDetectedPoints,
+                'numTracks': [len(rows) for rows in self.tracks],
+            },
+            'tracks': tracks,
+            'heights': self._rows(self.heights, HEIGHT_DATA_COLUMNS, 3),
+        }
+
+# Writes frame numbers, timestamps, track positions and heights to compressed columnar chunks in directory. The
+# rest of the track state (velocity, acceleration, gating gain and confidence) is only written with trackState=True:
+#
+#     directory/store.json                                  version, cfg, demo, device, written once
+#     directory/chunk_<N>_<start ms>_<end ms>.npz           one per chunkSeconds of frames (or chunkFrames frames)
+#
+# append() only copies the frame's rows (so pooled frame buffers can be released right after) and the chunks
+# are compressed and written on this thread. Like tracking_writer.TrackingLogWriter it never blocks the caller,
+# if maxQueuedChunks chunks are waiting for the disk further frames are dropped and counted.
+#
+#     store = ColumnStoreWriter('TrackingStore/' + timestamp, cfg)
+#     store.start()
+#     store.append(frameNum, timestamp, numDetectedPoints, trackData, heightData)
+#     ...
+#     store.stop()        # writes the partial chunk too
+class ColumnStoreWriter(threading.Thread):
+    def __init__(self, directory, cfg=None, demo=None, device=None, chunkSeconds=DEFAULT_CHUNK_SECONDS, chunkFrames=DEFAULT_CHUNK_FRAMES, maxQueuedChunks=DEFAULT_MAX_QUEUED_CHUNKS, trackState=False):
+        threading.Thread.__init__(self, name='ColumnStoreWriter', daemon=True)
+        self.directory = directory
+        self.info = {'version': STORE_VERSION, 'cfg': cfg, 'demo': demo, 'device': device, 'trackState': trackState, 'created': time.time()}
+        self.trackColumns = _trackColumns(trackState)
+        self.chunkSeconds = chunkSeconds
+        self.chunkFrames = chunkFrames
+        self.chunkQueue = queue.Queue(maxsize=maxQueuedChunks)
+        self.stopEvent = threading.Event()
+        self.chunk = _ChunkBuilder(self.trackColumns)
+        self.lock = threading.Lock()
+        self.firstChunk = 0 # number of the first chunk this writer writes
+
+        # Statistics
+        self.framesQueued = 0
+        self.framesWritten = 0
+        self.framesDropped = 0
+        self.bytesWritten = 0
+        self.chunksWritten = 0
+        self.writeErrors = 0
+        self.latency = StreamingHistogram() # from append() until the frame's chunk is on disk
+        self.syncTime = StreamingHistogram() # compressing and writing one chunk
+
+    # Add one frame. trackData is the (N, 16) parser output, heightData (N, 3). Returns False if it was dropped
+    def append(self, frameNum, timestamp, numDetectedPoints, trackData, heightData):
+        with self.lock:
+            if (len(self.chunk) > 0 and (len(self.chunk) >= self.chunkFrames or timestamp - self.chunk.timestamps[0] >= self.chunkSeconds)):
+                if (not self._closeChunk()):
+                    self.framesDropped += 1
+                    return False
+            chunk = self.chunk
+            chunk.frameNums.append(frameNum)
+            chunk.timestamps.append(timestamp)
+            chunk.numDetectedPoints.append(numDetectedPoints)
+            # Copies, the arrays may be views of pooled buffers
+            chunk.tracks.append(np.array(trackData[:, :len(self.trackColumns)], np.float32))
+            chunk.heights.append(np.array(heightData[:, :3], np.float32))
+            chunk.enqueueTimes.append(time.perf_counter())
+            self.framesQueued += 1
+        return True
+
+    # Hand the chunk being filled to the writer thread. False if too many are waiting already
+    def _closeChunk(self):
+        try:
+            self.chunkQueue.put_nowait(self.chunk)
+        except queue.Full:
+            if (self.framesDropped == 0 or self.framesDropped % 100 == 0):
+                log.warning('Column store is falling behind, %d frames dropped so far' % (self.framesDropped + 1))
+            return False
+        self.chunk = _ChunkBuilder(self.trackColumns)
+        return True
+
+    def run(self):
+        if (not os.path.exists(self.directory)):
+            os.makedirs(self.directory)
+        with open(os.path.join(self.directory, STORE_INFO_FILE), 'w') as fp:
+            json.dump(self.info, fp, indent=4)
+        # A writer restarted on the same directory carries on numbering after the chunks already there
+        self.firstChunk = len(glob.glob(os.path.join(self.directory, CHUNK_PATTERN)))
+        while (not self.stopEvent.is_set() or not self.chunkQueue.empty()):
+            try:
+                chunk = self.chunkQueue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._writeChunk(chunk)
+
+    def _writeChunk(self, chunk):
+        start = time.perf_counter()
+        try:
+            path = writeChunk(self.directory, chunk.build(), self.firstChunk + self.chunksWritten + self.writeErrors)
+        except (OSError, ValueError) as e:
+            self.writeErrors += 1
+            log.error('Could not write column store chunk: %s' % (e))
+            return
+        now = time.perf_counter()
+        self.syncTime.observe(now - start)
+        for enqueueTime in chunk.enqueueTimes:
+            self.latency.observe(now - enqueueTime)
+        self.framesWritten += len(chunk)
+        self.chunksWritten += 1
+        self.bytesWritten += os.path.getsize(path)
+
+    def getStats(self):
+        return {
+            'framesQueued': self.framesQueued,
+            'framesWritten': self.framesWritten,
+            'framesDropped': self.framesDropped,
+            'bytesWritten': self.bytesWritten,
+            'chunksWritten': self.chunksWritten,
+            'backlog': self.framesQueued - self.framesWritten,
+            'writeErrors': self.writeErrors,
+            'latency': self.latency.getStats(),
+            'syncTime': self.syncTime.getStats(),
+        }
+
+    # Write out the partial chunk and everything queued, then stop
+    def stop(self, timeout=None):
+        with self.lock:
+            if (len(self.chunk) > 0):
+                self.chunkQueue.put(self.chunk)
+                self.chunk = _ChunkBuilder(self.trackColumns)
+        self.stopEvent.set()
+        self.join(timeout)
+
+# Reads a directory written by ColumnStoreWriter. Only the requested columns are decompressed, and only from the
+# chunks that overlap the requested time range.
+#
+#     reader = ColumnStoreReader('TrackingStore/<timestamp>')
+#     data = reader.read(['frames.timestamp', 'heights.frame', 'heights.maxZ'], startTime, endTime)
+#     data['heights.maxZ']            # every chunk's values joined into one array
+#
+# 'frame' columns are rows of the frames table as returned, that is counted across all the chunks read.
+# The time range selects whole chunks, rows are not filtered.
+class ColumnStoreReader():
+    def __init__(self, directory):
+        self.directory = directory
+        self.info = {}
+        infoPath = os.path.join(directory, STORE_INFO_FILE)
+        if (os.path.exists(infoPath)):
+            with open(infoPath, 'r') as fp:
+                self.info = json.load(fp)
+        self.chunks = sorted(glob.glob(os.path.join(directory, CHUNK_PATTERN)))
+
+    # 'table.column' names available
+    def columns(self):
+        trackState = self.info.get('trackState', True)
+        return [table + '.' + column for table, columns in STORE_COLUMNS.items() for column in columns if trackState or table != 'tracks' or column not in TRACK_STATE_COLUMNS]
+
+    def chunksBetween(self, startTime=None, endTime=None):
+        chunks = []
+        for path in self.chunks:
+            chunkStart, chunkEnd = _chunkTimes(path)
+            if ((startTime is None or chunkEnd >= startTime) and (endTime is None or chunkStart < endTime)):
+                chunks.append(path)
+        return chunks
+
+    def read(self, columns, startTime=None, endTime=None):
+        for name in columns:
+            table, _, column = name.partition('.')
+            if (column not in STORE_COLUMNS.get(table, {})):
+                raise KeyError('No column %s in the store, see columns()' % (name))
+        parts = dict((name, []) for name in columns)
+        framesBefore = 0
+        for path in self.chunksBetween(startTime, endTime):
+            with np.load(path) as chunk:
+                meta = json.loads(str(chunk[META_KEY]))
+                for name in columns:
+                    if (name not in chunk.files):
+                        raise KeyError('Column %s was not written to %s, see ColumnStoreWriter trackState' % (name, path))
+                    table, _, column = name.partition('.')
+                    values = chunk[name]
+                    # Version 1 chunks hold every column as its dtype
+                    if (meta['version'] > 1 and name not in meta['rawColumns']):
+                        values = _decodeColumn(values, *STORE_COLUMNS[table][column])
+                    if (column == 'frame'):
+                        values = values.astype(np.int64) + framesBefore
+                    parts[name].append(values)
+            framesBefore += meta['numFrames']
+        data = {}
+        for name in columns:
+            table, _, column = name.partition('.')
+            dtype = np.int64 if column == 'frame' else STORE_COLUMNS[table][column][0]
+            data[name] = np.concatenate(parts[name]).astype(dtype) if len(parts[name]) > 0 else np.zeros(0, dtype)
+        return data
+
+# Convert a raw capture (see capture.py) to a column store, eg. to compare sizes with the JSON logs
+def convertCapture(capturePath, directory, chunkSeconds=DEFAULT_CHUNK_SECONDS, trackState=False):
+    from batch import parseCapture
+    batch = parseCapture(capturePath)
+    frames, tracks, heights = batch['frames'], batch['tracks'], batch['heights']
+    if (not os.path.exists(directory)):
+        os.makedirs(directory)
+    with open(os.path.join(directory, STORE_INFO_FILE), 'w') as fp:
+        json.dump({'version': STORE_VERSION, 'source': capturePath, 'trackState': trackState, 'created': time.time()}, fp, indent=4)
+    trackColumns = _trackColumns(trackState)
+    numTracks = np.diff(batch['trackOffsets'])
+    numDetectedPoints = np.diff(batch['pointOffsets'])
+    timestamps = frames['timestamp']
+    start = 0
+    paths = []
+    while (start < len(timestamps)):
+        if (np.isfinite(timestamps[start])):
+            end = int(np.searchsorted(timestamps, timestamps[start] + chunkSeconds, 'left'))
+        else:
+            end = start + DEFAULT_CHUNK_FRAMES
+        end = min(max(end, start + 1), start + DEFAULT_CHUNK_FRAMES, len(timestamps))
+        tables = {'frames': {
+            'frameNum': frames['frameNum'][start:end],
+            'timestamp': timestamps[start:end],
+            'numDetectedPoints': numDetectedPoints[start:end],
+            'numTracks': numTracks[start:end],
+        }}
+        for table, offsets, source in (('tracks', batch['trackOffsets'], tracks), ('heights', batch['heightOffsets'], heights)):
+            rows = slice(offsets[start], offsets[end])
+            tables[table] = dict((column, source[column][rows]) for column in STORE_COLUMNS[table] if column != 'frame' and (table != 'tracks' or column in trackColumns))
+            tables[table]['frame'] = source['frame'][rows] - start
+        paths.append(writeChunk(directory, tables, len(paths)))
+        start = end
+    return paths
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    argParser = argparse.ArgumentParser(description='Convert a raw capture to a compressed column store')
+    argParser.add_argument('capture', help='capture file or directory, see capture.py')
+    argParser.add_argument('directory', help='column store directory to write')
+    argParser.add_argument('--chunk-seconds', type=float, default=DEFAULT_CHUNK_SECONDS)
+    argParser.add_argument('--track-state', action='store_true', help='also store track velocity, acceleration, gating gain and confidence')
+    args = argParser.parse_args()
+    paths = convertCapture(args.capture, args.directory, args.chunk_seconds, args.track_state)
+    print('Wrote %d chunks, %d bytes' % (len(paths), sum(os.path.getsize(path) for path in paths)))
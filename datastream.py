@@ -11,27 +11,44 @@ import logging
 log = logging.getLogger(__name__)
 
 #Local Imports
-from parseFrame import parseStandardFrame
-
-UART_MAGIC_WORD = bytearray(b'\x02\x01\x04\x03\x06\x05\x08\x07')
+from parseFrame import parseRadarFrame
+from lazy_frame import LazyFrame
+from uart_framer import UARTFramer, UART_MAGIC_WORD
+from replay import ReplaySource, REPLAY_REALTIME, DEFAULT_FRAME_PERIOD
+from capture import CaptureWriter
+from frame_continuity import FrameContinuityTracker
+from cfg_sender import sendCfgLines, DEFAULT_ACK_TIMEOUT
 
 class UARTParser():
     def __init__(self,type):
         # Set this option to 1 to save UART output from the radar device
         self.saveBinary = 0
         self.replay = 0
+        self.replaySource = None
+        # Recorded time of the last frame replayHist returned
+        self.lastFrameTime = None
+        # outputDict keys (or TLV types) the caller reads. When set, frames are LazyFrames that only decode these,
+        # otherwise they are RadarFrames
+        self.subscriptions = None
+        # buffer_pool.BufferPool to parse frames into. Frames must then be released (or retained) by the caller
+        self.bufferPool = None
+        # frameNum gaps, duplicates and arrival jitter of every frame parsed, see frame_continuity.py
+        self.continuity = FrameContinuityTracker()
         self.binData = bytearray(0)
+        self.captureWriter = None
         self.uartCounter = 0
         self.framesPerFile = 100
         self.first_file = True
         self.filepath = datetime.datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
         self.parserType = type
         self.dataCom = None
+        self.dataFramer = None
+        self.cliFramer = None
         self.isLowPowerDevice = False
         self.cfg = ""
+        self.cfgResult = None # what the last sendCfg reported
         self.demo = ""
         self.device = "xWR6843"
-        self.frames = [] # TODO this needs to be reset if connection is reset
         
         # Data storage
         self.now_time = datetime.datetime.now().strftime('%Y%m%d-%H%M')
@@ -41,11 +58,54 @@ class UARTParser():
         self.cliCom = serial.Serial(cliCom, 115200, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE, timeout=0.6)
         self.dataCom = serial.Serial(dataCom, 921600, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE, timeout=0.6)
         self.dataCom.reset_output_buffer()
+        self.dataFramer = UARTFramer(self.dataCom)
+        self.cliFramer = UARTFramer(self.cliCom)
         log.info('Connected')
 
+    # Separate connectComPort (not PortS) for xWRL6432 because it only uses one port
+    def connectComPort(self, cliCom, cliBaud=115200):
+        # Longer timeout time for xWRL6432 to support applications with low power / low update rate
+        self.cliCom = serial.Serial(cliCom, cliBaud, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE, timeout=.6)
+        self.cliCom.reset_output_buffer()
+        self.cliFramer = UARTFramer(self.cliCom)
+        log.info('Connected (one port) with baud rate ' + str(cliBaud))
+        self.isLowPowerDevice = True
+
+    # Read frames from a recording instead of the serial port. See replay.ReplaySource for the speed options
+    def setReplay(self, path, speed=REPLAY_REALTIME, framePeriod=DEFAULT_FRAME_PERIOD):
+        self.replaySource = ReplaySource(path, speed, framePeriod)
+        self.replay = 1
+
+    # Called in place of a serial read when replay is set. Returns None once the recording is exhausted
+    def replayHist(self):
+        frame = self.replaySource.nextFrame()
+        if (frame is None):
+            return None
+        recordedTime, frameData = frame
+        self.lastFrameTime = recordedTime
+        outputDict = self.parseFrame(frameData)
+        self.continuity.updateFrame(outputDict, recordedTime)
+        return outputDict
+
+    # Parse a complete frame, lazily if the caller has subscribed to a subset of the outputs
+    def parseFrame(self, frameData):
+        buffers = self.bufferPool.acquire() if self.bufferPool is not None else None
+        if (self.subscriptions is not None):
+            return LazyFrame(frameData, self.subscriptions, buffers)
+        frame = parseRadarFrame(frameData, buffers.outputBuffers if buffers is not None else None)
+        frame.buffers = buffers
+        return frame
+
     def setSaveBinary(self, saveBinary = 1):
         self.saveBinary = saveBinary
 
+    # Close the capture being recorded, so its last segment and index are complete on disk. Recording starts
+    # a new capture if frames are parsed after this
+    def close(self):
+        if (self.captureWriter is not None):
+            self.captureWriter.close()
+            self.captureWriter = None
+
     # This function is always called - first read the UART, then call a function to parse the specific demo output
     # This will return 1 frame of data. This must be called for each frame of data that is expected. It will return a dict containing all output info
     # Point Cloud and Target structure are liable to change based on the lab. Output is always cartesian.
@@ -56,103 +116,34 @@ class UARTParser():
         if (self.replay):
             return self.replayHist()
 
-        data = {'cfg': self.cfg, 'demo': self.demo, 'device': self.device}
-    
-        # Find magic word, and therefore the start of the frame
-        index = 0
-        magicByte = self.dataCom.read(1)
-        frameData = bytearray(b'')
-        while (1):
-            # If the device doesn't transmit any data, the COMPort read function will eventually timeout
-            # Which means magicByte will hold no data, and the call to magicByte[0] will produce an error
-            # This check ensures we can give a meaningful error
-            if (len(magicByte) < 1):
-                log.error("ERROR: No data detected on COM Port, read timed out")
-                log.error("\tBe sure that the device is in the proper mode, and that the cfg you are sending is valid")
-                magicByte = self.dataCom.read(1)
-                
-            # Found matching byte
-            elif (magicByte[0] == UART_MAGIC_WORD[index]):
-                index += 1
-                frameData.append(magicByte[0])
-                if (index == 8): # Found the full magic word
-                    break
-                magicByte = self.dataCom.read(1)
-                
-            else:
-                # When you fail, you need to compare your byte against that byte (ie the 4th) AS WELL AS compare it to the first byte of sequence
-                # Therefore, we should only read a new byte if we are sure the current byte does not match the 1st byte of the magic word sequence
-                if (index == 0): 
-                    magicByte = self.dataCom.read(1)
-                index = 0 # Reset index
-                frameData = bytearray(b'') # Reset current frame data
-        
-        # Read in version from the header
-        versionBytes = self.dataCom.read(4)
-        
-        frameData += bytearray(versionBytes)
-
-        # Read in length from header
-        lengthBytes = self.dataCom.read(4)
-        frameData += bytearray(lengthBytes)
-        frameLength = int.from_bytes(lengthBytes, byteorder='little')
-        
-        # Subtract bytes that have already been read, IE magic word, version, and length
-        # This ensures that we only read the part of the frame in that we are lacking
-        frameLength -= 16 
-
-        # Read in rest of the frame
-        frameData += bytearray(self.dataCom.read(frameLength))
+        return self.parseFrameDoubleCOMPort(self.readFrameDoubleCOMPort())
 
+    # Read one complete raw frame from the data port
+    def readFrameDoubleCOMPort(self):
+        # Find magic word, and therefore the start of the frame
+        # The framer keeps waiting through read timeouts, logging an error each time, like the byte-wise search did
+        frameData = self.dataFramer.readFrame()
+        while (frameData is None):
+            frameData = self.dataFramer.readFrame()
+        return frameData
+
+    # Parse a raw frame read from the data port. Split out from readAndParseUartDoubleCOMPort so frames
+    # read on another thread (see acquisition.FrameAcquisitionThread) go through the same parsing and saving
+    def parseFrameDoubleCOMPort(self, frameData, timestamp=None):
         # frameData now contains an entire frame, send it to parser
         if (self.parserType == "DoubleCOMPort"):
-            outputDict = parseStandardFrame(frameData)
+            outputDict = self.parseFrame(frameData)
+            self.continuity.updateFrame(outputDict, timestamp)
         else:
             log.error('FAILURE: Bad parserType')
 
         # If save binary is enabled
         if(self.saveBinary == 1):
-            # Save data every framesPerFile frames
             self.uartCounter += 1
-
-            # uncomment below to save bin data in Matlab-friendly format
-            # self.binData += frameData
-            # if (self.uartCounter % self.framesPerFile == 0):
-            #     # First file requires the path to be set up
-            #     if(self.first_file is True): 
-            #         if(os.path.exists('binData/') == False):
-            #             # Note that this will create the folder in the caller's path, not necessarily in the Industrial Viz Folder                        
-            #             os.mkdir('binData/')
-            #         os.mkdir('binData/'+self.filepath)
-            #         self.first_file = False
-            #     toSave = bytes(self.binData)
-            #     fileName = 'binData/' + self.filepath + '/pHistBytes_' + str(math.floor(self.uartCounter/self.framesPerFile)) + '.bin'
-            #     bfile = open(fileName, 'wb')
-            #     bfile.write(toSave)
-            #     bfile.close()
-            #     # Reset binData and missed frames
-            #     self.binData = []
- 
-            # Saving data here for replay
-            # frameJSON = {}
-            # frameJSON['frameData'] = outputDict
-            # frameJSON['timestamp'] = time.time()
-            # # frameJSON['CurrTime'] = time.ctime(frameJSON['timestamp']) # Add human-readable timestamp
-
-            # self.frames.append(frameJSON)
-            # data['data'] = self.frames
-
-            # if (self.uartCounter % self.framesPerFile == 0):
-            #     if(self.first_file is True): 
-            #         if(os.path.exists('binData/') == False):
-            #             # Note that this will create the folder in the caller's path, not necessarily in the viz folder            
-            #             os.mkdir('binData/')
-            #         os.mkdir('binData/'+self.filepath)
-            #         self.first_file = False
-            #     with open('./binData/'+self.filepath+'/replay_' + str(math.floor(self.uartCounter/self.framesPerFile)) + '.json', 'w') as fp:
-            #         json_object = json.dumps(data, indent=4)
-            #         fp.write(json_object)
-            #         # self.frames = [] uncomment to put data into one file at a time in 100 frame chunks
+            # Append the raw frame to the capture, see capture.py for the format
+            if (self.captureWriter is None):
+                self.captureWriter = CaptureWriter('binData/' + self.filepath)
+            self.captureWriter.write(frameData, timestamp)
         
         return outputDict
 
@@ -167,144 +158,34 @@ class UARTParser():
         if (self.replay):
             return self.replayHist()
 
-        data = {'cfg': self.cfg, 'demo': self.demo, 'device': self.device}
-    
         # Find magic word, and therefore the start of the frame
-        index = 0
-        magicByte = self.cliCom.read(1)
-        frameData = bytearray(b'')
-        while (1):
-            # If the device doesn't transmit any data, the COMPort read function will eventually timeout
-            # Which means magicByte will hold no data, and the call to magicByte[0] will produce an error
-            # This check ensures we can give a meaningful error
-            if (len(magicByte) < 1):
-                log.error("ERROR: No data detected on COM Port, read timed out")
-                log.error("\tBe sure that the device is in the proper mode, and that the cfg you are sending is valid")
-                magicByte = self.cliCom.read(1)
-
-            # Found matching byte
-            elif (magicByte[0] == UART_MAGIC_WORD[index]):
-                index += 1
-                frameData.append(magicByte[0])
-                if (index == 8): # Found the full magic word
-                    break
-                magicByte = self.cliCom.read(1)
-                
-            else:
-                # When you fail, you need to compare your byte against that byte (ie the 4th) AS WELL AS compare it to the first byte of sequence
-                # Therefore, we should only read a new byte if we are sure the current byte does not match the 1st byte of the magic word sequence
-                if (index == 0):
-                    magicByte = self.cliCom.read(1)
-                index = 0 # Reset index
-                frameData = bytearray(b'') # Reset current frame data
-        
-        # Read in version from the header
-        versionBytes = self.cliCom.read(4)
-        
-        frameData += bytearray(versionBytes)
-
-        # Read in length from header
-        lengthBytes = self.cliCom.read(4)
-        frameData += bytearray(lengthBytes)
-        frameLength = int.from_bytes(lengthBytes, byteorder='little')
-        
-        # Subtract bytes that have already been read, IE magic word, version, and length
-        # This ensures that we only read the part of the frame in that we are lacking
-        frameLength -= 16 
-
-        # Read in rest of the frame
-        frameData += bytearray(self.cliCom.read(frameLength))
+        # The framer keeps waiting through read timeouts, logging an error each time, like the byte-wise search did
+        frameData = self.cliFramer.readFrame()
+        while (frameData is None):
+            frameData = self.cliFramer.readFrame()
 
         # frameData now contains an entire frame, send it to parser
         if (self.parserType == "SingleCOMPort"):
-            outputDict = parseStandardFrame(frameData)
+            outputDict = self.parseFrame(frameData)
+            self.continuity.updateFrame(outputDict)
         else:
             log.error('FAILURE: Bad parserType')
 
         # If save binary is enabled
         if(self.saveBinary == 1):
-            self.binData += frameData
-            # Save data every framesPerFile frames
             self.uartCounter += 1
-
-            # uncomment below to save bin data in Matlab-friendly format
-            # self.binData += frameData
-            # if (self.uartCounter % self.framesPerFile == 0):
-            #     # First file requires the path to be set up
-            #     if(self.first_file is True): 
-            #         if(os.path.exists('binData/') == False):
-            #             # Note that this will create the folder in the caller's path, not necessarily in the Industrial Viz Folder                        
-            #             os.mkdir('binData/')
-            #         os.mkdir('binData/'+self.filepath)
-            #         self.first_file = False
-            #     toSave = bytes(self.binData)
-                
-            #     fileName = 'binData/'+self.filepath+'/pHistBytes_'+str(math.floor(self.uartCounter/self.framesPerFile))+'.bin'
-            #     bfile = open(fileName, 'wb')
-            #     bfile.write(toSave)
-            #     bfile.close()
-            #     # Reset binData and missed frames
-            #     self.binData = []
-
-            # Saving data here for replay
-            frameJSON = {}
-            frameJSON['frameData'] = outputDict
-            frameJSON['timestamp'] = time.time()
-            frameJSON['CurrTime'] = time.ctime(frameJSON['timestamp']) # Add human-readable timestamp
-
-            self.frames.append(frameJSON)
-            data['data'] = self.frames
-
-            if (self.uartCounter % self.framesPerFile == 0):
-                if(self.first_file is True): 
-                    if(os.path.exists('binData/') == False):
-                        # Note that this will create the folder in the caller's path, not necessarily in the viz folder            
-                        os.mkdir('binData/')
-                    os.mkdir('binData/'+self.filepath)
-                    self.first_file = False
-                with open('./binData/'+self.filepath+'/replay_' + str(math.floor(self.uartCounter/self.framesPerFile)) + '.json', 'w') as fp:
-                    json_object = json.dumps(data, indent=4)
-                    fp.write(json_object)
-                    self.frames = [] #uncomment to put data into one file at a time in 100 frame chunks
+            # Append the raw frame to the capture, see capture.py for the format
+            if (self.captureWriter is None):
+                self.captureWriter = CaptureWriter('binData/' + self.filepath)
+            self.captureWriter.write(frameData)
         
         return outputDict
 
-    def sendCfg(self, cfg):
-        # Remove empty lines from the cfg
-        cfg = [line for line in cfg if line != '\n']
-        # Ensure \n at end of each line
-        cfg = [line + '\n' if not line.endswith('\n') else line for line in cfg]
-        # Remove commented lines
-        cfg = [line for line in cfg if line[0] != '%']
-
-        for line in cfg:
-            time.sleep(.03) # Line delay
-
-            if(self.cliCom.baudrate == 1250000):
-                for char in [*line]:
-                    time.sleep(.001) # Character delay. Required for demos which are 1250000 baud by default else characters are skipped
-                    self.cliCom.write(char.encode())
-            else:
-                self.cliCom.write(line.encode())
-                
-            # ack = self.cliCom.readline()
-            # print(ack, flush=True)
-            # ack = self.cliCom.readline()
-            # print(ack, flush=True)
-            # if (self.isLowPowerDevice):
-            #     ack = self.cliCom.readline()
-            #     print(ack, flush=True)
-            #     ack = self.cliCom.readline()
-            #     print(ack, flush=True)
-
-            # splitLine = line.split()
-            # if(splitLine[0] == "baudRate"): # The baudrate CLI line changes the CLI baud rate on the next cfg line to enable greater data streaming off the xWRL device.
-            #     try:
-            #         self.cliCom.baudrate = int(splitLine[1])
-            #     except:
-            #         log.error("Error - Invalid baud rate")
-            #         sys.exit(1)
-        # Give a short amount of time for the buffer to clear
-        time.sleep(0.03)
+    # Send the cfg line by line, each one as soon as the device has acknowledged the previous one.
+    # Returns the cfg_sender.sendCfgLines result: per line errors and the total configuration time
+    def sendCfg(self, cfg, timeout=DEFAULT_ACK_TIMEOUT):
+        self.cfgResult = sendCfgLines(self.cliCom, cfg, timeout)
+        # Drop the prompt printed after the last line
         self.cliCom.reset_input_buffer()
-        # NOTE - Do NOT close the CLI port because 6432 will use it after configuration  
\ No newline at end of file
+        # NOTE - Do NOT close the CLI port because 6432 will use it after configuration
+        return self.cfgResult
\ No newline at end of file
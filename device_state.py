@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import time
+from serial.tools import list_ports
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from cfg_sender import normaliseCfg, sendCommand, CFG_LINE_DONE, ACK_POLL_INTERVAL
+
+# Where the cfg last applied to each device is remembered, in the caller's path like TrackingData/
+DEFAULT_STATE_FILE = 'deviceState.json'
+VERSION_TIMEOUT = 1.0
+
+# Hash of what a cfg sends to the device: comments, blank lines and differences in whitespace don't change it
+def cfgFingerprint(cfg):
+    digest = hashlib.sha256()
+    for line in normaliseCfg(cfg):
+        digest.update((' '.join(line.split()) + '\n').encode())
+    return digest.hexdigest()
+
+# Something that identifies the radar behind a serial port across restarts: the USB serial number of its
+# UART bridge if there is one, the port name otherwise
+def getDeviceId(portName):
+    for port in list_ports.comports():
+        if (port.device == portName and port.serial_number):
+            return port.serial_number
+    return portName
+
+# The device's answer to the version CLI command (firmware, SDK and silicon versions) as a list of lines,
+# or None if the CLI didn't answer
+def queryVersion(cliCom, timeout=VERSION_TIMEOUT):
+    cliCom.reset_input_buffer()
+    portTimeout = cliCom.timeout
+    cliCom.timeout = ACK_POLL_INTERVAL
+    try:
+        status, message, response = sendCommand(cliCom, 'version\n', timeout)
+    finally:
+        cliCom.timeout = portTimeout
+    if (status != CFG_LINE_DONE):
+        return None
+    # Drop the echoed command, the Done line and the prompt
+    lines = [line.strip() for line in response.splitlines()]
+    return [line for line in lines if ':' in line and not line.endswith(':/>')]
+
+# The cfg fingerprint (and firmware version) last applied to each device, kept in a small JSON file so that a
+# restart can tell whether the device is still running the cfg it is about to send.
+#
+#     store = DeviceStateStore()
+#     record = store.get(deviceId)        # {'cfgHash', 'cfgFile', 'version', 'appliedAt'} or None
+#     store.set(deviceId, cfgFingerprint(cfg), 'Final_config_6m.cfg', version)
+class DeviceStateStore():
+    def __init__(self, path=DEFAULT_STATE_FILE):
+        self.path = path
+        self.devices = {}
+        if (os.path.exists(path)):
+            try:
+                with open(path, 'r') as fp:
+                    self.devices = json.load(fp)
+            except (OSError, ValueError) as e:
+                log.warning('Could not read %s, ignoring it: %s' % (path, e))
+
+    def get(self, deviceId):
+        return self.devices.get(deviceId)
+
+    def set(self, deviceId, cfgHash, cfgFile=None, version=None):
+        self.devices[deviceId] = {'cfgHash': cfgHash, 'cfgFile': cfgFile, 'version': version, 'appliedAt': time.time()}
+        self.save()
+
+    def forget(self, deviceId):
+        if (self.devices.pop(deviceId, None) is not None):
+            self.save()
+
+    # Written to a temporary file first so a crash never leaves half a file behind
+    def save(self):
+        tempPath = self.path + '.tmp'
+        with open(tempPath, 'w') as fp:
+            json.dump(self.devices, fp, indent=4)
+        os.replace(tempPath, self.path)
+
+    # True if the device was last configured with cfgHash on the same firmware
+    def isApplied(self, deviceId, cfgHash, version=None):
+        record = self.get(deviceId)
+        if (record is None or record['cfgHash'] != cfgHash):
+            return False
+        return version is None or record.get('version') is None or record['version'] == version
@@ -0,0 +1,180 @@
+import time
+import numpy as np
+from collections import deque
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# timeCPUCycles counts cycles of the R4F, which runs at 200 MHz on the IWR6843
+DEVICE_CPU_CLOCK_HZ = 200e6
+# frameNum and timeCPUCycles are uint32 and wrap around
+COUNTER_MODULO = 1 << 32
+# Frames arriving at most this many frame numbers late can be reordered or duplicates. Any other step back
+# means the device was restarted (sensorStop / sensorStart count from 1 again)
+DEFAULT_REORDER_WINDOW = 16
+DEFAULT_WINDOW_SIZE = 200
+
+# Result of FrameContinuityTracker.update
+FRAME_IN_ORDER = 'inOrder'
+FRAME_AFTER_GAP = 'gap'
+FRAME_DUPLICATE = 'duplicate'
+FRAME_REORDERED = 'reordered'
+FRAME_RESTART = 'restart'
+FRAME_FIRST = 'first'
+
+# Signed difference a - b of two wrapping uint32 counters
+def counterDelta(a, b):
+    delta = (a - b) % COUNTER_MODULO
+    return delta - COUNTER_MODULO if delta >= COUNTER_MODULO // 2 else delta
+
+# Checks the frameNum of every frame that reaches the host for gaps (lost frames), duplicates and reordering,
+# and compares the device's frame timing (timeCPUCycles) with the host's arrival times.
+#
+#     tracker = FrameContinuityTracker()
+#     tracker.update(frame['frameNum'], frame['timeCPUCycles'], arrivalTime)
+#     tracker.getStats()     # {'lost': 3, 'lossRate': 0.002, 'rollingLossRate': 0.0, 'arrivalJitter': 0.004, ...}
+#
+# A frame that arrives late (its frameNum is behind the newest one) and had been counted as lost is taken
+# off the lost count again and counted as reordered. Rolling figures cover the last windowSize frames.
+#
+# Device period is the time between consecutive frames by timeCPUCycles. Arrival jitter is how much the host's
+# arrival interval differs from that, so it is the delay the UART, the OS and our own reads add, not the
+# device's own timing. It is reported both as the RFC 3550 running estimate and as a rolling standard deviation.
+class FrameContinuityTracker():
+    def __init__(self, windowSize=DEFAULT_WINDOW_SIZE, cpuClockHz=DEVICE_CPU_CLOCK_HZ, reorderWindow=DEFAULT_REORDER_WINDOW):
+        self.windowSize = windowSize
+        self.cpuClockHz = cpuClockHz
+        self.reorderWindow = reorderWindow
+        self.reset()
+
+    def reset(self):
+        self.lastFrameNum = None
+        self.lastCPUCycles = None
+        self.lastArrivalTime = None
+        self.missing = deque() # frame numbers counted as lost that could still arrive late
+        self.missingSet = set()
+        self.recentFrames = deque(maxlen=self.reorderWindow + 1) # (frameNum, timeCPUCycles) received lately
+
+        # Counters
+        self.received = 0
+        self.lost = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.restarts = 0
+        self.jitter = 0.0 # RFC 3550 running estimate, in seconds
+
+        # Rolling windows
+        self.recentLost = deque(maxlen=self.windowSize) # frames lost just before each received frame
+        self.devicePeriods = deque(maxlen=self.windowSize)
+        self.arrivalIntervals = deque(maxlen=self.windowSize)
+        self.transitDeltas = deque(maxlen=self.windowSize) # arrival interval - device interval
+
+    # Record the frame numbers skipped by a gap, keeping only the ones that could still arrive
+    def _addMissing(self, firstFrameNum, numMissing):
+        for i in range(max(numMissing - self.reorderWindow, 0), numMissing):
+            frameNum = (firstFrameNum + i) % COUNTER_MODULO
+            self.missing.append(frameNum)
+            self.missingSet.add(frameNum)
+        while (len(self.missing) > self.reorderWindow):
+            self.missingSet.discard(self.missing.popleft())
+
+    # Record one received frame. arrivalTime is the host time the frame was read (time.time() if None),
+    # timeCPUCycles may be None if it isn't known. Returns one of the FRAME_* results
+    def update(self, frameNum, timeCPUCycles=None, arrivalTime=None):
+        if (arrivalTime is None):
+            arrivalTime = time.time()
+        self.received += 1
+
+        if (self.lastFrameNum is None):
+            self._setLast(frameNum, timeCPUCycles, arrivalTime, 1)
+            self.recentLost.append(0)
+            return FRAME_FIRST
+
+        delta = counterDelta(frameNum, self.lastFrameNum)
+        if (delta == 1):
+            result = FRAME_IN_ORDER
+            self.recentLost.append(0)
+        elif (delta > 1):
+            result = FRAME_AFTER_GAP
+            self.lost += delta - 1
+            self.recentLost.append(delta - 1)
+            self._addMissing(self.lastFrameNum + 1, delta - 1)
+            self.gaps += 1
+            if (self.gaps == 1 or self.gaps % 100 == 0):
+                log.warning('Frames %d to %d never arrived, %d frames lost so far' % (self.lastFrameNum + 1, frameNum - 1, self.lost))
+        elif (frameNum in self.missingSet):
+            # Late, and already counted as lost
+            self.missing.remove(frameNum)
+            self.missingSet.discard(frameNum)
+            self.lost -= 1
+            self.reordered += 1
+            self.recentLost.append(-1)
+            # So a second copy of it is a duplicate, not a restart
+            self.recentFrames.append((frameNum, timeCPUCycles))
+            return FRAME_REORDERED
+        elif ((frameNum, timeCPUCycles) in self.recentFrames):
+            # Same number and same device time. Without timeCPUCycles a matching number is enough
+            self.duplicates += 1
+            self.recentLost.append(0)
+            return FRAME_DUPLICATE
+        else:
+            # The device was restarted, frame numbers start again. Nothing is lost and timing starts over
+            result = FRAME_RESTART
+            self.restarts += 1
+            self.recentLost.append(0)
+            self.missing.clear()
+            self.missingSet.clear()
+            self.recentFrames.clear()
+            self._setLast(frameNum, timeCPUCycles, arrivalTime, 0)
+            return result
+
+        self._setLast(frameNum, timeCPUCycles, arrivalTime, delta)
+        return result
+
+    # Move on to a newer frame, measuring its timing against the previous one. numFrames frame periods separate them
+    def _setLast(self, frameNum, timeCPUCycles, arrivalTime, numFrames):
+        if (numFrames > 0 and self.lastArrivalTime is not None):
+            arrivalInterval = (arrivalTime - self.lastArrivalTime) / numFrames
+            self.arrivalIntervals.append(arrivalInterval)
+            if (timeCPUCycles is not None and self.lastCPUCycles is not None):
+                devicePeriod = ((timeCPUCycles - self.lastCPUCycles) % COUNTER_MODULO) / self.cpuClockHz / numFrames
+                self.devicePeriods.append(devicePeriod)
+                transitDelta = arrivalInterval - devicePeriod
+                self.transitDeltas.append(transitDelta)
+                self.jitter += (abs(transitDelta) - self.jitter) / 16
+        self.lastFrameNum = frameNum
+        self.recentFrames.append((frameNum, timeCPUCycles))
+        self.lastCPUCycles = timeCPUCycles
+        self.lastArrivalTime = arrivalTime
+
+    # Record a parsed frame (dict, RadarFrame or LazyFrame). Frames whose header couldn't be read are ignored
+    def updateFrame(self, outputDict, arrivalTime=None):
+        if ('frameNum' not in outputDict):
+            return None
+        return self.update(outputDict['frameNum'], outputDict.get('timeCPUCycles'), arrivalTime)
+
+    def getStats(self):
+        expected = self.received - self.duplicates + self.lost
+        recentLost = sum(self.recentLost)
+        stats = {
+            'received': self.received,
+            'lost': self.lost,
+            'gaps': self.gaps,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'restarts': self.restarts,
+            'lossRate': self.lost / expected if expected > 0 else 0.0,
+            'rollingLossRate': recentLost / (len(self.recentLost) + recentLost) if len(self.recentLost) > 0 else 0.0,
+            'arrivalJitter': self.jitter,
+        }
+        if (len(self.devicePeriods) > 0):
+            stats['devicePeriod'] = float(np.mean(self.devicePeriods))
+            stats['devicePeriodStd'] = float(np.std(self.devicePeriods))
+        if (len(self.arrivalIntervals) > 0):
+            stats['arrivalInterval'] = float(np.mean(self.arrivalIntervals))
+        if (len(self.transitDeltas) > 0):
+            stats['rollingArrivalJitter'] = float(np.std(self.transitDeltas))
+            stats['maxTransitDelta'] = float(np.max(np.abs(self.transitDeltas)))
+        return stats
@@ -0,0 +1,135 @@
+import sys
+from collections.abc import Mapping
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Upper bound on what a ring holds when no byte budget is given. A people tracking frame is a few kB parsed
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Rough number of bytes a frame keeps alive: arrays by their data, containers by their items. A LazyFrame is
+# counted by its raw frame plus whatever it decoded so far, without decoding anything more
+def estimateSize(value):
+    if (isinstance(value, np.ndarray)):
+        return value.nbytes
+    if (hasattr(value, 'frameData') and hasattr(value, 'outputDict')):
+        return len(value.frameData) + estimateSize(value.outputDict)
+    if (isinstance(value, Mapping)):
+        return sys.getsizeof(value) + sum(estimateSize(item) for item in value.values())
+    if (isinstance(value, (list, tuple))):
+        return sys.getsizeof(value) + sum(estimateSize(item) for item in value)
+    return sys.getsizeof(value)
+
+# The most recent frames, bounded by a frame count and by an estimated byte budget, so keeping frames around
+# costs the same memory after a week as after a minute. Appending is O(1): frames live in a fixed list of
+# maxFrames slots used as a circular buffer, and the oldest ones are evicted when either limit is reached.
+#
+#     ring = FrameRing(100)                       # the last 100 frames, at most DEFAULT_MAX_BYTES
+#     ring.append(frame)
+#     ring[-1], ring[-10:], len(ring)             # indexes and slices count from the oldest frame kept
+#     ring.window(20)                             # the last 20 frames, oldest first
+#
+# spill, if given, is called with every evicted frame (eg. to write it to disk) before it is dropped; errors it
+# raises are logged and otherwise ignored. Frames parsed into pooled buffers are retained on append, since
+# the ring keeps them past the next frame (see buffer_pool.py)
+class FrameRing():
+    def __init__(self, maxFrames, maxBytes=DEFAULT_MAX_BYTES, spill=None, sizeOf=estimateSize):
+        if (maxFrames < 1):
+            raise ValueError('FrameRing needs room for at least 1 frame, got %d' % (maxFrames))
+        if (maxBytes is not None and maxBytes <= 0):
+            raise ValueError('FrameRing byte budget must be positive, got %d' % (maxBytes))
+        self.maxFrames = maxFrames
+        self.maxBytes = maxBytes
+        self.spill = spill
+        self.sizeOf = sizeOf
+        self.slots = [None] * maxFrames
+        self.sizes = [0] * maxFrames
+        self.start = 0 # slot of the oldest frame
+        self.count = 0
+        self.bytes = 0
+
+        # Statistics
+        self.appended = 0
+        self.evicted = 0
+        self.spillErrors = 0
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, index):
+        return (self.start + index) % self.maxFrames
+
+    def _evictOldest(self):
+        slot = self.start
+        frame = self.slots[slot]
+        self.slots[slot] = None
+        self.bytes -= self.sizes[slot]
+        self.sizes[slot] = 0
+        self.start = (slot + 1) % self.maxFrames
+        self.count -= 1
+        self.evicted += 1
+        if (self.spill is not None):
+            try:
+                self.spill(frame)
+            except Exception as e:
+                self.spillErrors += 1
+                log.error('Could not spill frame: %s' % (e))
+
+    # Add a frame, evicting the oldest ones to stay within both limits. size is estimated if not given.
+    # A frame larger than the whole byte budget is still kept, on its own
+    def append(self, frame, size=None):
+        if (hasattr(frame, 'retain')):
+            frame.retain()
+        if (size is None):
+            size = self.sizeOf(frame)
+        if (self.count == self.maxFrames):
+            self._evictOldest()
+        if (self.maxBytes is not None):
+            while (self.count > 0 and self.bytes + size > self.maxBytes):
+                self._evictOldest()
+        slot = self._slot(self.count)
+        self.slots[slot] = frame
+        self.sizes[slot] = size
+        self.count += 1
+        self.bytes += size
+        self.appended += 1
+
+    def __getitem__(self, index):
+        if (isinstance(index, slice)):
+            return [self.slots[self._slot(i)] for i in range(*index.indices(self.count))]
+        if (index < 0):
+            index += self.count
+        if (index < 0 or index >= self.count):
+            raise IndexError('FrameRing index out of range')
+        return self.slots[self._slot(index)]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.slots[self._slot(i)]
+
+    # The last count frames (all of them if count is None), oldest first
+    def window(self, count=None):
+        if (count is None or count > self.count):
+            count = self.count
+        return self[self.count - count:]
+
+    # Drop every frame without spilling it, eg. when the connection is reset
+    def clear(self):
+        self.slots = [None] * self.maxFrames
+        self.sizes = [0] * self.maxFrames
+        self.start = 0
+        self.count = 0
+        self.bytes = 0
+
+    def getStats(self):
+        return {
+            'frames': self.count,
+            'bytes': self.bytes,
+            'maxFrames': self.maxFrames,
+            'maxBytes': self.maxBytes,
+            'appended': self.appended,
+            'evicted': self.evicted,
+            'spillErrors': self.spillErrors,
+        }
@@ -0,0 +1,184 @@
+import math
+import numpy as np
+from collections.abc import Mapping
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from parseFrame import parserFunctions, tlvOutputKeys, pointTLVLayouts, unusedTLVs, bufferedTLVs, FRAME_HEADER_STRUCT, TLV_HEADER_STRUCT
+from parseTLVs import countPoints
+
+# A parsed frame that only decodes a TLV when one of its outputs is first read.
+# Creating it only walks the frame and TLV headers, recording where each TLV is. It behaves like the
+# dict returned by parseStandardFrame, so it can be passed to the same consumers:
+#
+#     outputDict = LazyFrame(frameData, subscriptions=['heightData', 'trackData', 'numDetectedPoints'])
+#     if ('heightData' in outputDict):            # no decoding yet
+#         heights = outputDict['heightData']      # decodes the target height TLV only
+#
+# subscriptions is a list of outputDict keys and/or TLV types. TLVs that produce none of the subscribed
+# keys are left out of the frame's keys and never decoded by in, keys() or toDict(), but reading one of
+# their keys still decodes them on demand. None subscribes to everything.
+# buffers is an optional buffer_pool.FrameBuffers to decode into, see release() and retain().
+class LazyFrame(Mapping):
+    def __init__(self, frameData, subscriptions=None, buffers=None):
+        self.frameData = frameData
+        self.buffers = buffers
+        self.frameView = memoryview(frameData)
+        self.subscriptions = None if subscriptions is None else frozenset(subscriptions)
+        self.tlvs = [] # (tlvType, offset, tlvLength) of every wanted TLV, in frame order
+        self.pending = {} # outputDict key -> indexes into self.tlvs not decoded yet
+        self.unsubscribed = {} # the same for TLVs nobody subscribed to, decoded only if read
+        self.decoded = set() # indexes into self.tlvs already decoded
+        self.outputDict = {'error': 0}
+        self.numDetectedObj = 0
+        self._walk()
+
+    def isSubscribed(self, tlvType):
+        if (self.subscriptions is None or tlvType in self.subscriptions):
+            return True
+        for key in tlvOutputKeys.get(tlvType, ()):
+            if (key in self.subscriptions):
+                return True
+        return False
+
+    # Same checks and error codes as parseStandardFrame, without decoding any TLV
+    def _walk(self):
+        try:
+            magic, version, totalPacketLen, platform, frameNum, timeCPUCycles, numDetectedObj, numTLVs, subFrameNum = FRAME_HEADER_STRUCT.unpack_from(self.frameView, 0)
+        except:
+            log.error('Error: Could not read frame header')
+            self.outputDict['error'] = 1
+            return
+
+        self.outputDict['frameNum'] = frameNum
+        self.outputDict['timeCPUCycles'] = timeCPUCycles
+        self.numDetectedObj = numDetectedObj
+        offset = FRAME_HEADER_STRUCT.size
+        for i in range(numTLVs):
+            try:
+                tlvType, tlvLength = TLV_HEADER_STRUCT.unpack_from(self.frameView, offset)
+                offset += TLV_HEADER_STRUCT.size
+            except:
+                log.warning('TLV Header Parsing Failure: Ignored frame due to parsing error')
+                # parseStandardFrame returns an empty dict in this case
+                self.tlvs = []
+                self.pending = {}
+                self.unsubscribed = {}
+                self.outputDict = {}
+                return
+
+            if (tlvType in parserFunctions):
+                pending = self.pending if self.isSubscribed(tlvType) else self.unsubscribed
+                for key in tlvOutputKeys.get(tlvType, ()):
+                    pending.setdefault(key, []).append(len(self.tlvs))
+                self.tlvs.append((tlvType, offset, tlvLength))
+            elif (tlvType in unusedTLVs):
+                log.debug("No function to parse TLV type: %d" % (tlvType))
+            else:
+                log.info("Invalid TLV type: %d" % (tlvType))
+
+            # Move to next TLV
+            offset += tlvLength
+
+        # Pad offset (the length read so far) to the next largest multiple of 32
+        # since the device does this to the totalPacketLen for transmission uniformity
+        totalLenCheck = 32 * math.ceil(offset / 32)
+        if (totalLenCheck != totalPacketLen):
+            log.warning('Frame packet length read is not equal to totalPacketLen in frame header. Subsequent frames may be dropped.')
+            self.outputDict['error'] = 3
+
+    # Allocated on first use, like parseStandardFrame does for every frame
+    def _pointCloud(self):
+        if ('pointCloud' not in self.outputDict):
+            # Each point has the following: X, Y, Z, Doppler, SNR, Noise, Track index
+            if (self.buffers is not None and len(self.buffers.pointCloud) >= self.numDetectedObj):
+                pointCloud = self.buffers.pointCloud[:self.numDetectedObj]
+                pointCloud.fill(0)
+            else:
+                pointCloud = np.zeros((self.numDetectedObj, 7), np.float64)
+            # Initialize the track indexes to a value which indicates no track
+            pointCloud[:, 6] = 255
+            self.outputDict['pointCloud'] = pointCloud
+        return self.outputDict['pointCloud']
+
+    # Decode every TLV that writes key, in frame order
+    def _decode(self, key):
+        for index in self.pending.pop(key, ()):
+            if (index in self.decoded):
+                continue
+            self.decoded.add(index)
+            tlvType, offset, tlvLength = self.tlvs[index]
+            if ('pointCloud' in tlvOutputKeys.get(tlvType, ())):
+                self._pointCloud()
+            if (self.buffers is not None and tlvType in bufferedTLVs and tlvType in self.buffers.outputBuffers):
+                parserFunctions[tlvType](self.frameView[offset:offset + tlvLength], tlvLength, self.outputDict, out=self.buffers.outputBuffers[tlvType])
+            else:
+                parserFunctions[tlvType](self.frameView[offset:offset + tlvLength], tlvLength, self.outputDict)
+
+    # numDetectedPoints only needs the length of the last point cloud TLV, not its points
+    def _countPoints(self):
+        indexes = self.pending['numDetectedPoints']
+        tlvType, offset, tlvLength = self.tlvs[indexes[-1]]
+        headerSize, pointSize = pointTLVLayouts[tlvType]
+        del self.pending['numDetectedPoints']
+        self.outputDict['numDetectedPoints'] = countPoints(self.frameView[offset:offset + tlvLength], tlvLength, headerSize, pointSize, self.numDetectedObj)
+
+    def __getitem__(self, key):
+        if (key == 'numDetectedPoints' and key in self.pending and self.tlvs[self.pending[key][-1]][0] in pointTLVLayouts):
+            self._countPoints()
+        elif (key in self.pending):
+            self._decode(key)
+        elif (key in self.unsubscribed):
+            self.pending[key] = self.unsubscribed.pop(key)
+            self._decode(key)
+        elif (key == 'pointCloud' and 'frameNum' in self.outputDict):
+            return self._pointCloud()
+        return self.outputDict[key]
+
+    # Doesn't decode anything
+    def __contains__(self, key):
+        if (key in self.outputDict or key in self.pending):
+            return True
+        # The point cloud exists as soon as the frame header could be read
+        return key == 'pointCloud' and 'frameNum' in self.outputDict
+
+    def _keys(self):
+        keys = list(self.outputDict.keys())
+        for key in list(self.pending.keys()) + ['pointCloud']:
+            if (key not in keys and key in self):
+                keys.append(key)
+        return keys
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    # Decode every subscribed TLV and return the plain dict parseStandardFrame would have
+    def toDict(self):
+        for key in list(self.pending.keys()):
+            self._decode(key)
+        if ('pointCloud' in self):
+            self._pointCloud()
+        return self.outputDict
+
+    # Same as RadarFrame.release
+    def release(self):
+        if (self.buffers is not None):
+            self.buffers.release()
+            self.buffers = None
+
+    # Same as RadarFrame.retain. TLVs not decoded yet are decoded into new arrays later on
+    def retain(self):
+        if (self.buffers is not None):
+            self.buffers.copyOutputs(self.outputDict)
+            self.release()
+        return self
+
+    # Number of TLVs decoded so far, out of the TLVs in the frame that have a parser
+    def getDecodeCounts(self):
+        return len(self.decoded), len(self.tlvs)
@@ -10,23 +10,54 @@ from serial.tools import list_ports
 from contextlib import suppress
 import sys
 import platform
+import argparse
 from fall_detection import FallDetection 
+from acquisition import FrameAcquisitionThread, OVERFLOW_DROP_OLDEST
+from buffer_pool import BufferPool
+from radar_config import RadarConfig, parseRadarConfig
+from metrics import Metrics
+from cfg_sender import CFG_LINE_TIMEOUT, withSensorReset
+from device_state import DeviceStateStore, cfgFingerprint, getDeviceId, queryVersion
+from tracking_writer import TrackingLogWriter
+from column_store import ColumnStoreWriter
+from frame_ring import FrameRing
 # from new_fall_detection import FallDetection
 
+# The only frame outputs processFrame reads. Other TLVs are never decoded (see lazy_frame.py)
+FRAME_SUBSCRIPTIONS = ['heightData', 'trackData', 'numDetectedPoints']
+# Time covered by core.frames (the most recent frames) and by the acquisition queue. In frames these are 100 and 64 at 55 ms a frame
+SECONDS_PER_FILE = 5.5
+SECONDS_OF_QUEUED_FRAMES = 3.5
+# Time covered by each tracking log file, see tracking_writer.py
+SECONDS_PER_LOG_FILE = 600.0
+# Tracking log formats: newline delimited JSON (tracking_writer.py) or compressed column chunks (column_store.py)
+LOG_FORMAT_NDJSON = 'ndjson'
+LOG_FORMAT_COLUMNAR = 'columnar'
+NO_TRACKS = np.zeros((0, 16), np.float32)
+NO_HEIGHTS = np.zeros((0, 3), np.float32)
+
 class core:
     def __init__(self):
         self.parser = UARTParser(type="DoubleCOMPort")
+        self.parser.subscriptions = FRAME_SUBSCRIPTIONS
         self.tracking_data = []
         self.save_lock = threading.Lock()
-        self.frames = []
-        self.framesPerFile = 100
+        self.radarConfig = RadarConfig()
+        self.framesPerFile = self.radarConfig.framesIn(SECONDS_PER_FILE)
+        self.frames = FrameRing(self.framesPerFile)
         self.filepath = datetime.datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
         self.cfg = ""
+        self.cfgFile = None
+        self.deviceState = DeviceStateStore()
         self.demo = "3D People Tracking"
         self.device = "xWR6843"
         self.uartCounter = 0
         self.first_file = True
-        self.fallDetection = FallDetection()
+        self.fallDetection = FallDetection(self.radarConfig.maxTracks, self.radarConfig.framePeriod)
+        self.acquisition = None
+        self.writer = None
+        self.logFormat = LOG_FORMAT_NDJSON
+        self.logTrackState = False # columnar log format only, see column_store.ColumnStoreWriter
 
         # self.demoClassDict = {
         #     DEMO_OOB_x843: OOBx843(),
@@ -64,48 +95,19 @@ class core:
         # else:
         with open(fname, "r") as cfg_file:
             self.cfg = cfg_file.readlines()
+            self.cfgFile = fname
             self.parser.cfg = self.cfg
             self.parser.demo = self.demo
             self.parser.device = self.device
         for line in self.cfg:
             args = line.split()
             if len(args) > 0:
-                # trackingCfg
-                if args[0] == "trackingCfg":
-                    if len(args) < 5:
-                        print("trackingCfg had fewer arguments than expected")
-                    # else:
-                    #     with suppress(AttributeError):
-                    #         self.demoClassDict[self.demo].parseTrackingCfg(args)
-                elif args[0] == "SceneryParam" or args[0] == "boundaryBox":
-                    if len(args) < 7:
-                        print(
-                            "SceneryParam/boundaryBox had fewer arguments than expected"
-                        )
-                    # else:
-                    #     with suppress(AttributeError):
-                    #         self.demoClassDict[self.demo].parseBoundaryBox(args)
-                elif args[0] == "frameCfg":
-                    if len(args) < 4:
-                        print("frameCfg had fewer arguments than expected")
-                    # else:
-                    #     self.frameTime = float(args[5]) / 2
-                # elif args[0] == "sensorPosition":
-                    # sensorPosition for x843 family has 3 args
-                    # if DEVICE_DEMO_DICT[self.device]["isxWRx843"] and len(args) < 4:
-                    #     print("sensorPosition had fewer arguments than expected")
-                    # elif DEVICE_DEMO_DICT[self.device]["isxWRLx432"] and len(args) < 6:
-                    #     print("sensorPosition had fewer arguments than expected")
-                    # else:
-                    #     with suppress(AttributeError):
-                    #         self.demoClassDict[self.demo].parseSensorPosition(
-                    #             args, DEVICE_DEMO_DICT[self.device]["isxWRx843"]
-                    #         )
+                # frameCfg, trackingCfg, boundaryBox and sensorPosition are checked by parseRadarConfig below
                 # Only used for Small Obstacle Detection
                 # elif args[0] == "occStateMach":
                 #     numZones = int(args[1])
                 # Only used for Small Obstacle Detection
-                elif args[0] == "zoneDef":
+                if args[0] == "zoneDef":
                     if len(args) < 8:
                         print("zoneDef had fewer arguments than expected")
                     # else:
@@ -166,17 +168,200 @@ class core:
         # with suppress(AttributeError):
         #     self.demoClassDict[self.demo].setRangeValues()
 
-    def sendCfg(self):
+        # Raises ValueError for settings that can't be right, eg. a negative frame period
+        self.radarConfig = parseRadarConfig(self.cfg)
+        # Everything counted in frames follows the cfg's frame period and track count
+        self.framesPerFile = self.radarConfig.framesIn(SECONDS_PER_FILE)
+        self.frames = FrameRing(self.framesPerFile)
+        self.fallDetection = FallDetection(self.radarConfig.maxTracks, self.radarConfig.framePeriod)
+        # Parse frames into buffers sized for the cfg's maximum points and tracks, see processFrame
+        self.parser.bufferPool = BufferPool(self.radarConfig.maxPoints, self.radarConfig.maxTracks)
+
+    # Start the background thread that reads frames from the data port into a bounded queue,
+    # by default SECONDS_OF_QUEUED_FRAMES worth of them
+    def startAcquisition(self, maxQueueSize=None, overflowPolicy=OVERFLOW_DROP_OLDEST):
+        if (maxQueueSize is None):
+            maxQueueSize = self.radarConfig.framesIn(SECONDS_OF_QUEUED_FRAMES)
+        self.acquisition = FrameAcquisitionThread(self.parser.dataFramer, maxQueueSize, overflowPolicy)
+        self.acquisition.start()
+
+    # Run fall detection on a parsed frame, keep it in core.frames and queue it for the tracking log
+    def processFrame(self, trial_output, timestamp=None):
+        self.uartCounter += 1
+        frameJSON = {}
+        if ('frameNum' not in trial_output.keys()):
+            print("ERROR: No frame number data in frame")
+            frameJSON['framenumber'] = 0
+        else:
+            frameJSON['frameNumber'] = trial_output['frameNum'] 
+        
+        if ('heightData' not in trial_output.keys()):
+            print("ERROR: No height data in frame")
+            frameJSON['HeightData'] = []
+        else:
+            frameJSON['HeightData'] = trial_output['heightData'].tolist()
+            print("Height Data: ", frameJSON['HeightData'])
+
+        frameJSON['timestamp'] = timestamp if timestamp is not None else time.time()
+        frameJSON['CurrTime'] = time.ctime(frameJSON['timestamp']) # Add human-readable timestamp
+
+        
+        if ('numDetectedPoints' not in trial_output.keys()):
+            print("ERROR: No points detected in frame")
+            frameJSON['PointsDetected'] = 0
+        else:
+            frameJSON['PointsDetected'] = trial_output['numDetectedPoints']
+
+        if ('heightData' in trial_output):
+            if (len(trial_output['heightData']) != len(trial_output['trackData'])):
+                print("WARNING: number of heights does not match number of tracks")
+
+            # For each height heights for current tracks
+            for height in trial_output['heightData']:
+                # Find track with correct TID
+                for track in trial_output['trackData']:
+                    # Found correct track
+                    if (int(track[0]) == int(height[0])):
+                        tid = int(height[0])
+                        height_str = 'tid : ' + str(height[0]) + ', height : ' + str(round(height[1], 2)) + ' m'
+                        # If this track was computed to have fallen, display it on the screen
+                        
+                        fallDetectionDisplayResults = self.fallDetection.step(trial_output['heightData'], trial_output['trackData'])
+                        if (fallDetectionDisplayResults[tid] > 0): 
+                            height_str = height_str + " FALL DETECTED"
+                            print("Alert: Fall Detected for Patient")
+        # frameJSON['fallDetected'] = height_str                                
+        self.frames.append(frameJSON)
+        self.saveFrame(frameJSON, trial_output)
+        # Nothing above keeps the frame's arrays (the column store copies them), so its buffers can go back to the pool
+        trial_output.release()
+
+        # print(self.fallDetection.heightBuffer)
+
+    # Start the thread that writes frames to TrackingData/<start time>/replay_N.ndjson, or to
+    # TrackingStore/<start time>/chunk_N_*.npz with the columnar log format
+    # Note that this will create the folder in the caller's path, not necessarily in the viz folder
+    def startWriter(self):
+        if (self.logFormat == LOG_FORMAT_COLUMNAR):
+            self.writer = ColumnStoreWriter('TrackingStore/' + self.filepath, self.cfg, self.demo, self.device, trackState=self.logTrackState)
+        else:
+            self.writer = TrackingLogWriter('TrackingData/' + self.filepath, self.cfg, self.demo, self.device, self.radarConfig.framesIn(SECONDS_PER_LOG_FILE))
+        self.writer.start()
+
+    # Write out what is still queued and stop the writer thread
+    def stopWriter(self):
+        if (self.writer is not None):
+            self.writer.stop()
+            stats = self.writer.getStats()
+            print("Wrote %d frames to %s (%d dropped, %.1f ms p99 write latency)" % (stats['framesWritten'], self.writer.directory, stats['framesDropped'], (stats['latency']['p99'] or 0) * 1000))
+            self.writer = None
+
+    # Queue a frame for the writer thread, the file write never happens on this thread
+    def saveFrame(self, frameJSON, trial_output=None):
+        if (self.writer is None):
+            self.startWriter()
+        if (self.logFormat == LOG_FORMAT_COLUMNAR):
+            trackData = trial_output['trackData'] if (trial_output is not None and 'trackData' in trial_output) else NO_TRACKS
+            heightData = trial_output['heightData'] if (trial_output is not None and 'heightData' in trial_output) else NO_HEIGHTS
+            self.writer.append(frameJSON.get('frameNumber', 0), frameJSON['timestamp'], frameJSON['PointsDetected'], trackData, heightData)
+        else:
+            self.writer.write(frameJSON)
+
+    # Returns the parser's sendCfg result, None if sending failed altogether
+    def sendCfg(self, cfg=None):
         try:
-            self.parser.sendCfg(self.cfg)
+            result = self.parser.sendCfg(cfg if cfg is not None else self.cfg)
+            for lineNumber, line, status, message in result['errors']:
+                print("cfg line %d (%s) failed: %s" % (lineNumber, line, message if status != CFG_LINE_TIMEOUT else 'no response'))
+            print("Configured device in %.2f s" % (result['time']))
             sys.stdout.flush()
             # self.parseTimer.start(int(self.frameTime))  # need this line
+            return result
         except Exception as e:
             print(e)
             print("Parsing .cfg file failed. Did you select the right file?")
+            return None
+
+    # Send the cfg parseCfg loaded, unless the device is already streaming it. Returns True if it was sent.
+    # A streaming device isn't enough: deviceState.json must say this cfg was the last one applied to it,
+    # on the firmware it reports now
+    def configureDevice(self, cliPortName):
+        deviceId = getDeviceId(cliPortName)
+        cfgHash = cfgFingerprint(self.cfg)
+        version = queryVersion(self.parser.cliCom)
+        # Only bytes sent from now on mean the device is streaming
+        self.parser.dataCom.reset_input_buffer()
+        streaming = len(self.parser.dataCom.read(1)) > 0
+        if (streaming and self.deviceState.isApplied(deviceId, cfgHash, version)):
+            print("Device is already running " + self.cfgFile)
+            return False
+
+        if (streaming):
+            print("Device is running a different config, reconfiguring device with " + self.cfgFile)
+        else:
+            print("Device is not configured, configuring device with " + self.cfgFile)
+        # A send that fails or is interrupted must not look applied on the next start
+        self.deviceState.forget(deviceId)
+        result = self.sendCfg(withSensorReset(self.cfg))
+        if (result is not None and result['ok']):
+            self.deviceState.set(deviceId, cfgHash, self.cfgFile, version)
+        return True
+
+
+# Time the pipeline stages and serve them on http://127.0.0.1:port/metrics, see metrics.py
+def startMetrics(c, port):
+    metrics = Metrics()
+    metrics.instrumentParser(c.parser)
+    metrics.instrumentCore(c)
+    metrics.instrumentContinuity(c.parser.continuity)
+    if (c.writer is not None):
+        metrics.instrumentWriter(c.writer)
+    if (c.acquisition is not None):
+        metrics.instrumentAcquisition(c.acquisition)
+    metrics.startServer(port)
+    return metrics
+
+# Run a recording through the same processing as live data and report the pipeline throughput
+def runReplay(c, path, speed, metricsPort=None):
+    c.parseCfg("Final_config_6m.cfg")
+    # Recordings without timestamps are paced at the cfg's frame period
+    c.parser.setReplay(path, speed, c.radarConfig.framePeriod)
+    c.startWriter()
+    if (metricsPort is not None):
+        startMetrics(c, metricsPort)
+    numFrames = 0
+    startTime = time.perf_counter()
+    while True:
+        trial_output = c.parser.readAndParseUartDoubleCOMPort()
+        if (trial_output is None):
+            break
+        # Logged with the time it was recorded at, not the time it is replayed at
+        c.processFrame(trial_output, c.parser.lastFrameTime)
+        numFrames += 1
+    elapsed = time.perf_counter() - startTime
+    print("Replayed %d frames in %.2f s (%.1f frames/sec)" % (numFrames, elapsed, numFrames / max(elapsed, 1e-9)))
+    c.stopWriter()
+    continuity = c.parser.continuity.getStats()
+    print("%d frames lost, %d duplicated, %d reordered (loss rate %.2f%%)" % (continuity['lost'], continuity['duplicates'], continuity['reordered'], continuity['lossRate'] * 100))
 
 
 if __name__=="__main__":
+    argParser = argparse.ArgumentParser(description="Fall Detection System")
+    argParser.add_argument("--replay", help="Replay a raw recording (a .bin file or a directory of them) instead of reading the sensor")
+    argParser.add_argument("--replay-speed", type=float, default=1.0, help="1 = original timing, N = N x speed, 0 = as fast as possible")
+    argParser.add_argument("--cli-port", help="CLI serial port, eg. /dev/ttyUSB0 or a virtual_radar.py port. Detected if not given")
+    argParser.add_argument("--data-port", help="Data serial port, eg. /dev/ttyUSB1 or a virtual_radar.py port. Detected if not given")
+    argParser.add_argument("--metrics-port", type=int, help="Serve per-stage latencies and frame counters in the Prometheus format on this localhost port. Off if not given")
+    argParser.add_argument("--log-format", choices=[LOG_FORMAT_NDJSON, LOG_FORMAT_COLUMNAR], default=LOG_FORMAT_NDJSON, help="ndjson: one JSON line per frame in TrackingData/, columnar: compressed track and height columns in TrackingStore/ (see column_store.py)")
+    argParser.add_argument("--log-track-state", action="store_true", help="With --log-format columnar, also log track velocity, acceleration, gating gain and confidence")
+    args = argParser.parse_args()
+    if (args.replay):
+        c = core()
+        c.logFormat = args.log_format
+        c.logTrackState = args.log_track_state
+        runReplay(c, args.replay, args.replay_speed, args.metrics_port)
+        sys.exit(0)
+
     # Optional: Specify a custom save filepath
     SAVE_FILEPATH = "./Data_files"  # Change this to your desired path
     CLI_SIL_SERIAL_PORT_NAME = 'Enhanced COM Port'
@@ -206,82 +391,33 @@ if __name__=="__main__":
     #for linux
     # cliCom = '/dev/ttyUSB0'
     # dataCom = '/dev/ttyUSB1'
+    if (args.cli_port):
+        cliCom = args.cli_port
+    if (args.data_port):
+        dataCom = args.data_port
 
+    bringUpStart = time.monotonic()
     c = core()
+    c.logFormat = args.log_format
+    c.logTrackState = args.log_track_state
+    c.parseCfg("Final_config_6m.cfg")
     c.parser.connectComPorts(cliCom, dataCom)
-    LastByte = c.parser.dataCom.read(1)
-    if (len(LastByte) < 1):
-        print("Device is not configured, configuring device with default config")
-        c.parseCfg("Final_config_6m.cfg")
-        c.sendCfg()
-    else:
-        print("Device is already configured")
+    reconfigured = c.configureDevice(cliCom)
 
-    while True:
-        trial_output = c.parser.readAndParseUartDoubleCOMPort()
-        # print("Read and parse UART")
-        # print(trial_output)
-
-    
-        data = {'cfg': c.cfg, 'demo': c.demo, 'device': c.device}
-        c.uartCounter += 1
-        frameJSON = {}
-        if ('frameNum' not in trial_output.keys()):
-            print("ERROR: No frame number data in frame")
-            frameJSON['framenumber'] = 0
-        else:
-            frameJSON['frameNumber'] = trial_output['frameNum'] 
-        
-        if ('heightData' not in trial_output.keys()):
-            print("ERROR: No height data in frame")
-            frameJSON['HeightData'] = []
-        else:
-            frameJSON['HeightData'] = trial_output['heightData'].tolist()
-            print("Height Data: ", frameJSON['HeightData'])
-
-        frameJSON['timestamp'] = time.time()
-        frameJSON['CurrTime'] = time.ctime(frameJSON['timestamp']) # Add human-readable timestamp
-
-        
-        if ('numDetectedPoints' not in trial_output.keys()):
-            print("ERROR: No points detected in frame")
-            frameJSON['PointsDetected'] = 0
-        else:
-            frameJSON['PointsDetected'] = trial_output['numDetectedPoints']
-
-        if ('heightData' in trial_output):
-                    if (len(trial_output['heightData']) != len(trial_output['trackData'])):
-                        print("WARNING: number of heights does not match number of tracks")
-
-                    # For each height heights for current tracks
-                    for height in trial_output['heightData']:
-                        # Find track with correct TID
-                        for track in trial_output['trackData']:
-                            # Found correct track
-                            if (int(track[0]) == int(height[0])):
-                                tid = int(height[0])
-                                height_str = 'tid : ' + str(height[0]) + ', height : ' + str(round(height[1], 2)) + ' m'
-                                # If this track was computed to have fallen, display it on the screen
-                                
-                                fallDetectionDisplayResults = c.fallDetection.step(trial_output['heightData'], trial_output['trackData'])
-                                if (fallDetectionDisplayResults[tid] > 0): 
-                                    height_str = height_str + " FALL DETECTED"
-                                    print("Alert: Fall Detected for Patient")
-        # frameJSON['fallDetected'] = height_str                                
-        c.frames.append(frameJSON)
-        data['data'] = c.frames
-        # print(data)
-        if (c.uartCounter % c.framesPerFile == 0):
-            if(c.first_file is True): 
-                if(os.path.exists('TrackingData/') == False):
-                    # Note that this will create the folder in the caller's path, not necessarily in the viz folder            
-                    os.mkdir('TrackingData/')
-                os.mkdir('TrackingData/'+c.filepath)
-                c.first_file = False
-            with open('./TrackingData/'+c.filepath+'/replay_' + str(math.floor(c.uartCounter/c.framesPerFile)) + '.json', 'w') as fp:
-                json_object = json.dumps(data, indent=4)
-                fp.write(json_object)
-                c.frames = [] #uncomment to put data into one file at a time in 100 frame chunks
-
-        # print(c.fallDetection.heightBuffer)
-    
+    # Serial reads and file writes run on their own threads so a slow frame below never costs us radar frames
+    c.startAcquisition()
+    c.startWriter()
+    if (args.metrics_port is not None):
+        startMetrics(c, args.metrics_port)
+    timestamp, frameData = c.acquisition.get()
+    print("First frame %.2f s after start (%s)" % (time.monotonic() - bringUpStart, "cfg sent" if reconfigured else "cfg unchanged, not resent"))
+    try:
+        while True:
+            trial_output = c.parser.parseFrameDoubleCOMPort(frameData, timestamp)
+            c.processFrame(trial_output, timestamp)
+            timestamp, frameData = c.acquisition.get()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        c.stopWriter()
+        c.parser.close()
@@ -0,0 +1,325 @@
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+DEFAULT_METRICS_PORT = 9105
+METRICS_PREFIX = 'radar'
+REPORTED_QUANTILES = (0.5, 0.95, 0.99)
+
+# Stages timed by Metrics.instrumentParser / instrumentCore
+STAGE_SERIAL_WAIT = 'serialWait' # blocked in port reads, per frame
+STAGE_SYNC = 'sync' # magic word search and framing, per frame
+STAGE_PARSE = 'parse' # header walk and TLV decoding (only the header walk for LazyFrames, see STAGE_PROCESS)
+STAGE_FALL_DETECTION = 'fallDetection'
+STAGE_SAVE = 'save' # handing the frame to the tracking log writer thread
+STAGE_PERSIST = 'persist' # from handing a frame to the writer until it is fsynced
+STAGE_PERSIST_SYNC = 'persistSync' # flush and fsync of one batch of frames
+STAGE_PROCESS = 'process' # all of core.processFrame, including lazy TLV decoding
+
+# Histogram of durations in seconds with logarithmic buckets, so memory and the cost of observe() stay
+# constant however many values it sees. Quantiles are accurate to half a bucket, about 6% with 20 buckets
+# per decade, which is plenty to tell a 2 ms parse from a 20 ms one. count, sum and max are exact.
+class StreamingHistogram():
+    def __init__(self, minValue=1e-6, maxValue=100.0, bucketsPerDecade=20):
+        self.minValue = minValue
+        self.bucketsPerDecade = bucketsPerDecade
+        # Bucket 0 holds everything up to minValue, the last one everything above maxValue
+        self.numBuckets = int(math.ceil(math.log10(maxValue / minValue) * bucketsPerDecade)) + 2
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * self.numBuckets
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+    def _bucketIndex(self, value):
+        if (value <= self.minValue):
+            return 0
+        return min(int(math.log10(value / self.minValue) * self.bucketsPerDecade) + 1, self.numBuckets - 1)
+
+    # Upper edge of bucket index
+    def _bucketEdge(self, index):
+        return self.minValue * 10 ** (index / self.bucketsPerDecade)
+
+    def observe(self, value):
+        index = self._bucketIndex(value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if (value > self.max):
+                self.max = value
+
+    # Estimated value below which fraction q of the observations fall, None before the first one
+    def quantile(self, q):
+        with self.lock:
+            if (self.count == 0):
+                return None
+            rank = q * self.count
+            cumulative = 0
+            for index, count in enumerate(self.counts):
+                cumulative += count
+                if (cumulative >= rank and count > 0):
+                    break
+            maxValue = self.max
+        if (index == 0):
+            return min(self.minValue, maxValue)
+        # Geometric middle of the bucket, never more than the largest value seen
+        return min(self._bucketEdge(index - 0.5), maxValue)
+
+    def getStats(self):
+        stats = {'count': self.count, 'sum': self.sum, 'max': self.max}
+        for q in REPORTED_QUANTILES:
+            stats['p%d' % (q * 100)] = self.quantile(q)
+        return stats
+
+# Per-stage latency histograms and frame counters for the live pipeline, served on localhost in the
+# Prometheus text format.
+#
+#     metrics = Metrics()
+#     metrics.instrumentParser(c.parser)         # after connectComPorts, the data port's framer is timed
+#     metrics.instrumentCore(c)                  # processFrame, FallDetection.step and the replay file write
+#     metrics.instrumentAcquisition(c.acquisition)
+#     metrics.instrumentContinuity(c.parser.continuity)
+#     metrics.startServer()                      # curl http://127.0.0.1:9105/metrics
+#
+# Instrumenting swaps timed wrappers in for the instance's methods, nothing in the hot path checks whether
+# metrics are on. Without a Metrics object the pipeline runs exactly the code it always did, and
+# uninstrument() puts the original methods back.
+class Metrics():
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.errorCounts = {}
+        self.framers = [] # UARTFramers whose resync counters are exported
+        self.acquisition = None
+        self.continuity = None
+        self.writer = None
+        self.wrapped = [] # (object, methodName) of every installed wrapper
+        self.server = None
+        self.serverThread = None
+        self.startTime = time.time()
+
+    def getStage(self, stage):
+        histogram = self.stages.get(stage)
+        if (histogram is None):
+            histogram = self.stages.setdefault(stage, StreamingHistogram())
+        return histogram
+
+    def observe(self, stage, seconds):
+        self.getStage(stage).observe(seconds)
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Count a parsed frame and its error code. Frames whose TLV headers couldn't be read come back without
+    # an error key at all (parseStandardFrame returns an empty dict), they are counted as error 2
+    def countFrame(self, outputDict):
+        self.increment('frames')
+        error = outputDict.get('error', 2)
+        if (error != 0):
+            self.errorCounts[error] = self.errorCounts.get(error, 0) + 1
+
+    # Replace obj.methodName with wrapper(original) on this instance only
+    def wrapMethod(self, obj, methodName, wrapper):
+        original = getattr(obj, methodName)
+        setattr(obj, methodName, wrapper(original))
+        self.wrapped.append((obj, methodName))
+
+    # Time every call of obj.methodName into stage
+    def timeMethod(self, obj, methodName, stage):
+        histogram = self.getStage(stage)
+        def wrapper(original):
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return timed
+        self.wrapMethod(obj, methodName, wrapper)
+
+    # Split each UARTFramer.readFrame into the time spent blocked in port reads (fill) and the rest, the
+    # magic word search and framing. Read timeouts are carried into the wait of the frame that follows them
+    def instrumentFramer(self, framer):
+        waitHistogram = self.getStage(STAGE_SERIAL_WAIT)
+        syncHistogram = self.getStage(STAGE_SYNC)
+        waited = [0.0]
+        def wrapFill(fill):
+            def timedFill(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fill(*args, **kwargs)
+                finally:
+                    waited[0] += time.perf_counter() - start
+            return timedFill
+        def wrapReadFrame(readFrame):
+            def timedReadFrame():
+                start = time.perf_counter()
+                waitBefore = waited[0]
+                frameData = readFrame()
+                if (frameData is not None):
+                    syncHistogram.observe(time.perf_counter() - start - (waited[0] - waitBefore))
+                    waitHistogram.observe(waited[0])
+                    waited[0] = 0.0
+                return frameData
+            return timedReadFrame
+        self.wrapMethod(framer, 'fill', wrapFill)
+        self.wrapMethod(framer, 'readFrame', wrapReadFrame)
+        self.framers.append(framer)
+
+    # Time and count every frame a datastream.UARTParser parses, and its data port framing if connected
+    def instrumentParser(self, parser):
+        histogram = self.getStage(STAGE_PARSE)
+        def wrapper(parseFrame):
+            def timedParseFrame(frameData):
+                start = time.perf_counter()
+                outputDict = parseFrame(frameData)
+                histogram.observe(time.perf_counter() - start)
+                self.countFrame(outputDict)
+                return outputDict
+            return timedParseFrame
+        self.wrapMethod(parser, 'parseFrame', wrapper)
+        if (parser.dataFramer is not None):
+            self.instrumentFramer(parser.dataFramer)
+
+    # Time the stages of main.core: processFrame as a whole, fall detection and queueing frames for the writer
+    def instrumentCore(self, core):
+        self.timeMethod(core, 'processFrame', STAGE_PROCESS)
+        self.timeMethod(core.fallDetection, 'step', STAGE_FALL_DETECTION)
+        self.timeMethod(core, 'saveFrame', STAGE_SAVE)
+
+    # Export the frame loss and jitter figures of a frame_continuity.FrameContinuityTracker
+    def instrumentContinuity(self, continuity):
+        self.continuity = continuity
+
+    # Export the write latency and backlog of a tracking_writer.TrackingLogWriter
+    def instrumentWriter(self, writer):
+        self.stages[STAGE_PERSIST] = writer.latency
+        self.stages[STAGE_PERSIST_SYNC] = writer.syncTime
+        self.writer = writer
+
+    # Export the queue depth and drop counters of an acquisition.FrameAcquisitionThread
+    def instrumentAcquisition(self, acquisition):
+        self.acquisition = acquisition
+
+    # Restore every wrapped method
+    def uninstrument(self):
+        for obj, methodName in reversed(self.wrapped):
+            obj.__dict__.pop(methodName, None)
+        self.wrapped = []
+
+    def getStats(self):
+        stats = {'stages': {}, 'counters': dict(self.counters), 'errors': dict(self.errorCounts)}
+        for stage, histogram in self.stages.items():
+            stats['stages'][stage] = histogram.getStats()
+        stats['resyncs'] = sum(framer.resyncs for framer in self.framers)
+        if (self.continuity is not None):
+            stats['continuity'] = self.continuity.getStats()
+        return stats
+
+    # Everything in the Prometheus text exposition format. Stage latencies are summaries with
+    # p50/p95/p99 quantiles plus a separate max gauge
+    def render(self):
+        lines = []
+        name = METRICS_PREFIX + '_stage_seconds'
+        lines.append('# HELP %s Time spent in each pipeline stage per frame' % (name))
+        lines.append('# TYPE %s summary' % (name))
+        for stage, histogram in sorted(self.stages.items()):
+            for q in REPORTED_QUANTILES:
+                value = histogram.quantile(q)
+                lines.append('%s{stage="%s",quantile="%s"} %s' % (name, stage, q, 'NaN' if value is None else repr(value)))
+            lines.append('%s_sum{stage="%s"} %r' % (name, stage, histogram.sum))
+            lines.append('%s_count{stage="%s"} %d' % (name, stage, histogram.count))
+        lines.append('# HELP %s_max Longest time spent in each pipeline stage' % (name))
+        lines.append('# TYPE %s_max gauge' % (name))
+        for stage, histogram in sorted(self.stages.items()):
+            lines.append('%s_max{stage="%s"} %r' % (name, stage, histogram.max))
+
+        def counter(counterName, helpText, value, labels=''):
+            fullName = '%s_%s_total' % (METRICS_PREFIX, counterName)
+            lines.append('# HELP %s %s' % (fullName, helpText))
+            lines.append('# TYPE %s counter' % (fullName))
+            lines.append('%s%s %d' % (fullName, labels, value))
+
+        def gauge(gaugeName, helpText, value):
+            fullName = '%s_%s' % (METRICS_PREFIX, gaugeName)
+            lines.append('# HELP %s %s' % (fullName, helpText))
+            lines.append('# TYPE %s gauge' % (fullName))
+            lines.append('%s %r' % (fullName, float(value)))
+
+        counter('frames', 'Frames parsed', self.counters.get('frames', 0))
+        errorName = METRICS_PREFIX + '_frame_errors_total'
+        lines.append('# HELP %s Frames with a parse error: 1 header unreadable, 2 TLV header failure, 3 length mismatch' % (errorName))
+        lines.append('# TYPE %s counter' % (errorName))
+        for code in (1, 2, 3):
+            lines.append('%s{code="%d"} %d' % (errorName, code, self.errorCounts.get(code, 0)))
+        if (len(self.framers) > 0):
+            counter('resyncs', 'Times the framer discarded bytes to find a magic word', sum(framer.resyncs for framer in self.framers))
+            counter('bad_lengths', 'Frame headers with an impossible length', sum(framer.badLengths for framer in self.framers))
+            counter('truncated_frames', 'Frames cut short by the next magic word or a read timeout', sum(framer.truncatedFrames for framer in self.framers))
+            counter('bytes_read', 'Bytes read from the data port', sum(framer.bytesRead for framer in self.framers))
+        if (self.acquisition is not None):
+            acquisitionStats = self.acquisition.getStats()
+            counter('frames_dropped', 'Frames dropped because the acquisition queue was full', acquisitionStats['framesDropped'])
+            counter('read_timeouts', 'Data port reads that timed out', acquisitionStats['readTimeouts'])
+            lines.append('# TYPE %s_queue_depth gauge' % (METRICS_PREFIX))
+            lines.append('%s_queue_depth %d' % (METRICS_PREFIX, acquisitionStats['queueDepth']))
+        if (self.continuity is not None):
+            continuityStats = self.continuity.getStats()
+            counter('frames_lost', 'Frame numbers that never arrived', continuityStats['lost'])
+            counter('frames_duplicated', 'Frames that arrived more than once', continuityStats['duplicates'])
+            counter('frames_reordered', 'Frames that arrived after a later frame', continuityStats['reordered'])
+            counter('device_restarts', 'Times the frame numbers started again', continuityStats['restarts'])
+            gauge('rolling_loss_ratio', 'Fraction of the recent frames that were lost', continuityStats['rollingLossRate'])
+            gauge('arrival_jitter_seconds', 'Running estimate of how much arrival intervals differ from the device frame period', continuityStats['arrivalJitter'])
+            if ('devicePeriod' in continuityStats):
+                gauge('device_frame_period_seconds', 'Recent mean frame period measured by the device clock', continuityStats['devicePeriod'])
+        if (self.writer is not None):
+            writerStats = self.writer.getStats()
+            counter('frames_persisted', 'Frames written to the tracking log', writerStats['framesWritten'])
+            counter('frames_not_persisted', 'Frames dropped because the tracking log backlog was full', writerStats['framesDropped'])
+            counter('persist_write_errors', 'Failed tracking log writes', writerStats['writeErrors'])
+            gauge('persist_backlog', 'Frames waiting to be written to the tracking log', writerStats['backlog'])
+        lines.append('# TYPE %s_uptime_seconds gauge' % (METRICS_PREFIX))
+        lines.append('%s_uptime_seconds %r' % (METRICS_PREFIX, time.time() - self.startTime))
+        return '\n'.join(lines) + '\n'
+
+    # Serve render() at http://host:port/metrics on a daemon thread. Only localhost by default
+    def startServer(self, port=DEFAULT_METRICS_PORT, host='127.0.0.1'):
+        metrics = self
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if (self.path.split('?')[0] not in ('/', '/metrics')):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug(format % args)
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.serverThread = threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True)
+        self.serverThread.start()
+        log.info('Serving metrics on http://%s:%d/metrics' % (host, self.server.server_address[1]))
+        return self.server.server_address[1]
+
+    def stopServer(self):
+        if (self.server is not None):
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -6,15 +6,18 @@ import numpy as np
 class FallDetection:
 
     # Initialize the class with the default parameters (tested empirically)
-    def __init__(self, maxNumTracks = 30, frameTime = 55, fallingThresholdProportion = 0.6, secondsInFallBuffer = 1.5):
+    # frameTime is the frame period in ms (see radar_config.RadarConfig), it turns the windows given in seconds into frames.
+    # The thresholds were tuned with an 82 frame height history at 55 ms, which secondsInFallBuffer = 4.5 keeps
+    def __init__(self, maxNumTracks = 30, frameTime = 55, fallingThresholdProportion = 0.6, secondsInFallBuffer = 4.5, secondsToDisplayFall = 5.5):
         self.fallingThresholdProportion = fallingThresholdProportion
         self.secondsInFallBuffer = secondsInFallBuffer
-        self.heightHistoryLen = int(round(self.secondsInFallBuffer * frameTime))
+        self.frameTime = frameTime
+        self.heightHistoryLen = max(int(round(self.secondsInFallBuffer * 1000 / frameTime)), 1)
         self.heightBuffer = [deque([-5] *  self.heightHistoryLen, maxlen =  self.heightHistoryLen) for i in range(maxNumTracks)]
         self.speedBuffer = [deque([0] * self.heightHistoryLen, maxlen = self.heightHistoryLen) for i in range(maxNumTracks)]
         self.tracksIDsInPreviousFrame = []
         self.fallBufferDisplay = [0 for i in range(maxNumTracks)] # Fall results that will be displayed to screen
-        self.numFramesToDisplayFall = 100 # How many frames do you want to display a fall on the screen for
+        self.numFramesToDisplayFall = int(round(secondsToDisplayFall * 1000 / frameTime)) # How many frames do you want to display a fall on the screen for
         self.lastFallTime = [0 for i in range(maxNumTracks)] # Track the last time a fall was detected for each track
         self.fallCooldownPeriod = 10.0  # Seconds to wait before detecting another fall for the same track
         self.consistentFallFrames = [0 for i in range(maxNumTracks)] # Count of consecutive frames where fall criteria are met
@@ -44,7 +47,7 @@ class FallDetection:
 
         trackIDsInCurrFrame = []
         currentTime = time.time()
-        frameTime = 55  # Default frame time in milliseconds (adjust if needed)
+        frameTime = self.frameTime
         
         # Populate heights for current tracks
         for height in heights:
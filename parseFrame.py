@@ -6,9 +6,17 @@ import math
 #Local Imports
 from tlv_defines import *
 from parseTLVs import *
+from tlv_schema import addSchemaListener
+from radar_frame import RadarFrame
 
 log = logging.getLogger(__name__)
 
+# Frame and TLV headers, compiled once. numTLVs is the 8th field of the frame header
+FRAME_HEADER_STRUCT = struct.Struct('Q8I')
+TLV_HEADER_STRUCT = struct.Struct('2I')
+NUM_TLVS_STRUCT = struct.Struct('I')
+NUM_TLVS_OFFSET = 32
+
 parserFunctions = {
     MMWDEMO_OUTPUT_MSG_DETECTED_POINTS:                     parsePointCloudTLV,
     MMWDEMO_OUTPUT_MSG_RANGE_PROFILE:                       parseRangeProfileTLV,
@@ -30,94 +38,161 @@ parserFunctions = {
     MMWDEMO_OUTPUT_MSG_GESTURE_CLASSIFIER_6432:             parseGestureClassifierTLV6432,
     MMWDEMO_OUTPUT_EXT_MSG_ENHANCED_PRESENCE_INDICATION:    parseEnhancedPresenceInfoTLV,
     MMWDEMO_OUTPUT_EXT_MSG_CLASSIFIER_INFO:                 parseClassifierTLV,
-    MMWDEMO_OUTPUT_MSG_SURFACE_CLASSIFICATION:              parseSurfaceClassificationTLV,
     MMWDEMO_OUTPUT_EXT_MSG_VELOCITY:                        parseVelocityTLV,
     MMWDEMO_OUTPUT_EXT_MSG_RX_CHAN_COMPENSATION_INFO:       parseRXChanCompTLV,
     MMWDEMO_OUTPUT_MSG_EXT_STATS:                           parseExtStatsTLV,
     MMWDEMO_OUTPUT_MSG_GESTURE_FEATURES_6432:               parseGestureFeaturesTLV6432,
-    MMWDEMO_OUTPUT_MSG_GESTURE_PRESENCE_x432:               parseGesturePresenceTLV6432,
-    MMWDEMO_OUTPUT_MSG_GESTURE_PRESENCE_THRESH_x432:        parsePresenceThreshold,
     MMWDEMO_OUTPUT_EXT_MSG_STATS_BSD:                       parseExtStatsTLVBSD,
     MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST_2D_BSD:              parseTrackTLV2D,
     MMWDEMO_OUTPUT_EXT_MSG_CAM_TRIGGERS:                    parseCamTLV,
-    MMWDEMO_OUTPUT_EXT_MSG_ADC_SAMPLES:                     parseADCSamples,
-    MMWDEMO_OUTPUT_EXT_MSG_MODE_SWITCH_INFO:                parseModeSwitchTLV
+    MMWDEMO_OUTPUT_EXT_MSG_ADC_SAMPLES:                     parseADCSamples
+}
+
+# Keys each parser writes into outputDict, so a TLV can be decoded only when one of its outputs is wanted (see lazy_frame.py)
+tlvOutputKeys = {
+    MMWDEMO_OUTPUT_MSG_DETECTED_POINTS:                     ('pointCloud', 'numDetectedPoints'),
+    MMWDEMO_OUTPUT_MSG_RANGE_PROFILE:                       ('rangeProfile',),
+    MMWDEMO_OUTPUT_EXT_MSG_RANGE_PROFILE_MAJOR:             ('rangeProfile',),
+    MMWDEMO_OUTPUT_EXT_MSG_RANGE_PROFILE_MINOR:             ('rangeProfile',),
+    MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO:           ('pointCloud',),
+    MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS:                    ('pointCloud', 'numDetectedPoints'),
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST:          ('numDetectedTracks', 'trackData', 'trackErrorCovariance'),
+    MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST:                     ('numDetectedTracks', 'trackData', 'trackErrorCovariance'),
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT:           ('numDetectedHeights', 'heightData'),
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_INDEX:            ('trackIndexes',),
+    MMWDEMO_OUTPUT_EXT_MSG_TARGET_INDEX:                    ('trackIndexes',),
+    MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS:                   ('pointCloud', 'numDetectedPoints'),
+    MMWDEMO_OUTPUT_MSG_OCCUPANCY_STATE_MACHINE:             ('occupancy',),
+    MMWDEMO_OUTPUT_MSG_VITALSIGNS:                          ('vitals',),
+    MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS:                 ('pointCloud', 'numDetectedPoints'),
+    MMWDEMO_OUTPUT_MSG_GESTURE_FEATURES_6843:               ('features',),
+    MMWDEMO_OUTPUT_MSG_GESTURE_OUTPUT_PROB_6843:            ('gestureNeuralNetProb',),
+    MMWDEMO_OUTPUT_MSG_GESTURE_CLASSIFIER_6432:             ('gesture', 'ktoGesture'),
+    MMWDEMO_OUTPUT_EXT_MSG_ENHANCED_PRESENCE_INDICATION:    ('enhancedPresenceDet',),
+    MMWDEMO_OUTPUT_EXT_MSG_CLASSIFIER_INFO:                 ('classifierOutput',),
+    MMWDEMO_OUTPUT_EXT_MSG_VELOCITY:                        ('velocity',),
+    MMWDEMO_OUTPUT_EXT_MSG_RX_CHAN_COMPENSATION_INFO:       ('RXChanCompInfo',),
+    MMWDEMO_OUTPUT_MSG_EXT_STATS:                           ('procTimeData', 'powerData', 'tempData'),
+    MMWDEMO_OUTPUT_MSG_GESTURE_FEATURES_6432:               ('gestureFeatures',),
+    MMWDEMO_OUTPUT_EXT_MSG_STATS_BSD:                       ('procTimeData', 'powerData', 'tempData', 'egoSpeed'),
+    MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST_2D_BSD:              ('numDetectedTracks', 'trackData', 'trackErrorCovariance'),
+    MMWDEMO_OUTPUT_EXT_MSG_CAM_TRIGGERS:                    ('camDataDict',),
+    MMWDEMO_OUTPUT_EXT_MSG_ADC_SAMPLES:                     ('rawADCData',)
+}
+
+# TLVs with a fixed layout are decoded from the declarative schemas in tlv_schema.py, including schemas
+# registered after this module is imported
+def _addSchema(tlvType, schema):
+    parserFunctions[tlvType] = schema.parse
+    tlvOutputKeys[tlvType] = (schema.outputKey,)
+
+addSchemaListener(_addSchema)
+
+# (header size, point size) of the TLVs that fill the point cloud, so numDetectedPoints can be worked out
+# from the TLV length alone with countPoints
+pointTLVLayouts = {
+    MMWDEMO_OUTPUT_MSG_DETECTED_POINTS:                     (0, POINT_DTYPE.itemsize),
+    MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS:                    (0, SPHERICAL_POINT_DTYPE.itemsize),
+    MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS:                   (COMPRESSED_POINT_UNIT_STRUCT.size, COMPRESSED_SPHERICAL_POINT_DTYPE.itemsize),
+    MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS:                 (POINT_EXT_UNIT_STRUCT.size, POINT_EXT_DTYPE.itemsize)
 }
 
 unusedTLVs = [
-    MMWDEMO_OUTPUT_MSG_NOISE_PROFILE,
-    MMWDEMO_OUTPUT_MSG_AZIMUT_STATIC_HEAT_MAP,
-    MMWDEMO_OUTPUT_MSG_RANGE_DOPPLER_HEAT_MAP,
-    MMWDEMO_OUTPUT_MSG_STATS,
-    MMWDEMO_OUTPUT_MSG_AZIMUT_ELEVATION_STATIC_HEAT_MAP,
-    MMWDEMO_OUTPUT_MSG_TEMPERATURE_STATS,
-    MMWDEMO_OUTPUT_MSG_PRESCENCE_INDICATION,
-    MMWDEMO_OUTPUT_MSG_GESTURE_PRESENCE_x432,
-    MMWDEMO_OUTPUT_MSG_GESTURE_PRESENCE_THRESH_x432,
     MMWDEMO_OUTPUT_EXT_MSG_MICRO_DOPPLER_RAW_DATA,
     MMWDEMO_OUTPUT_EXT_MSG_MICRO_DOPPLER_FEATURES,
     MMWDEMO_OUTPUT_EXT_MSG_QUICK_EVAL_INFO
 ]
 
-def parseStandardFrame(frameData):
-    # Constants for parsing frame header
-    headerStruct = 'Q8I'
-    frameHeaderLen = struct.calcsize(headerStruct)
-    tlvHeaderLength = 8
+# TLVs whose parser can decode into a preallocated buffer, see parseStandardFrame's outputBuffers
+bufferedTLVs = [
+    MMWDEMO_OUTPUT_MSG_RANGE_PROFILE,
+    MMWDEMO_OUTPUT_EXT_MSG_RANGE_PROFILE_MAJOR,
+    MMWDEMO_OUTPUT_EXT_MSG_RANGE_PROFILE_MINOR,
+    MMWDEMO_OUTPUT_EXT_MSG_CLASSIFIER_INFO,
+    MMWDEMO_OUTPUT_EXT_MSG_ADC_SAMPLES,
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST,
+    MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST,
+    MMWDEMO_OUTPUT_EXT_MSG_TARGET_LIST_2D_BSD,
+    MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT
+]
+
+# outputBuffers key of the (maxPoints, 7) float64 buffer the point cloud is built in
+POINT_CLOUD_BUFFER = 'pointCloud'
 
+# outputBuffers optionally maps a TLV type in bufferedTLVs to a numpy array that is reused for every frame
+# (uint32 range bins, int16 ADC samples, float64 (targets, NUM_CLASSES_IN_CLASSIFIER) classifier rows,
+# float64 (maxTracks, 16) track rows or (maxTracks, 3) height rows), and POINT_CLOUD_BUFFER to the point cloud buffer.
+# The output then holds a view of that buffer, which is overwritten by the next frame parsed with it.
+# See buffer_pool.py for handing out such buffers safely.
+def parseStandardFrame(frameData, outputBuffers=None, outputDict=None):
     # Define the function's output structure and initialize error field to no error
-    outputDict = {}
+    # outputDict can be any object with the dict interface, see parseRadarFrame
+    if (outputDict is None):
+        outputDict = {}
     outputDict['error'] = 0
 
-    # A sum to track the frame packet length for verification for transmission integrity 
-    totalLenCheck = 0   
+    # The frame is walked with offsets into a single memoryview, so neither the header walk
+    # nor the TLV slices handed to the parsers copy any of the frame
+    frameView = memoryview(frameData)
 
     # Read in frame Header
     try:
-        magic, version, totalPacketLen, platform, frameNum, timeCPUCycles, numDetectedObj, numTLVs, subFrameNum = struct.unpack(headerStruct, frameData[:frameHeaderLen])
+        magic, version, totalPacketLen, platform, frameNum, timeCPUCycles, numDetectedObj, numTLVs, subFrameNum = FRAME_HEADER_STRUCT.unpack_from(frameView, 0)
     except:
         log.error('Error: Could not read frame header')
         outputDict['error'] = 1
+        return outputDict
 
-    # Move frameData ptr to start of 1st TLV   
-    frameData = frameData[frameHeaderLen:]
-    totalLenCheck += frameHeaderLen
+    # Move offset to start of 1st TLV
+    offset = FRAME_HEADER_STRUCT.size
 
-    # Save frame number to output
+    # Save frame number and the device's cycle counter at the start of the frame to output
     outputDict['frameNum'] = frameNum
+    outputDict['timeCPUCycles'] = timeCPUCycles
 
     # Initialize the point cloud struct since it is modified by multiple TLV's
     # Each point has the following: X, Y, Z, Doppler, SNR, Noise, Track index
-    outputDict['pointCloud'] = np.zeros((numDetectedObj, 7), np.float64)
+    pointCloudBuffer = outputBuffers.get(POINT_CLOUD_BUFFER) if outputBuffers is not None else None
+    if (pointCloudBuffer is not None and len(pointCloudBuffer) >= numDetectedObj):
+        pointCloud = pointCloudBuffer[:numDetectedObj]
+        pointCloud.fill(0)
+    else:
+        if (pointCloudBuffer is not None):
+            log.warning('Point cloud buffer of %d points is too small for %d points, allocating a new one' % (len(pointCloudBuffer), numDetectedObj))
+        pointCloud = np.zeros((numDetectedObj, 7), np.float64)
     # Initialize the track indexes to a value which indicates no track
-    outputDict['pointCloud'][:, 6] = 255
+    pointCloud[:, 6] = 255
+    outputDict['pointCloud'] = pointCloud
     # Find and parse all TLV's
     for i in range(numTLVs):
         try:
-            tlvType, tlvLength = tlvHeaderDecode(frameData[:tlvHeaderLength])
-            frameData = frameData[tlvHeaderLength:]
-            totalLenCheck += tlvHeaderLength
+            tlvType, tlvLength = TLV_HEADER_STRUCT.unpack_from(frameView, offset)
+            offset += TLV_HEADER_STRUCT.size
         except:
             log.warning('TLV Header Parsing Failure: Ignored frame due to parsing error')
             outputDict['error'] = 2
-            return {}
+            # An empty dict, a RadarFrame keeps the error code
+            outputDict.clear()
+            return outputDict
 
         # print(tlvType)
 
-        if (tlvType in parserFunctions):
-            parserFunctions[tlvType](frameData[:tlvLength], tlvLength, outputDict)
+        # Only parsers of bufferedTLVs take out=, other keys in outputBuffers are ignored
+        if (outputBuffers is not None and tlvType in bufferedTLVs and tlvType in outputBuffers):
+            parserFunctions[tlvType](frameView[offset:offset + tlvLength], tlvLength, outputDict, out=outputBuffers[tlvType])
+        elif (tlvType in parserFunctions):
+            parserFunctions[tlvType](frameView[offset:offset + tlvLength], tlvLength, outputDict)
         elif (tlvType in unusedTLVs):
             log.debug("No function to parse TLV type: %d" % (tlvType))
         else:
             log.info("Invalid TLV type: %d" % (tlvType))
 
         # Move to next TLV
-        frameData = frameData[tlvLength:]
-        totalLenCheck += tlvLength
+        offset += tlvLength
     
-    # Pad totalLenCheck to the next largest multiple of 32
+    # Pad offset (the length read so far) to the next largest multiple of 32
     # since the device does this to the totalPacketLen for transmission uniformity
-    totalLenCheck = 32 * math.ceil(totalLenCheck / 32)
+    totalLenCheck = 32 * math.ceil(offset / 32)
 
     # Verify the total packet length to detect transmission error that will cause subsequent frames to dropped
     if (totalLenCheck != totalPacketLen):
@@ -126,7 +201,25 @@ def parseStandardFrame(frameData):
 
     return outputDict
 
-# Decode TLV Header
-def tlvHeaderDecode(data):
-    tlvType, tlvLength = struct.unpack('2I', data)
-    return tlvType, tlvLength
\ No newline at end of file
+# Same as parseStandardFrame, returning a RadarFrame instead of a dict
+def parseRadarFrame(frameData, outputBuffers=None):
+    return parseStandardFrame(frameData, outputBuffers, RadarFrame())
+
+# Yield (tlvType, offset, tlvLength) for every TLV in a frame, offset being the start of the TLV's payload.
+# Stops early if the frame is shorter than its TLV headers claim
+def iterTLVs(frameData):
+    frameView = memoryview(frameData)
+    numTLVs = NUM_TLVS_STRUCT.unpack_from(frameView, NUM_TLVS_OFFSET)[0]
+    offset = FRAME_HEADER_STRUCT.size
+    for i in range(numTLVs):
+        if (offset + TLV_HEADER_STRUCT.size > len(frameView)):
+            return
+        tlvType, tlvLength = TLV_HEADER_STRUCT.unpack_from(frameView, offset)
+        offset += TLV_HEADER_STRUCT.size
+        yield tlvType, offset, tlvLength
+        offset += tlvLength
+
+# Decode TLV Header starting at offset
+def tlvHeaderDecode(data, offset=0):
+    tlvType, tlvLength = TLV_HEADER_STRUCT.unpack_from(data, offset)
+    return tlvType, tlvLength
@@ -8,147 +8,173 @@ from gui_common import NUM_CLASSES_IN_CLASSIFIER, sphericalToCartesianPointCloud
 
 log = logging.getLogger(__name__)
 
+# Point record layouts as sent by the device (packed, little endian)
+POINT_DTYPE = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('doppler', '<f4')])
+POINT_EXT_DTYPE = np.dtype([('x', '<i2'), ('y', '<i2'), ('z', '<i2'), ('doppler', '<i2'), ('snr', 'u1'), ('noise', 'u1')])
+SIDE_INFO_DTYPE = np.dtype([('snr', '<u2'), ('noise', '<u2')])
+SPHERICAL_POINT_DTYPE = np.dtype([('range', '<f4'), ('azimuth', '<f4'), ('elevation', '<f4'), ('doppler', '<f4')])
+COMPRESSED_SPHERICAL_POINT_DTYPE = np.dtype([('elevation', 'i1'), ('azimuth', 'i1'), ('doppler', '<i2'), ('range', '<u2'), ('snr', '<u2')])
+
+# Tracker record layouts, see the struct definitions above parseTrackTLV and parseTrackTLV2D
+TRACK_DTYPE = np.dtype([('tid', '<u4'), ('pos', '<f4', (3,)), ('vel', '<f4', (3,)), ('acc', '<f4', (3,)),
+                        ('ec', '<f4', (4,4)), ('g', '<f4'), ('confidence', '<f4')])
+TRACK_2D_DTYPE = np.dtype([('tid', '<u4'), ('pos', '<f4', (2,)), ('vel', '<f4', (2,)), ('acc', '<f4', (2,)),
+                           ('ec', '<f4', (3,3)), ('g', '<f4'), ('confidence', '<f4')])
+TRACK_HEIGHT_DTYPE = np.dtype([('tid', '<u4'), ('maxZ', '<f4'), ('minZ', '<f4')])
+
+# Fixed layouts of the TLVs still decoded field by field, compiled once
+POINT_EXT_UNIT_STRUCT = struct.Struct('4f2h') # Units for the 5 results to decompress them
+OCC_STATE_MACH_STRUCT = struct.Struct('I') # Single uint32_t which holds 32 booleans
+COMPRESSED_POINT_UNIT_STRUCT = struct.Struct('5f') # Units for the 5 results to decompress them
+CAM_TRIGGERS_STRUCT = struct.Struct('4I')
+VITALS_STRUCT = struct.Struct('2H33f')
+GESTURE_FEATURES_6843_STRUCT = struct.Struct('10f')
+GESTURE_PROB_6843_STRUCT = struct.Struct('10f')
+GESTURE_FEATURES_6432_STRUCT = struct.Struct('16f')
+GESTURE_CLASSIFIER_6432_STRUCT = struct.Struct('1b')
+RX_CHAN_COMP_STRUCT = struct.Struct('13f') # Range bias and RX channel compensation coefficients
+EXT_STATS_STRUCT = struct.Struct('2I8H') # Processing times, power rails and temperatures
+EXT_STATS_BSD_STRUCT = struct.Struct('2I8H2f') # As above, plus ego speed and alpha angle
+VELOCITY_STRUCT = struct.Struct('1f1?') # Velocity and whether it is valid
+
+# Number of records that can be decoded from a TLV, limited by the data actually received
+def _recordCount(tlvData, tlvLength, offset, recordSize, errorMessage):
+    numRecords = max(int((tlvLength - offset)/recordSize), 0)
+    available = max((len(tlvData) - offset) // recordSize, 0)
+    if (numRecords > available):
+        log.error(errorMessage)
+        numRecords = available
+    return numRecords
+
+# Number of points a point cloud TLV holds, as _pointCount works it out but without logging, so callers
+# that only need the count (see lazy_frame.py) don't have to decode the points
+def countPoints(tlvData, tlvLength, offset, pointSize, maxPoints):
+    numPoints = max(int((tlvLength - offset)/pointSize), 0)
+    available = max((len(tlvData) - offset) // pointSize, 0)
+    return min(numPoints, available, maxPoints)
+
+# Number of point records that can be decoded from a TLV, also limited by the rows available in the point cloud array
+def _pointCount(tlvData, tlvLength, offset, pointSize, pointCloud, errorMessage):
+    numPoints = _recordCount(tlvData, tlvLength, offset, pointSize, errorMessage)
+    if (numPoints > pointCloud.shape[0]):
+        log.error('%s: %d points do not fit in a point cloud of %d' % (errorMessage, numPoints, pointCloud.shape[0]))
+        numPoints = pointCloud.shape[0]
+    return numPoints
+
+# numRows x numColumns float64 rows to decode into. With out (a preallocated (capacity, numColumns) buffer)
+# this is a view of its first rows, otherwise a new array
+def _outputRows(out, numRows, numColumns, name):
+    if (out is not None and len(out) < numRows):
+        log.warning('%s output buffer of %d rows is too small for %d rows, allocating a new one' % (name, len(out), numRows))
+        out = None
+    if (out is None):
+        return np.empty((numRows, numColumns))
+    return out[:numRows]
+
+# Decode count values of dtype from tlvData in one go. Without out the result is a read-only view of the frame,
+# with out the values are copied into out[:count] so the caller can reuse one buffer for every frame
+def _bulkDecode(tlvData, dtype, count, out=None):
+    values = np.frombuffer(tlvData, dtype, count)
+    if (out is None):
+        return values
+    if (len(out) < count):
+        log.warning('Output buffer of %d values is too small for %d values, allocating a new one' % (len(out), count))
+        return values.copy()
+    out = out[:count]
+    out[...] = values
+    return out
+
+# Same maths as gui_common.sphericalToCartesianPointCloud, written straight into the first len(rng) rows of pointCloud
+def _sphericalToCartesian(pointCloud, rng, azimuth, elevation):
+    numPoints = len(rng)
+    cosElevation = np.cos(elevation)
+    # Range * sin (azimuth) * cos (elevation)
+    np.multiply(rng * np.sin(azimuth), cosElevation, out=pointCloud[:numPoints,0])
+    # Range * cos (azimuth) * cos (elevation)
+    np.multiply(rng * np.cos(azimuth), cosElevation, out=pointCloud[:numPoints,1])
+    # Range * sin (elevation)
+    np.multiply(rng, np.sin(elevation), out=pointCloud[:numPoints,2])
+
 # ================================================== Parsing Functions For Individual TLV's ==================================================
 
 # Point Cloud TLV from SDK
 def parsePointCloudTLV(tlvData, tlvLength, outputDict):
     pointCloud = outputDict['pointCloud']
-    pointStruct = '4f'  # X, Y, Z, and Doppler
-    pointStructSize = struct.calcsize(pointStruct)
-    numPoints = int(tlvLength/pointStructSize)
-
-    for i in range(numPoints):
-        try:
-            x, y, z, doppler = struct.unpack(pointStruct, tlvData[:pointStructSize])
-        except:
-            numPoints = i
-            log.error('Point Cloud TLV Parser Failed')
-            break
-        tlvData = tlvData[pointStructSize:]
-        pointCloud[i,0] = x 
-        pointCloud[i,1] = y
-        pointCloud[i,2] = z
-        pointCloud[i,3] = doppler
+    numPoints = _pointCount(tlvData, tlvLength, 0, POINT_DTYPE.itemsize, pointCloud, 'Point Cloud TLV Parser Failed')
+    points = np.frombuffer(tlvData, POINT_DTYPE, numPoints)
+    pointCloud[:numPoints,0] = points['x']
+    pointCloud[:numPoints,1] = points['y']
+    pointCloud[:numPoints,2] = points['z']
+    pointCloud[:numPoints,3] = points['doppler']
     outputDict['numDetectedPoints'], outputDict['pointCloud'] = numPoints, pointCloud
 
-def parseADCSamples(tlvData, tlvLength, outputDict):
-    adcDataStruct = 'h'
-    adcDataSize = struct.calcsize(adcDataStruct)
-    numADCSamples = int(len(tlvData)/adcDataSize)
-    adc_samples = np.empty(numADCSamples)
-    for idx in range(numADCSamples):
-        try:
-            adc_sample = struct.unpack(adcDataStruct, tlvData[:adcDataSize])[0]
-        except:
-            log.error('ADC Data Parsing Failed')
-            break
-        tlvData = tlvData[adcDataSize:]
-        adc_samples[idx] = adc_sample
-    outputDict['rawADCData'] = adc_samples
+def parseADCSamples(tlvData, tlvLength, outputDict, out=None):
+    # Every ADC sample is an int16_t
+    numADCSamples = len(tlvData) // 2
+    outputDict['rawADCData'] = _bulkDecode(tlvData, '<i2', numADCSamples, out)
 
 # Point Cloud Ext TLV from SDK for xWRL6432
 def parsePointCloudExtTLV(tlvData, tlvLength, outputDict):
     pointCloud = outputDict['pointCloud']
-    pUnitStruct = '4f2h' # Units for the 5 results to decompress them
-    pointStruct = '4h2B' # x y z doppler snr noise
-    pUnitSize = struct.calcsize(pUnitStruct)
-    pointSize = struct.calcsize(pointStruct)
 
     # Parse the decompression factors
     try:
-        pUnit = struct.unpack(pUnitStruct, tlvData[:pUnitSize])
+        pUnit = POINT_EXT_UNIT_STRUCT.unpack_from(tlvData, 0)
     except:
-            log.error('Point Cloud TLV Parser Failed')
-            outputDict['numDetectedPoints'], outputDict['pointCloud'] = 0, pointCloud
-    # Update data pointer
-    tlvData = tlvData[pUnitSize:]
-
-    # Parse each point
-    numPoints = int((tlvLength-pUnitSize)/pointSize)
-    for i in range(numPoints):
-        try:
-            x, y, z, doppler, snr, noise = struct.unpack(pointStruct, tlvData[:pointSize])
-        except:
-            numPoints = i
-            log.error('Point Cloud TLV Parser Failed')
-            break
-        
-        tlvData = tlvData[pointSize:]
-        # Decompress values
-        pointCloud[i,0] = x * pUnit[0]          # x
-        pointCloud[i,1] = y * pUnit[0]          # y
-        pointCloud[i,2] = z * pUnit[0]          # z
-        pointCloud[i,3] = doppler * pUnit[1]    # Doppler
-        pointCloud[i,4] = snr * pUnit[2]        # SNR
-        pointCloud[i,5] = noise * pUnit[3]      # Noise
+        log.error('Point Cloud TLV Parser Failed')
+        outputDict['numDetectedPoints'], outputDict['pointCloud'] = 0, pointCloud
+        return
+
+    # Decode every point at once, starting after the decompression factors
+    numPoints = _pointCount(tlvData, tlvLength, POINT_EXT_UNIT_STRUCT.size, POINT_EXT_DTYPE.itemsize, pointCloud, 'Point Cloud TLV Parser Failed')
+    points = np.frombuffer(tlvData, POINT_EXT_DTYPE, numPoints, POINT_EXT_UNIT_STRUCT.size)
+
+    # Decompress values
+    np.multiply(points['x'], pUnit[0], out=pointCloud[:numPoints,0], dtype=np.float64)       # x
+    np.multiply(points['y'], pUnit[0], out=pointCloud[:numPoints,1], dtype=np.float64)       # y
+    np.multiply(points['z'], pUnit[0], out=pointCloud[:numPoints,2], dtype=np.float64)       # z
+    np.multiply(points['doppler'], pUnit[1], out=pointCloud[:numPoints,3], dtype=np.float64) # Doppler
+    np.multiply(points['snr'], pUnit[2], out=pointCloud[:numPoints,4], dtype=np.float64)     # SNR
+    np.multiply(points['noise'], pUnit[3], out=pointCloud[:numPoints,5], dtype=np.float64)   # Noise
     outputDict['numDetectedPoints'], outputDict['pointCloud'] = numPoints, pointCloud
 
 # Enhanced Presence Detection TLV from SDK
 def parseEnhancedPresenceInfoTLV(tlvData, tlvLength, outputDict):
-    pointStruct = '1b'  # While there are technically 2 bits per zone, we need to use at least 1 byte to represent
-    pointStructSize = struct.calcsize(pointStruct)
     numZones = (tlvData[0]) # First byte in the TLV is the number of zones, the rest of it is the occupancy data
     zonePresence = [0]
-    tlvData = tlvData[1:]
     zoneCount = 0
     while(zoneCount < numZones):
         try:
-            idx = math.floor((zoneCount)/4)
+            idx = 1 + math.floor((zoneCount)/4)
             zonePresence.append(tlvData[idx] >> (((zoneCount) * 2) % 8) & 3)
             zoneCount = zoneCount + 1
         except:
             log.error('Enhanced Presence Detection TLV Parser Failed')
             break
-    tlvData = tlvData[pointStructSize:]
     outputDict['enhancedPresenceDet'] = zonePresence
 
 # Side info TLV from SDK
 def parseSideInfoTLV(tlvData, tlvLength, outputDict):
     pointCloud = outputDict['pointCloud']
-    pointStruct = '2H'  # Two unsigned shorts: SNR and Noise
-    pointStructSize = struct.calcsize(pointStruct)
-    numPoints = int(tlvLength/pointStructSize)
+    numPoints = _pointCount(tlvData, tlvLength, 0, SIDE_INFO_DTYPE.itemsize, pointCloud, 'Side Info TLV Parser Failed')
+    points = np.frombuffer(tlvData, SIDE_INFO_DTYPE, numPoints)
 
-    for i in range(numPoints):
-        try:
-            snr, noise = struct.unpack(pointStruct, tlvData[:pointStructSize])
-        except:
-            numPoints = i
-            log.error('Side Info TLV Parser Failed')
-            break
-        tlvData = tlvData[pointStructSize:]
-        # SNR and Noise are sent as uint16_t which are measured in 0.1 dB Steps
-        pointCloud[i,4] = snr * 0.1
-        pointCloud[i,5] = noise * 0.1
+    # SNR and Noise are sent as uint16_t which are measured in 0.1 dB Steps
+    np.multiply(points['snr'], 0.1, out=pointCloud[:numPoints,4], dtype=np.float64)
+    np.multiply(points['noise'], 0.1, out=pointCloud[:numPoints,5], dtype=np.float64)
     outputDict['pointCloud'] = pointCloud
 
 # Range Profile Parser
-def parseRangeProfileTLV(tlvData, tlvLength, outputDict):
-    rangeProfile = []
-    rangeDataStruct = 'I' # Every range bin gets a uint32_t
-    rangeDataSize = struct.calcsize(rangeDataStruct)
-
-    numRangeBins = int(len(tlvData)/rangeDataSize)
-    for i in range(numRangeBins):
-        # Read in single range bin data
-        try:
-            rangeBinData = struct.unpack(rangeDataStruct, tlvData[:rangeDataSize])
-        except:
-            log.error(f'Range Profile TLV Parser Failed To Parse Range Bin Number ${i}')
-            break
-        rangeProfile.append(rangeBinData[0])
-
-        # Move to next value
-        tlvData = tlvData[rangeDataSize:]
-    outputDict['rangeProfile'] = rangeProfile
+def parseRangeProfileTLV(tlvData, tlvLength, outputDict, out=None):
+    # Every range bin gets a uint32_t
+    numRangeBins = len(tlvData) // 4
+    outputDict['rangeProfile'] = _bulkDecode(tlvData, '<u4', numRangeBins, out)
 
 # Occupancy state machine TLV from small obstacle detection
 def parseOccStateMachTLV(tlvData, tlvLength, outputDict):
     occStateMachOutput = [False] * 32 # Initialize to 32 empty zones
-    occStateMachStruct = 'I' # Single uint32_t which holds 32 booleans
-    occStateMachLength = struct.calcsize(occStateMachStruct)
     try:
-        occStateMachData = struct.unpack(occStateMachStruct, tlvData[:occStateMachLength])
+        occStateMachData = OCC_STATE_MACH_STRUCT.unpack_from(tlvData, 0)
         for i in range(32):
             # Since the occupied/not occupied flags are individual bits in a uint32, mask out each flag one at a time
             occStateMachOutput[i] = ((occStateMachData[0] & (1 << i)) != 0)
@@ -161,73 +187,40 @@ def parseOccStateMachTLV(tlvData, tlvLength, outputDict):
 # Spherical Point Cloud TLV Parser
 def parseSphericalPointCloudTLV(tlvData, tlvLength, outputDict):
     pointCloud = outputDict['pointCloud']
-    pointStruct = '4f'  # Range, Azimuth, Elevation, and Doppler
-    pointStructSize = struct.calcsize(pointStruct)
-    numPoints = int(tlvLength/pointStructSize)
+    numPoints = _pointCount(tlvData, tlvLength, 0, SPHERICAL_POINT_DTYPE.itemsize, pointCloud, 'Point Cloud TLV Parser Failed')
+    points = np.frombuffer(tlvData, SPHERICAL_POINT_DTYPE, numPoints)
 
-    for i in range(numPoints):
-        try:
-            rng, azimuth, elevation, doppler = struct.unpack(pointStruct, tlvData[:pointStructSize])
-        except:
-            numPoints = i
-            log.error('Point Cloud TLV Parser Failed')
-            break
-        tlvData = tlvData[pointStructSize:]
-        pointCloud[i,0] = rng
-        pointCloud[i,1] = azimuth
-        pointCloud[i,2] = elevation
-        pointCloud[i,3] = doppler
-    
     # Convert from spherical to cartesian
-    pointCloud[:,0:3] = sphericalToCartesianPointCloud(pointCloud[:, 0:3])
+    _sphericalToCartesian(pointCloud, points['range'].astype(np.float64), points['azimuth'].astype(np.float64), points['elevation'].astype(np.float64))
+    pointCloud[:numPoints,3] = points['doppler']
     outputDict['numDetectedPoints'], outputDict['pointCloud'] =  numPoints, pointCloud
 
 # Point Cloud TLV from Capon Chain
 def parseCompressedSphericalPointCloudTLV(tlvData, tlvLength, outputDict):
     pointCloud = outputDict['pointCloud']
-    pUnitStruct = '5f' # Units for the 5 results to decompress them
-    pointStruct = '2bh2H' # Elevation, Azimuth, Doppler, Range, SNR
-    pUnitSize = struct.calcsize(pUnitStruct)
-    pointSize = struct.calcsize(pointStruct)
 
     # Parse the decompression factors
     try:
-        pUnit = struct.unpack(pUnitStruct, tlvData[:pUnitSize])
+        pUnit = COMPRESSED_POINT_UNIT_STRUCT.unpack_from(tlvData, 0)
     except:
-            log.error('Point Cloud TLV Parser Failed')
-            outputDict['numDetectedPoints'], outputDict['pointCloud'] = 0, pointCloud
-    # Update data pointer
-    tlvData = tlvData[pUnitSize:]
-
-    # Parse each point
-    numPoints = int((tlvLength-pUnitSize)/pointSize)
-    for i in range(numPoints):
-        try:
-            elevation, azimuth, doppler, rng, snr = struct.unpack(pointStruct, tlvData[:pointSize])
-        except:
-            numPoints = i
-            log.error('Point Cloud TLV Parser Failed')
-            break
-        
-        tlvData = tlvData[pointSize:]
-        if (azimuth >= 128):
-            log.error('Az greater than 127')
-            azimuth -= 256
-        if (elevation >= 128):
-            log.error('Elev greater than 127')
-            elevation -= 256
-        if (doppler >= 32768):
-            log.error('Doppler greater than 32768')
-            doppler -= 65536
-        # Decompress values
-        pointCloud[i,0] = rng * pUnit[3]          # Range
-        pointCloud[i,1] = azimuth * pUnit[1]      # Azimuth
-        pointCloud[i,2] = elevation * pUnit[0]    # Elevation
-        pointCloud[i,3] = doppler * pUnit[2]      # Doppler
-        pointCloud[i,4] = snr * pUnit[4]          # SNR
+        log.error('Point Cloud TLV Parser Failed')
+        outputDict['numDetectedPoints'], outputDict['pointCloud'] = 0, pointCloud
+        return
+
+    # Decode every point at once, starting after the decompression factors.
+    # Elevation, azimuth and doppler are signed in the dtype so no wraparound fix up is needed
+    numPoints = _pointCount(tlvData, tlvLength, COMPRESSED_POINT_UNIT_STRUCT.size, COMPRESSED_SPHERICAL_POINT_DTYPE.itemsize, pointCloud, 'Point Cloud TLV Parser Failed')
+    points = np.frombuffer(tlvData, COMPRESSED_SPHERICAL_POINT_DTYPE, numPoints, COMPRESSED_POINT_UNIT_STRUCT.size)
+
+    # Decompress values
+    rng = np.multiply(points['range'], pUnit[3], dtype=np.float64)
+    azimuth = np.multiply(points['azimuth'], pUnit[1], dtype=np.float64)
+    elevation = np.multiply(points['elevation'], pUnit[0], dtype=np.float64)
+    np.multiply(points['doppler'], pUnit[2], out=pointCloud[:numPoints,3], dtype=np.float64)
+    np.multiply(points['snr'], pUnit[4], out=pointCloud[:numPoints,4], dtype=np.float64)
 
     # Convert from spherical to cartesian
-    pointCloud[:,0:3] = sphericalToCartesianPointCloud(pointCloud[:, 0:3])
+    _sphericalToCartesian(pointCloud, rng, azimuth, elevation)
     outputDict['numDetectedPoints'] = numPoints
     outputDict['pointCloud'] = pointCloud
 
@@ -247,34 +240,19 @@ def parseCompressedSphericalPointCloudTLV(tlvData, tlvLength, outputDict):
 #float        ec[16];  /*! @brief   Target Error covariance matrix, [4x4 float], in row major order, range, azimuth, elev, doppler */
 #float        g;
 #float        confidenceLevel;    /*! @brief   Tracker confidence metric*/
-def parseTrackTLV(tlvData, tlvLength, outputDict):
-    targetStruct = 'I27f'
-    targetSize = struct.calcsize(targetStruct)
-    numDetectedTargets = int(tlvLength/targetSize)
-    targets = np.empty((numDetectedTargets,16))
-    for i in range(numDetectedTargets):
-        try:
-            targetData = struct.unpack(targetStruct,tlvData[:targetSize])
-        except:
-            log.error('Target TLV parsing failed')
-            outputDict['numDetectedTracks'], outputDict['trackData'] = 0, targets
-
-        targets[i,0] = targetData[0] # Target ID
-        targets[i,1] = targetData[1] # X Position
-        targets[i,2] = targetData[2] # Y Position
-        targets[i,3] = targetData[3] # Z Position
-        targets[i,4] = targetData[4] # X Velocity
-        targets[i,5] = targetData[5] # Y Velocity
-        targets[i,6] = targetData[6] # Z Velocity
-        targets[i,7] = targetData[7] # X Acceleration
-        targets[i,8] = targetData[8] # Y Acceleration
-        targets[i,9] = targetData[9] # Z Acceleration
-        targets[i,10] = targetData[26] # G
-        targets[i,11] = targetData[27] # Confidence Level
-        
-        # Throw away EC
-        tlvData = tlvData[targetSize:]
+def parseTrackTLV(tlvData, tlvLength, outputDict, out=None):
+    numDetectedTargets = _recordCount(tlvData, tlvLength, 0, TRACK_DTYPE.itemsize, 'Target TLV parsing failed')
+    tracks = np.frombuffer(tlvData, TRACK_DTYPE, numDetectedTargets)
+    targets = _outputRows(out, numDetectedTargets, 16, 'Target')
+    targets[:,0] = tracks['tid']            # Target ID
+    targets[:,1:4] = tracks['pos']          # X, Y, Z Position
+    targets[:,4:7] = tracks['vel']          # X, Y, Z Velocity
+    targets[:,7:10] = tracks['acc']         # X, Y, Z Acceleration
+    targets[:,10] = tracks['g']             # G
+    targets[:,11] = tracks['confidence']    # Confidence Level
     outputDict['numDetectedTracks'], outputDict['trackData'] = numDetectedTargets, targets
+    # (N, 4, 4) error covariance per track, a float32 view of the frame
+    outputDict['trackErrorCovariance'] = tracks['ec']
 
 # Decode 2D People Counting Target List TLV
 # 2D Struct format
@@ -288,55 +266,33 @@ def parseTrackTLV(tlvData, tlvLength, outputDict):
 #float        ec[9];  /*! @brief   Target Error covariance matrix, [3x3 float], in row major order, range, azimuth, elev, doppler */
 #float        g;
 #float        confidenceLevel;    /*! @brief   Tracker confidence metric*/
-def parseTrackTLV2D(tlvData, tlvLength, outputDict):
-    targetStruct = 'I17f'
-    targetSize = struct.calcsize(targetStruct)
-    numDetectedTargets = int(tlvLength/targetSize)
-    targets = np.empty((numDetectedTargets,16))
-    for i in range(numDetectedTargets):
-        try:
-            targetData = struct.unpack(targetStruct,tlvData[:targetSize])
-        except:
-            log.error('Target TLV parsing failed')
-            outputDict['numDetectedTracks'], outputDict['trackData'] = 0, targets
-
-        targets[i,0] = targetData[0] # Target ID
-        targets[i,1] = targetData[1] # X Position
-        targets[i,2] = targetData[2] # Y Position
-        targets[i,3] = targetData[3] # X Velocity
-        targets[i,4] = targetData[4] # Y Velocity
-        targets[i,5] = targetData[5] # X Acceleration
-        targets[i,6] = targetData[6] # Y Acceleration
-        targets[i,7] = targetData[16] # G
-        targets[i,8] = targetData[17] # Confidence Level
-        
-        # Throw away EC
-        tlvData = tlvData[targetSize:]
+def parseTrackTLV2D(tlvData, tlvLength, outputDict, out=None):
+    numDetectedTargets = _recordCount(tlvData, tlvLength, 0, TRACK_2D_DTYPE.itemsize, 'Target TLV parsing failed')
+    tracks = np.frombuffer(tlvData, TRACK_2D_DTYPE, numDetectedTargets)
+    targets = _outputRows(out, numDetectedTargets, 16, 'Target')
+    targets[:,0] = tracks['tid']            # Target ID
+    targets[:,1:3] = tracks['pos']          # X, Y Position
+    targets[:,3:5] = tracks['vel']          # X, Y Velocity
+    targets[:,5:7] = tracks['acc']          # X, Y Acceleration
+    targets[:,7] = tracks['g']              # G
+    targets[:,8] = tracks['confidence']     # Confidence Level
     outputDict['numDetectedTracks'], outputDict['trackData'] = numDetectedTargets, targets
+    # (N, 3, 3) error covariance per track, a float32 view of the frame
+    outputDict['trackErrorCovariance'] = tracks['ec']
 
 # Track heights
-def parseTrackHeightTLV(tlvData, tlvLength, outputDict):
-    targetStruct = 'I2f' #incoming data is an unsigned integer for TID, followed by 2 floats
-    targetSize = struct.calcsize(targetStruct)
-    numDetectedHeights = int(tlvLength/targetSize)
-    heights = np.empty((numDetectedHeights,3))
-    for i in range(numDetectedHeights):
-        try:
-            targetData = struct.unpack(targetStruct,tlvData[i * targetSize:(i + 1) * targetSize])
-        except:
-            log.error('Target TLV parsing failed')
-            outputDict['numDetectedHeights'], outputDict['heightData'] = 0, heights
-
-        heights[i,0] = targetData[0] # Target ID
-        heights[i,1] = targetData[1] # maxZ
-        heights[i,2] = targetData[2] # minZ
+def parseTrackHeightTLV(tlvData, tlvLength, outputDict, out=None):
+    numDetectedHeights = _recordCount(tlvData, tlvLength, 0, TRACK_HEIGHT_DTYPE.itemsize, 'Target TLV parsing failed')
+    targetHeights = np.frombuffer(tlvData, TRACK_HEIGHT_DTYPE, numDetectedHeights)
+    heights = _outputRows(out, numDetectedHeights, 3, 'Target height')
+    heights[:,0] = targetHeights['tid']     # Target ID
+    heights[:,1] = targetHeights['maxZ']    # maxZ
+    heights[:,2] = targetHeights['minZ']    # minZ
 
     outputDict['numDetectedHeights'], outputDict['heightData'] = numDetectedHeights, heights
 
 def parseCamTLV(tlvData, tlvLength, outputDict):
-    targetStruct = '4I'
-    targetSize = struct.calcsize(targetStruct)
-    camData = struct.unpack(targetStruct, tlvData)
+    camData = CAM_TRIGGERS_STRUCT.unpack(tlvData)
 
     # bits set in this field = which tracks are currently active
     numTracks = bin(camData[0]).count("1")
@@ -372,25 +328,12 @@ def parseCamTLV(tlvData, tlvLength, outputDict):
 
 # Decode Target Index TLV
 def parseTargetIndexTLV(tlvData, tlvLength, outputDict):
-    indexStruct = 'B' # One byte per index
-    indexSize = struct.calcsize(indexStruct)
-    numIndexes = int(tlvLength/indexSize)
-    indexes = np.empty(numIndexes)
-    for i in range(numIndexes):
-        try:
-            index = struct.unpack(indexStruct, tlvData[:indexSize])
-        except:
-            log.error('Target Index TLV Parsing Failed')
-            outputDict['trackIndexes'] = indexes
-        indexes[i] = int(index[0])
-        tlvData = tlvData[indexSize:]
-    outputDict['trackIndexes'] = indexes
+    # One byte per index, returned as a uint8 view of the frame
+    numIndexes = _recordCount(tlvData, tlvLength, 0, 1, 'Target Index TLV Parsing Failed')
+    outputDict['trackIndexes'] = np.frombuffer(tlvData, np.uint8, numIndexes)
 
 # Vital Signs
-def parseVitalSignsTLV (tlvData, tlvLength, outputDict):
-    vitalsStruct = '2H33f'
-    vitalsSize = struct.calcsize(vitalsStruct)
-    
+def parseVitalSignsTLV(tlvData, tlvLength, outputDict):
     # Initialize struct in case of error
     vitalsOutput = {}
     vitalsOutput ['id'] = 999
@@ -403,7 +346,7 @@ def parseVitalSignsTLV (tlvData, tlvLength, outputDict):
 
     # Capture data for active patient
     try:
-        vitalsData = struct.unpack(vitalsStruct, tlvData[:vitalsSize])
+        vitalsData = VITALS_STRUCT.unpack_from(tlvData, 0)
     except:
         log.error('ERROR: Vitals TLV Parsing Failed')
         outputDict['vitals'] = vitalsOutput
@@ -417,37 +360,26 @@ def parseVitalSignsTLV (tlvData, tlvLength, outputDict):
     vitalsOutput ['heartWaveform'] = np.asarray(vitalsData[5:20])
     vitalsOutput ['breathWaveform'] = np.asarray(vitalsData[20:35])
 
-    # Advance tlv data pointer to end of this TLV
-    tlvData = tlvData[vitalsSize:]
     outputDict['vitals'] = vitalsOutput
 
 # Classifier
-def parseClassifierTLV(tlvData, tlvLength, outputDict):
-    classifierProbabilitiesStruct = str(NUM_CLASSES_IN_CLASSIFIER) + 'c'
-    classifierProbabilitiesSize = struct.calcsize(classifierProbabilitiesStruct)
-    numDetectedTargets = int(tlvLength/classifierProbabilitiesSize)
-    outputProbabilities = np.empty((numDetectedTargets,NUM_CLASSES_IN_CLASSIFIER))
-    for i in range(numDetectedTargets):
-        try:
-            classifierProbabilities = struct.unpack(classifierProbabilitiesStruct,tlvData[:classifierProbabilitiesSize])
-        except:
-            log.error('Classifier TLV parsing failed')
-            outputDict['classifierOutput'] = 0
-        
-        for j in range(NUM_CLASSES_IN_CLASSIFIER):
-            outputProbabilities[i,j] = float(ord(classifierProbabilities[j])) / 128
-        # Throw away EC
-        tlvData = tlvData[classifierProbabilitiesSize:]
-    outputDict['classifierOutput'] = outputProbabilities
+def parseClassifierTLV(tlvData, tlvLength, outputDict, out=None):
+    # One uint8 probability per class per target, in 1/128 steps
+    numDetectedTargets = _recordCount(tlvData, tlvLength, 0, NUM_CLASSES_IN_CLASSIFIER, 'Classifier TLV parsing failed')
+    probabilities = np.frombuffer(tlvData, np.uint8, numDetectedTargets * NUM_CLASSES_IN_CLASSIFIER).reshape(numDetectedTargets, NUM_CLASSES_IN_CLASSIFIER)
+    if (out is not None and len(out) < numDetectedTargets):
+        log.warning('Classifier output buffer of %d rows is too small for %d targets, allocating a new one' % (len(out), numDetectedTargets))
+        out = None
+    if (out is not None):
+        out = out[:numDetectedTargets]
+    outputDict['classifierOutput'] = np.divide(probabilities, 128, out=out)
 
 # Extracted features for 6843 Gesture Demo
 def parseGestureFeaturesTLV(tlvData, tlvLength, outputDict):
-    featuresStruct = '10f'  
-    featuresStructSize = struct.calcsize(featuresStruct)
     gestureFeatures = []
 
     try:
-        wtDoppler, wtDopplerPos, wtDopplerNeg, wtRange, numDetections, wtAzimuthMean, wtElevMean, azDoppCorr, wtAzimuthStd, wtdElevStd = struct.unpack(featuresStruct, tlvData[:featuresStructSize])
+        wtDoppler, wtDopplerPos, wtDopplerNeg, wtRange, numDetections, wtAzimuthMean, wtElevMean, azDoppCorr, wtAzimuthStd, wtdElevStd = GESTURE_FEATURES_6843_STRUCT.unpack_from(tlvData, 0)
         gestureFeatures = [wtDoppler, wtDopplerPos, wtDopplerNeg, wtRange, numDetections, wtAzimuthMean, wtElevMean, azDoppCorr, wtAzimuthStd, wtdElevStd]
     except:
         log.error('Gesture Features TLV Parser Failed')
@@ -457,11 +389,8 @@ def parseGestureFeaturesTLV(tlvData, tlvLength, outputDict):
 
 # Raw ANN Probabilities TLV for 6843 Gesture Demo
 def parseGestureProbTLV6843(tlvData, tlvLength, outputDict):
-    probStruct = '10f'
-    probStructSize = struct.calcsize(probStruct)
-
     try:
-        annOutputProb = struct.unpack(probStruct, tlvData[:probStructSize])
+        annOutputProb = GESTURE_PROB_6843_STRUCT.unpack_from(tlvData, 0)
     except:
         log.error('ANN Probabilities TLV Parser Failed')
         return None
@@ -470,12 +399,10 @@ def parseGestureProbTLV6843(tlvData, tlvLength, outputDict):
 
 # 6432 Gesture demo features
 def parseGestureFeaturesTLV6432(tlvData, tlvLength, outputDict):
-    featuresStruct = '16f'
-    featuresStructSize = struct.calcsize(featuresStruct)
     gestureFeatures = []
 
     try:
-        gestureFeatures = struct.unpack(featuresStruct, tlvData[:featuresStructSize])
+        gestureFeatures = GESTURE_FEATURES_6432_STRUCT.unpack_from(tlvData, 0)
     except:
         log.error('Gesture Features TLV Parser Failed')
         return None
@@ -484,12 +411,10 @@ def parseGestureFeaturesTLV6432(tlvData, tlvLength, outputDict):
 
 # Detected gesture
 def parseGestureClassifierTLV6432(tlvData, tlvLength, outputDict):
-    classifierStruct = '1b'
-    classifierStructSize = struct.calcsize(classifierStruct)
     classifier_result = 0
 
     try:
-        classifier_result = struct.unpack(classifierStruct, tlvData[:classifierStructSize])
+        classifier_result = GESTURE_CLASSIFIER_6432_STRUCT.unpack_from(tlvData, 0)
     except:
         log.error('Classifier Result TLV Parser Failed')
         return None
@@ -497,62 +422,11 @@ def parseGestureClassifierTLV6432(tlvData, tlvLength, outputDict):
     outputDict['gesture'] = classifier_result[0]
     outputDict['ktoGesture'] = classifier_result[0]
 
-# Mode in Gesture/KTO demo 
-def parseGesturePresenceTLV6432(tlvData, tlvLength, outputDict):
-    presenceStruct = '1b'
-    presenceStructSize = struct.calcsize(presenceStruct)
-    presence_result = 0
-
-    try:
-        presence_result = struct.unpack(presenceStruct, tlvData[:presenceStructSize])
-    except:
-        log.error('Gesture Presence Result TLV Parser Failed')
-        return None
-
-    outputDict['gesturePresence'] = presence_result[0]
-
-def parsePresenceThreshold(tlvData, tlvLength, outputDict):
-    threshStruct = '1I'
-    threshStructSize = struct.calcsize(threshStruct)
-
-    try: 
-        presenceThreshold = struct.unpack(threshStruct, tlvData[:threshStructSize])
-    except: 
-        log.error('Presence Threshold Parse Failed')
-        return 0
-    
-    outputDict['presenceThreshold'] = presenceThreshold[0]
-
-
-def parseModeSwitchTLV(tlvData, tlvLength, outputDict):
-    modeSwitchStruct = '1b'
-    modeSwitchStructSize = struct.calcsize(modeSwitchStruct)
-    try: 
-        modeState = struct.unpack(modeSwitchStruct, tlvData[:modeSwitchStructSize])
-    except: 
-        log.error('Mode Switch TLV Parse Failed')
-        return 0
-    outputDict['modeState'] = modeState[0]
-
-# Surface Classification
-def parseSurfaceClassificationTLV(tlvData, tlvLength, outputDict):
-    classifierStruct = '1f'
-    classifierStructSize = struct.calcsize(classifierStruct)
-    classifier_result = 0
-
-    try:
-        classifier_result = struct.unpack(classifierStruct, tlvData[:classifierStructSize])
-    except:
-        log.error('Classifier Result TLV Parser Failed')
-        return None
-
-    outputDict['surfaceClassificationOutput'] = classifier_result[0]
-
 def parseVelocityTLV(tlvData, tlvLength, outputDict):
     velocity = []
     valid = False
     try:
-        tempVel, tempConf = struct.unpack('1f1?', tlvData[:struct.calcsize('1f1?')])
+        tempVel, tempConf = VELOCITY_STRUCT.unpack_from(tlvData, 0)
         velocity.append(tuple((tempVel, tempConf)))
     except:
         velocity = []
@@ -560,11 +434,9 @@ def parseVelocityTLV(tlvData, tlvLength, outputDict):
     outputDict['velocity'] = velocity
 
 def parseRXChanCompTLV(tlvData, tlvLength, outputDict):
-    compStruct = '13f' # One byte per index
-    compSize = struct.calcsize(compStruct)
-    coefficients = np.empty(compSize)
+    coefficients = np.empty(RX_CHAN_COMP_STRUCT.size)
     try:
-        coefficients = struct.unpack(compStruct, tlvData[:compSize])
+        coefficients = RX_CHAN_COMP_STRUCT.unpack_from(tlvData, 0)
     except:
         log.error('RX Channel Comp TLV Parsing Failed')
 
@@ -572,19 +444,15 @@ def parseRXChanCompTLV(tlvData, tlvLength, outputDict):
 
 # Statistics
 def parseExtStatsTLV(tlvData, tlvLength, outputDict):
-    extStatsStruct = '2I8H' # Units for the 5 results to decompress them
-    extStatsStructSize = struct.calcsize(extStatsStruct)
     # Parse the decompression factors
     try:
         interFrameProcTime, transmitOutTime, power1v8, power3v3, \
         power1v2, power1v2RF, tempRx, tempTx, tempPM, tempDIG = \
-        struct.unpack(extStatsStruct, tlvData[:extStatsStructSize])
+        EXT_STATS_STRUCT.unpack_from(tlvData, 0)
     except:
             log.error('Ext Stats Parser Failed')
             return 0
 
-    tlvData = tlvData[extStatsStructSize:]
-
     procTimeData = {}
     powerData = {}
     tempData = {}
@@ -607,19 +475,15 @@ def parseExtStatsTLV(tlvData, tlvLength, outputDict):
 
 # Statistics
 def parseExtStatsTLVBSD(tlvData, tlvLength, outputDict):
-    extStatsStruct = '2I8H2f' # Units for the 5 results to decompress them
-    extStatsStructSize = struct.calcsize(extStatsStruct)
     # Parse the decompression factors
     try:
         interFrameProcTime, transmitOutTime, power1v8, power3v3, \
         power1v2, power1v2RF, tempRx, tempTx, tempPM, tempDIG, egoSpeed, alphaAngle = \
-        struct.unpack(extStatsStruct, tlvData[:extStatsStructSize])
+        EXT_STATS_BSD_STRUCT.unpack_from(tlvData, 0)
     except:
             log.error('Ext Stats Parser Failed')
             return 0
 
-    tlvData = tlvData[extStatsStructSize:]
-
     procTimeData = {}
     powerData = {}
     tempData = {}
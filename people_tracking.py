@@ -30,6 +30,8 @@ from gl_text import GLTextItem
 
 from gui_threads import updateQTTargetThread3D
 from gui_common import TAG_HISTORY_LEN
+from radar_frame import RadarFrame
+from lazy_frame import LazyFrame
 
 import logging
 
@@ -67,6 +69,9 @@ class PeopleTracking(Plot3D, Plot1D):
 
     def updateGraph(self, outputDict):
         self.plotStart = int(round(time.time()*1000))
+        # previousClouds keeps point clouds for MAX_PERSISTENT_FRAMES frames, so they can't be views of pooled buffers
+        if (isinstance(outputDict, (RadarFrame, LazyFrame))):
+            outputDict.retain()
         self.updatePointCloud(outputDict)
 
         self.cumulativeCloud = None
@@ -0,0 +1,107 @@
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Values of the people tracking demo, used for whatever the cfg doesn't set
+DEFAULT_FRAME_PERIOD = 55.0 # ms
+DEFAULT_MAX_POINTS = 800
+DEFAULT_MAX_TRACKS = 20
+# The tracker numbers tracks with a uint8 and reserves 253-255 for points that aren't associated with one
+MAX_TRACKS_LIMIT = 250
+
+# The cfg settings the host side depends on, parsed and checked once so buffer sizes and time windows follow
+# the cfg instead of assuming a 55 ms frame and a fixed number of tracks.
+#
+#     config = parseRadarConfig(cfg)          # cfg is a list of lines, raises ValueError for invalid ones
+#     config.framePeriod                      # ms, from frameCfg
+#     config.framesIn(1.5)                    # frames in 1.5 s at that period
+#
+# Boundary boxes are (xMin, xMax, yMin, yMax, zMin, zMax) in meters, None if the cfg has no such line.
+# Angles are in degrees, as in the cfg
+class RadarConfig():
+    def __init__(self):
+        # frameCfg
+        self.framePeriod = DEFAULT_FRAME_PERIOD
+        self.chirpStartIndex = 0
+        self.chirpEndIndex = 0
+        self.numLoops = 1
+        self.numFrames = 0 # 0 = until sensorStop
+        # trackingCfg
+        self.trackingEnabled = False
+        self.maxPoints = DEFAULT_MAX_POINTS
+        self.maxTracks = DEFAULT_MAX_TRACKS
+        # boundaryBox, staticBoundaryBox, presenceBoundaryBox
+        self.boundaryBox = None
+        self.staticBoundaryBox = None
+        self.presenceBoundaryBox = None
+        # sensorPosition (xWRx843: height, azimuth tilt, elevation tilt)
+        self.sensorHeight = 0.0
+        self.azimuthTilt = 0.0
+        self.elevationTilt = 0.0
+        # Commands seen, in cfg order
+        self.commands = []
+
+    # Frames per second
+    @property
+    def frameRate(self):
+        return 1000.0 / self.framePeriod
+
+    # Number of frames that cover seconds, at least 1
+    def framesIn(self, seconds):
+        return max(int(round(seconds * 1000.0 / self.framePeriod)), 1)
+
+    def __repr__(self):
+        return 'RadarConfig(framePeriod=%g ms, maxPoints=%d, maxTracks=%d, boundaryBox=%s)' % (self.framePeriod, self.maxPoints, self.maxTracks, self.boundaryBox)
+
+def _numbers(args, count, lineNumber, convert=float):
+    if (len(args) - 1 < count):
+        raise ValueError('cfg line %d: %s needs %d arguments, got %d' % (lineNumber, args[0], count, len(args) - 1))
+    try:
+        return [convert(arg) for arg in args[1:count + 1]]
+    except ValueError:
+        raise ValueError('cfg line %d: %s has a non numeric argument' % (lineNumber, args[0]))
+
+def _box(args, lineNumber):
+    box = tuple(_numbers(args, 6, lineNumber))
+    for axis, (low, high) in zip('xyz', (box[0:2], box[2:4], box[4:6])):
+        if (low > high):
+            raise ValueError('cfg line %d: %s has %sMin %g above %sMax %g' % (lineNumber, args[0], axis, low, axis, high))
+    return box
+
+# RadarConfig from the lines of a cfg file. Lines it doesn't use are only recorded in commands
+def parseRadarConfig(cfg):
+    config = RadarConfig()
+    for lineNumber, line in enumerate(cfg, 1):
+        args = line.split()
+        if (len(args) == 0 or args[0].startswith('%')):
+            continue
+        config.commands.append(args[0])
+        if (args[0] == 'frameCfg'):
+            chirpStartIndex, chirpEndIndex, numLoops, numFrames, framePeriod = _numbers(args, 5, lineNumber)
+            if (framePeriod <= 0):
+                raise ValueError('cfg line %d: frameCfg frame period must be positive, got %g' % (lineNumber, framePeriod))
+            config.chirpStartIndex, config.chirpEndIndex = int(chirpStartIndex), int(chirpEndIndex)
+            config.numLoops, config.numFrames = int(numLoops), int(numFrames)
+            config.framePeriod = framePeriod
+        elif (args[0] == 'trackingCfg'):
+            enabled, paramSet, maxPoints, maxTracks = _numbers(args, 4, lineNumber, int)
+            if (maxPoints <= 0 or maxTracks <= 0 or maxTracks > MAX_TRACKS_LIMIT):
+                raise ValueError('cfg line %d: trackingCfg needs 1 to %d tracks and some points, got %d tracks and %d points' % (lineNumber, MAX_TRACKS_LIMIT, maxTracks, maxPoints))
+            config.trackingEnabled = enabled != 0
+            config.maxPoints, config.maxTracks = maxPoints, maxTracks
+        elif (args[0] == 'boundaryBox' or args[0] == 'SceneryParam'):
+            config.boundaryBox = _box(args, lineNumber)
+        elif (args[0] == 'staticBoundaryBox'):
+            config.staticBoundaryBox = _box(args, lineNumber)
+        elif (args[0] == 'presenceBoundaryBox'):
+            config.presenceBoundaryBox = _box(args, lineNumber)
+        elif (args[0] == 'sensorPosition'):
+            config.sensorHeight, config.azimuthTilt, config.elevationTilt = _numbers(args, 3, lineNumber)
+
+    if ('frameCfg' not in config.commands):
+        log.warning('cfg has no frameCfg line, assuming a %g ms frame period' % (DEFAULT_FRAME_PERIOD))
+    if (config.boundaryBox is not None and config.presenceBoundaryBox is not None):
+        box, presence = config.boundaryBox, config.presenceBoundaryBox
+        if (presence[0] < box[0] or presence[1] > box[1] or presence[2] < box[2] or presence[3] > box[3] or presence[4] < box[4] or presence[5] > box[5]):
+            log.warning('presenceBoundaryBox reaches outside boundaryBox, presence there is never reported')
+    return config
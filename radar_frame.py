@@ -0,0 +1,169 @@
+import sys
+import numpy as np
+from collections.abc import Mapping
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Values of the fields whose TLV was not in the frame. They are shared by every frame, so they are read only
+def _emptyArray(shape, dtype=np.float64):
+    array = np.zeros(shape, dtype)
+    array.flags.writeable = False
+    return array
+
+EMPTY_POINT_CLOUD = _emptyArray((0, 7))
+EMPTY_TRACKS = _emptyArray((0, 16))
+EMPTY_TRACK_COVARIANCE = _emptyArray((0, 4, 4), np.float32)
+EMPTY_HEIGHTS = _emptyArray((0, 3))
+EMPTY_TRACK_INDEXES = _emptyArray((0,), np.uint8)
+
+# outputDict key -> value when the TLV is absent. These are the slots of RadarFrame, any other key the
+# parsers write (vitals, gesture, rangeProfile, ...) goes to RadarFrame.extra
+FRAME_FIELDS = {
+    'frameNum':             None,
+    'timeCPUCycles':        None,
+    'pointCloud':           EMPTY_POINT_CLOUD,
+    'numDetectedPoints':    0,
+    'trackData':            EMPTY_TRACKS,
+    'numDetectedTracks':    0,
+    'trackErrorCovariance': EMPTY_TRACK_COVARIANCE,
+    'heightData':           EMPTY_HEIGHTS,
+    'trackIndexes':         EMPTY_TRACK_INDEXES,
+    'stats':                None
+}
+_FIELD_BITS = dict((key, 1 << i) for i, key in enumerate(FRAME_FIELDS))
+
+# One parsed frame, in place of the dict parseStandardFrame returns. The common outputs are slots, read as attributes:
+#
+#     frame = parseRadarFrame(frameData)
+#     for height in frame.heightData:     # (0, 3) array if the frame had no target height TLV
+#         ...
+#
+# It is also a read only Mapping with the same keys and values as the dict, so code written for the dict keeps working.
+# As with the dict, a key is only 'in' the frame when its TLV was, but indexing an absent field returns its empty value
+# instead of raising KeyError. Use frame.has(key) or 'key' in frame to tell the two apart.
+class RadarFrame(Mapping):
+    __slots__ = ('error', 'present', 'extra', 'buffers') + tuple(FRAME_FIELDS)
+
+    def __init__(self):
+        self.error = 0
+        self.present = 0 # bit per FRAME_FIELDS key that has been set
+        self.extra = None # dict of the keys that are not slots, created on first use
+        self.buffers = None # buffer_pool.FrameBuffers the arrays are views of, if parsed into pooled buffers
+        for key, value in FRAME_FIELDS.items():
+            setattr(self, key, value)
+
+    # The first numDetectedPoints rows of the point cloud, without copying
+    @property
+    def points(self):
+        return self.pointCloud[:self.numDetectedPoints]
+
+    def has(self, key):
+        bit = _FIELD_BITS.get(key)
+        if (bit is not None):
+            return (self.present & bit) != 0
+        return key == 'error' or (self.extra is not None and key in self.extra)
+
+    # Drop every output, keeping the error code. parseStandardFrame does this when a TLV header can't be read
+    def clear(self):
+        error, buffers = self.error, self.buffers
+        self.__init__()
+        self.error, self.buffers = error, buffers
+
+    # Give the pooled buffers back. The frame's arrays must not be used afterwards
+    def release(self):
+        if (self.buffers is not None):
+            self.buffers.release()
+            self.buffers = None
+
+    # Copy the arrays held in pooled buffers and release them, for consumers that keep the frame around
+    def retain(self):
+        if (self.buffers is not None):
+            self.buffers.copyOutputs(self)
+            self.release()
+        return self
+
+    # Dict interface, used by the TLV parsers to fill the frame
+    def __setitem__(self, key, value):
+        bit = _FIELD_BITS.get(key)
+        if (bit is not None):
+            setattr(self, key, value)
+            self.present |= bit
+        elif (key == 'error'):
+            self.error = value
+        else:
+            if (self.extra is None):
+                self.extra = {}
+            self.extra[key] = value
+
+    def __getitem__(self, key):
+        if (key in _FIELD_BITS):
+            return getattr(self, key)
+        if (key == 'error'):
+            return self.error
+        if (self.extra is None):
+            raise KeyError(key)
+        return self.extra[key]
+
+    __contains__ = has
+
+    def get(self, key, default=None):
+        if (self.has(key)):
+            return self[key]
+        return default
+
+    def keys(self):
+        keys = ['error']
+        for key, bit in _FIELD_BITS.items():
+            if (self.present & bit):
+                keys.append(key)
+        if (self.extra is not None):
+            keys.extend(self.extra.keys())
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    # Plain dict with the same contents parseStandardFrame would have returned
+    def toDict(self):
+        return dict((key, self[key]) for key in self.keys())
+
+    def __repr__(self):
+        return 'RadarFrame(frameNum=%s, error=%d, points=%d, tracks=%d)' % (self.frameNum, self.error, self.numDetectedPoints, self.numDetectedTracks)
+
+# Allocations per frame of parseStandardFrame (dict) vs parseRadarFrame, measured with tracemalloc.
+# Returns {'dict': {...}, 'radarFrame': {...}} with the bytes allocated per frame and still held per parsed frame
+def measureFrameAllocations(frames):
+    import tracemalloc
+    from parseFrame import parseStandardFrame, parseRadarFrame
+    results = {}
+    for name, parse in (('dict', parseStandardFrame), ('radarFrame', parseRadarFrame)):
+        # Warm up so one-off allocations (caches, interned strings) aren't counted
+        for frameData in frames[:10]:
+            parse(frameData)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        parsed = [parse(frameData) for frameData in frames]
+        after = tracemalloc.get_traced_memory()[0]
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        containerSize = sum(sys.getsizeof(frame) + (sys.getsizeof(frame.extra) if isinstance(frame, RadarFrame) and frame.extra is not None else 0) for frame in parsed)
+        results[name] = {
+            'frames': len(parsed),
+            'bytesRetainedPerFrame': (after - before) / max(len(parsed), 1),
+            'containerBytesPerFrame': containerSize / max(len(parsed), 1),
+            'allocationsRetained': sum(stat.count for stat in snapshot.statistics('filename')),
+        }
+        del parsed
+    return results
+
+# python radar_frame.py <capture>
+if __name__ == '__main__':
+    import json
+    from replay import ReplaySource, REPLAY_UNTHROTTLED
+    frames = [frameData for timestamp, frameData in ReplaySource(sys.argv[1], REPLAY_UNTHROTTLED)]
+    print(json.dumps(measureFrameAllocations(frames), indent=4, sort_keys=True))
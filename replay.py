@@ -0,0 +1,102 @@
+import os
+import re
+import time
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from uart_framer import UARTFramer
+from capture import isCaptureDirectory, iterCapture
+
+# Replay speeds. Any other positive number replays at N x the original rate
+REPLAY_REALTIME = 1.0
+REPLAY_UNTHROTTLED = 0
+
+DEFAULT_FRAME_PERIOD = 55.0 # ms, from frameCfg in Final_config_6m.cfg
+READ_CHUNK_SIZE = 1 << 20
+
+# Sort pHistBytes_2.bin before pHistBytes_10.bin
+def _naturalSortKey(fileName):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', fileName)]
+
+# List the raw capture files making up a recording. path can be a single file or a directory of them
+def listCaptureFiles(path, extension='.bin'):
+    if (os.path.isdir(path)):
+        files = [f for f in os.listdir(path) if f.endswith(extension)]
+        return [os.path.join(path, f) for f in sorted(files, key=_naturalSortKey)]
+    return [path]
+
+# Replays a recording made by capture.CaptureWriter, using the host timestamps stored with each frame,
+# or a raw UART dump (frames back to back, as written by the old binData/pHistBytes_*.bin dumps).
+# Raw dumps are re-framed with a UARTFramer so partial or corrupted data is handled exactly like it would
+# be on the serial port. They carry no host timestamps, so their timing is reconstructed from the frame period.
+#   speed = REPLAY_REALTIME    original timing
+#   speed = N                  N x the original rate
+#   speed = REPLAY_UNTHROTTLED as fast as the consumer can take frames
+class ReplaySource():
+    def __init__(self, path, speed=REPLAY_REALTIME, framePeriod=DEFAULT_FRAME_PERIOD):
+        if (speed is None or speed < 0):
+            raise ValueError('Replay speed must be a positive number, or 0 for unthrottled')
+        self.path = path
+        self.speed = speed
+        self.framePeriod = framePeriod
+        self.framesReplayed = 0
+        self.startWallTime = None
+        self.startRecordedTime = None
+        if (isCaptureDirectory(path)):
+            self.files = []
+            self._frames = self._readCapture()
+        else:
+            self.files = listCaptureFiles(path)
+            self._frames = self._readFrames()
+
+    def _readCapture(self):
+        for timestamp, frameNum, frameData in iterCapture(self.path):
+            yield timestamp, frameData
+
+    def _readFrames(self):
+        framer = UARTFramer()
+        frameCount = 0
+        for fileName in self.files:
+            log.info('Replaying ' + fileName)
+            with open(fileName, 'rb') as fp:
+                chunk = fp.read(READ_CHUNK_SIZE)
+                while (len(chunk) > 0):
+                    framer.feed(chunk)
+                    frameData = framer.nextFrame()
+                    while (frameData is not None):
+                        yield frameCount * self.framePeriod / 1000, frameData
+                        frameCount += 1
+                        frameData = framer.nextFrame()
+                    chunk = fp.read(READ_CHUNK_SIZE)
+
+    # Sleep until the recorded time of this frame, scaled by the replay speed, has been reached
+    def _throttle(self, recordedTime):
+        if (self.speed == REPLAY_UNTHROTTLED):
+            return
+        now = time.monotonic()
+        if (self.startWallTime is None):
+            self.startWallTime = now
+            self.startRecordedTime = recordedTime
+            return
+        delay = self.startWallTime + (recordedTime - self.startRecordedTime) / self.speed - now
+        if (delay > 0):
+            time.sleep(delay)
+
+    # Return the next (recordedTime, frameData) tuple, or None at the end of the recording
+    def nextFrame(self):
+        try:
+            recordedTime, frameData = next(self._frames)
+        except StopIteration:
+            return None
+        self._throttle(recordedTime)
+        self.framesReplayed += 1
+        return recordedTime, frameData
+
+    def __iter__(self):
+        frame = self.nextFrame()
+        while (frame is not None):
+            yield frame
+            frame = self.nextFrame()
@@ -0,0 +1,73 @@
+import logging
+import numpy as np
+
+# Local Imports
+from parseFrame import parseRadarFrame
+from buffer_pool import BufferPool
+from benchmarks.frame_generator import FrameGenerator, PEOPLE_TRACKING_TLVS
+from tlv_defines import *
+
+# Uncompressed points so the point cloud is filled in place, without a spherical conversion
+TLV_TYPES = [MMWDEMO_OUTPUT_MSG_DETECTED_POINTS, MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO] + PEOPLE_TRACKING_TLVS[1:]
+
+def parsePooled(pool, frameData):
+    buffers = pool.acquire()
+    frame = parseRadarFrame(frameData, buffers.outputBuffers)
+    frame.buffers = buffers
+    return frame
+
+def snapshot(frame):
+    return frame['pointCloud'].copy(), frame['trackData'][:, :12].copy(), frame['heightData'].copy()
+
+def testRetainedFrameSurvivesBufferReuse():
+    pool = BufferPool(numBuffers=1)
+    frameA, frameB = FrameGenerator(numPoints=60, numTracks=3, tlvTypes=TLV_TYPES, seed=2).frames(2)
+
+    a = parsePooled(pool, frameA)
+    buffers = a.buffers
+    assert np.shares_memory(a['trackData'], buffers.trackData)
+    expected = snapshot(a)
+    a.retain()
+    assert a.buffers is None
+    for value in (a['pointCloud'], a['trackData'], a['heightData']):
+        assert not buffers.owns(value)
+
+    b = parsePooled(pool, frameB)
+    assert b.buffers is buffers
+    assert not np.array_equal(b['heightData'], expected[2])
+    for before, after in zip(expected, snapshot(a)):
+        assert np.array_equal(before, after)
+
+# What retain() protects against: a frame that is kept without it sees the next frame's values
+def testUnretainedFrameIsOverwritten():
+    pool = BufferPool(numBuffers=1)
+    frameA, frameB = FrameGenerator(numPoints=60, numTracks=3, tlvTypes=TLV_TYPES, seed=2).frames(2)
+    a = parsePooled(pool, frameA)
+    heights = a['heightData'].copy()
+    a.release()
+    b = parsePooled(pool, frameB)
+    assert np.array_equal(a['heightData'], b['heightData'])
+    assert not np.array_equal(a['heightData'], heights)
+
+def testDoubleReleaseLogsAndKeepsFreeList(caplog):
+    pool = BufferPool(numBuffers=2)
+    buffers = pool.acquire()
+    buffers.release()
+    with caplog.at_level(logging.WARNING, logger='buffer_pool'):
+        buffers.release()
+    assert 'released twice' in caplog.text
+    stats = pool.getStats()
+    assert stats['free'] == 2
+    # Each set of buffers is handed out once
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+    assert pool.acquire() is None
+    assert pool.getStats()['misses'] == 1
+
+def testFrameReleaseTwiceReturnsBuffersOnce():
+    pool = BufferPool(numBuffers=1)
+    frame = parsePooled(pool, FrameGenerator(tlvTypes=TLV_TYPES).frame(1))
+    frame.release()
+    frame.release()
+    assert pool.getStats()['free'] == 1
+    assert len(set(map(id, pool.free))) == len(pool.free)
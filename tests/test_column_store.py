@@ -0,0 +1,71 @@
+import json
+import numpy as np
+import pytest
+
+# Local Imports
+from column_store import ColumnStoreWriter, ColumnStoreReader, writeChunk, TRACK_STATE_COLUMNS
+
+def trackData(frameNum, numTracks):
+    rows = np.zeros((numTracks, 16), np.float32)
+    rows[:, 0] = np.arange(numTracks)
+    rows[:, 1:4] = [0.1234 * frameNum, -2.5, 1.7]
+    rows[:, 4:12] = 0.25 * (frameNum % 7) - 0.5
+    return rows
+
+def heightData(numTracks):
+    rows = np.zeros((numTracks, 3), np.float32)
+    rows[:, 0] = np.arange(numTracks)
+    rows[:, 1:3] = [1.6543, 0.0987]
+    return rows
+
+def writeStore(directory, trackState, numFrames=50, chunkFrames=20):
+    writer = ColumnStoreWriter(str(directory), chunkFrames=chunkFrames, trackState=trackState)
+    writer.start()
+    for frameNum in range(numFrames):
+        writer.append(frameNum + 100, 1700000000.0 + frameNum * 0.055, frameNum, trackData(frameNum, frameNum % 3), heightData(frameNum % 3))
+    writer.stop()
+    return ColumnStoreReader(str(directory))
+
+# Values come back to within the stored precision: millimetres for positions and heights, float16 for the track
+# state, microseconds for timestamps. Frame numbers and frame rows exactly
+def testRoundTrip(tmp_path):
+    reader = writeStore(tmp_path, trackState=True)
+    assert len(reader.chunks) == 3
+    data = reader.read(reader.columns())
+    assert list(data['frames.frameNum']) == list(range(100, 150))
+    assert np.allclose(data['frames.timestamp'], 1700000000.0 + np.arange(50) * 0.055, rtol=0, atol=1e-6)
+    assert list(data['frames.numTracks']) == [frameNum % 3 for frameNum in range(50)]
+    expected = np.concatenate([trackData(frameNum, frameNum % 3) for frameNum in range(50)])
+    frames = np.concatenate([[frameNum] * (frameNum % 3) for frameNum in range(50)])
+    assert list(data['tracks.frame']) == list(frames)
+    assert list(data['heights.frame']) == list(frames)
+    assert np.allclose(data['tracks.x'], expected[:, 1], rtol=0, atol=0.0005)
+    assert np.allclose(data['tracks.velX'], expected[:, 4], rtol=1e-3, atol=0)
+    assert np.allclose(data['heights.maxZ'], 1.6543, rtol=0, atol=0.0005)
+    assert data['tracks.x'].dtype == np.float32 and data['frames.timestamp'].dtype == np.float64
+
+# Without trackState only the track ids and positions are written
+def testTrackStateIsOptIn(tmp_path):
+    reader = writeStore(tmp_path, trackState=False)
+    for column in TRACK_STATE_COLUMNS:
+        assert 'tracks.' + column not in reader.columns()
+    assert 'tracks.x' in reader.columns()
+    with pytest.raises(KeyError):
+        reader.read(['tracks.velX'])
+    assert len(reader.read(['tracks.z'])['tracks.z']) == sum(frameNum % 3 for frameNum in range(50))
+
+# Columns that don't fit their stored type (NaN timestamps, positions beyond int16 millimetres) are kept as they are
+def testColumnsThatDontFitAreStoredRaw(tmp_path):
+    tables = {
+        'frames': {'frameNum': [1, 2], 'timestamp': [np.nan, np.nan], 'numDetectedPoints': [0, 0], 'numTracks': [1, 0]},
+        'tracks': {'frame': [0], 'tid': [0], 'x': [40.0], 'y': [1.0], 'z': [1.0]},
+        'heights': {'frame': [], 'tid': [], 'maxZ': [], 'minZ': []},
+    }
+    writeChunk(str(tmp_path), tables, 0)
+    reader = ColumnStoreReader(str(tmp_path))
+    with np.load(reader.chunks[0]) as chunk:
+        assert sorted(json.loads(str(chunk['__meta__']))['rawColumns']) == ['frames.timestamp', 'tracks.x']
+    data = reader.read(['frames.timestamp', 'tracks.x', 'tracks.y'])
+    assert np.all(np.isnan(data['frames.timestamp']))
+    assert list(data['tracks.x']) == [40.0]
+    assert list(data['tracks.y']) == [1.0]
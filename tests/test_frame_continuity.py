@@ -0,0 +1,121 @@
+import pytest
+
+# Local Imports
+from frame_continuity import *
+
+FRAME_PERIOD = 0.055
+CYCLES_PER_FRAME = int(FRAME_PERIOD * DEVICE_CPU_CLOCK_HZ)
+
+# Frame n as the device would send it: timeCPUCycles wraps at 2^32, arrival exactly one period apart
+def frame(n, startCycles=0, startTime=1000.0):
+    return n % COUNTER_MODULO, (startCycles + n * CYCLES_PER_FRAME) % COUNTER_MODULO, startTime + n * FRAME_PERIOD
+
+def feed(tracker, frameNums, **kwargs):
+    return [tracker.update(*frame(n, **kwargs)) for n in frameNums]
+
+def testCounterDelta():
+    assert counterDelta(5, 3) == 2
+    assert counterDelta(3, 5) == -2
+    assert counterDelta(0, COUNTER_MODULO - 1) == 1
+    assert counterDelta(COUNTER_MODULO - 1, 0) == -1
+    assert counterDelta(2, COUNTER_MODULO - 3) == 5
+
+def testInOrder():
+    tracker = FrameContinuityTracker()
+    assert feed(tracker, range(1, 6)) == [FRAME_FIRST] + [FRAME_IN_ORDER] * 4
+    stats = tracker.getStats()
+    assert stats['received'] == 5 and stats['lost'] == 0 and stats['lossRate'] == 0.0
+
+def testGap():
+    tracker = FrameContinuityTracker()
+    results = feed(tracker, [1, 2, 3, 7, 8])
+    assert results[3] == FRAME_AFTER_GAP
+    stats = tracker.getStats()
+    assert stats['lost'] == 3 and stats['gaps'] == 1
+    assert stats['lossRate'] == pytest.approx(3 / 8)
+    assert stats['rollingLossRate'] == pytest.approx(3 / 8)
+
+def testDuplicate():
+    tracker = FrameContinuityTracker()
+    results = feed(tracker, [1, 2, 3, 3, 2, 4])
+    assert results[3:5] == [FRAME_DUPLICATE, FRAME_DUPLICATE]
+    assert results[5] == FRAME_IN_ORDER
+    stats = tracker.getStats()
+    assert stats['duplicates'] == 2 and stats['lost'] == 0 and stats['lossRate'] == 0.0
+
+# A frame counted as lost that arrives late is taken off the lost count
+def testLateFrameIsReorderedNotLost():
+    tracker = FrameContinuityTracker()
+    results = feed(tracker, [1, 2, 4, 5, 3, 6])
+    assert results[2] == FRAME_AFTER_GAP
+    assert results[4] == FRAME_REORDERED
+    stats = tracker.getStats()
+    assert stats['lost'] == 0 and stats['reordered'] == 1 and stats['lossRate'] == 0.0
+    # Only once: the same frame again is a duplicate, not another reordering
+    assert tracker.update(*frame(3)) == FRAME_DUPLICATE
+
+def testFrameTooLateForTheReorderWindowIsARestart():
+    tracker = FrameContinuityTracker(reorderWindow=4)
+    feed(tracker, [1, 2, 20, 21])
+    assert tracker.getStats()['lost'] == 17
+    assert tracker.update(*frame(3)) == FRAME_RESTART
+
+def testFrameNumWraparound():
+    tracker = FrameContinuityTracker()
+    last = COUNTER_MODULO - 1
+    results = feed(tracker, [last - 2, last - 1, last, last + 1, last + 2])
+    assert results == [FRAME_FIRST] + [FRAME_IN_ORDER] * 4
+    # And a gap across the wrap
+    tracker = FrameContinuityTracker()
+    results = feed(tracker, [last - 1, last + 3])
+    assert results[1] == FRAME_AFTER_GAP
+    assert tracker.getStats()['lost'] == 3
+    # A frame lost just before the wrap arriving late
+    assert tracker.update(*frame(last)) == FRAME_REORDERED
+    assert tracker.getStats()['lost'] == 2
+
+def testRestart():
+    tracker = FrameContinuityTracker()
+    feed(tracker, range(1000, 1010))
+    # sensorStop / sensorStart: numbering and the cycle counter start again
+    assert tracker.update(1, 5000, 2000.0) == FRAME_RESTART
+    assert tracker.update(2, 5000 + CYCLES_PER_FRAME, 2000.0 + FRAME_PERIOD) == FRAME_IN_ORDER
+    stats = tracker.getStats()
+    assert stats['restarts'] == 1 and stats['lost'] == 0 and stats['duplicates'] == 0
+    # Timing across the restart isn't measured
+    assert stats['devicePeriod'] == pytest.approx(FRAME_PERIOD)
+
+def testDevicePeriodAcrossCycleCounterWrap():
+    # timeCPUCycles wraps about every 21 s at 200 MHz. Start just before the wrap
+    startCycles = COUNTER_MODULO - 3 * CYCLES_PER_FRAME - 12345
+    tracker = FrameContinuityTracker()
+    feed(tracker, range(0, 10), startCycles=startCycles)
+    cycles = [frame(n, startCycles)[1] for n in range(0, 10)]
+    assert cycles[4] < cycles[3]
+    stats = tracker.getStats()
+    assert stats['devicePeriod'] == pytest.approx(FRAME_PERIOD)
+    assert stats['devicePeriodStd'] == pytest.approx(0.0, abs=1e-9)
+    assert stats['arrivalJitter'] == pytest.approx(0.0, abs=1e-9)
+
+def testDevicePeriodAcrossGap():
+    tracker = FrameContinuityTracker()
+    feed(tracker, [1, 2, 5, 6])
+    assert tracker.getStats()['devicePeriod'] == pytest.approx(FRAME_PERIOD)
+
+def testArrivalJitter():
+    tracker = FrameContinuityTracker()
+    for n in range(1, 101):
+        frameNum, cycles, arrivalTime = frame(n)
+        # Every other frame is read 10 ms late
+        tracker.update(frameNum, cycles, arrivalTime + (0.01 if n % 2 == 0 else 0.0))
+    stats = tracker.getStats()
+    assert stats['devicePeriod'] == pytest.approx(FRAME_PERIOD)
+    assert stats['arrivalInterval'] == pytest.approx(FRAME_PERIOD, abs=1e-3)
+    assert stats['maxTransitDelta'] == pytest.approx(0.01)
+    assert stats['arrivalJitter'] == pytest.approx(0.01, rel=0.05)
+
+def testUpdateFrame():
+    tracker = FrameContinuityTracker()
+    assert tracker.updateFrame({}) is None
+    assert tracker.updateFrame({'frameNum': 1, 'timeCPUCycles': 0}, 1.0) == FRAME_FIRST
+    assert tracker.updateFrame({'frameNum': 2}, 1.055) == FRAME_IN_ORDER
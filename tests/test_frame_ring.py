@@ -0,0 +1,119 @@
+import logging
+import numpy as np
+import pytest
+
+# Local Imports
+from frame_ring import FrameRing, estimateSize
+from buffer_pool import BufferPool
+from parseFrame import parseRadarFrame
+from lazy_frame import LazyFrame
+from benchmarks.frame_generator import FrameGenerator
+
+def numbers(ring):
+    return [frame['n'] for frame in ring]
+
+def testEvictsByFrameCount():
+    ring = FrameRing(4, maxBytes=None)
+    for n in range(10):
+        ring.append({'n': n})
+    assert len(ring) == 4
+    assert numbers(ring) == [6, 7, 8, 9]
+    assert ring.getStats()['evicted'] == 6
+    assert ring.getStats()['appended'] == 10
+
+def testEvictsByByteBudget():
+    ring = FrameRing(100, maxBytes=1000)
+    for n in range(10):
+        ring.append({'n': n}, size=300)
+    assert numbers(ring) == [7, 8, 9]
+    assert ring.bytes == 900
+    # Bigger frames push out as many as needed
+    ring.append({'n': 10}, size=800)
+    assert numbers(ring) == [10]
+    # A frame over the whole budget is kept on its own
+    ring.append({'n': 11}, size=5000)
+    assert numbers(ring) == [11]
+    assert ring.bytes == 5000
+
+def testEstimatedSizes():
+    array = np.zeros((10, 16))
+    assert estimateSize(array) == array.nbytes
+    assert estimateSize({'trackData': array}) > array.nbytes
+    ring = FrameRing(100, maxBytes=3 * array.nbytes + 1000)
+    for n in range(5):
+        ring.append({'n': n, 'trackData': np.zeros((10, 16))})
+    assert numbers(ring) == [2, 3, 4]
+
+def testWraparoundIndexingAndSlicing():
+    ring = FrameRing(5, maxBytes=None)
+    for n in range(13):
+        ring.append({'n': n})
+    # The oldest frame sits in the middle of the slots now
+    assert ring.start != 0
+    assert ring[0]['n'] == 8 and ring[4]['n'] == 12
+    assert ring[-1]['n'] == 12 and ring[-5]['n'] == 8
+    assert [frame['n'] for frame in ring[1:4]] == [9, 10, 11]
+    assert [frame['n'] for frame in ring[-2:]] == [11, 12]
+    assert [frame['n'] for frame in ring[::2]] == [8, 10, 12]
+    assert [frame['n'] for frame in ring[::-1]] == [12, 11, 10, 9, 8]
+    with pytest.raises(IndexError):
+        ring[5]
+    with pytest.raises(IndexError):
+        ring[-6]
+
+def testWindow():
+    ring = FrameRing(5, maxBytes=None)
+    assert ring.window(3) == []
+    for n in range(7):
+        ring.append({'n': n})
+    assert [frame['n'] for frame in ring.window(2)] == [5, 6]
+    assert [frame['n'] for frame in ring.window(10)] == [2, 3, 4, 5, 6]
+    assert [frame['n'] for frame in ring.window()] == [2, 3, 4, 5, 6]
+    assert ring.window(0) == []
+
+def testSpillInOrderAndCountsErrors(caplog):
+    spilled = []
+    def spill(frame):
+        if (frame['n'] == 2):
+            raise OSError('disk full')
+        spilled.append(frame['n'])
+    ring = FrameRing(3, maxBytes=None, spill=spill)
+    with caplog.at_level(logging.ERROR, logger='frame_ring'):
+        for n in range(8):
+            ring.append({'n': n})
+    assert spilled == [0, 1, 3, 4]
+    assert numbers(ring) == [5, 6, 7]
+    assert ring.getStats()['spillErrors'] == 1
+    assert 'disk full' in caplog.text
+    # clear() drops frames without spilling them
+    ring.clear()
+    assert len(ring) == 0 and ring.bytes == 0
+    assert spilled == [0, 1, 3, 4]
+
+def testInvalidLimits():
+    with pytest.raises(ValueError):
+        FrameRing(0)
+    with pytest.raises(ValueError):
+        FrameRing(10, maxBytes=0)
+
+# Pooled frames are kept past the next frame, so the ring retains them and their buffers go back to the pool
+def testPooledFramesAreRetained():
+    pool = BufferPool(numBuffers=1)
+    frameA, frameB = FrameGenerator(numTracks=3, seed=3).frames(2)
+    ring = FrameRing(10)
+
+    buffers = pool.acquire()
+    a = parseRadarFrame(frameA, buffers.outputBuffers)
+    a.buffers = buffers
+    heights = a['heightData'].copy()
+    ring.append(a)
+    assert a.buffers is None
+    assert pool.getStats()['free'] == 1
+
+    buffers = pool.acquire()
+    b = LazyFrame(frameB, ['heightData'], buffers)
+    b['heightData']
+    ring.append(b)
+    assert pool.getStats()['free'] == 1
+    assert np.array_equal(ring[0]['heightData'], heights)
+    assert not np.shares_memory(ring[1]['heightData'], buffers.heightData)
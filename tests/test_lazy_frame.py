@@ -0,0 +1,101 @@
+import numpy as np
+
+# Local Imports
+from tlv_defines import *
+from parseFrame import parseStandardFrame
+from lazy_frame import LazyFrame
+from buffer_pool import BufferPool
+from benchmarks.frame_generator import FrameGenerator, PEOPLE_TRACKING_TLVS
+
+TLV_TYPES = PEOPLE_TRACKING_TLVS + [MMWDEMO_OUTPUT_MSG_RANGE_PROFILE]
+
+def generatedFrames(numFrames=2):
+    return FrameGenerator(numPoints=50, numTracks=3, tlvTypes=TLV_TYPES, seed=1).frames(numFrames)
+
+def decodedTypes(frame):
+    return sorted(frame.tlvs[index][0] for index in frame.decoded)
+
+def testContainsAndKeysDecodeNothing():
+    frame = LazyFrame(generatedFrames(1)[0])
+    assert 'trackData' in frame and 'heightData' in frame and 'rangeProfile' in frame
+    keys = list(frame.keys())
+    assert 'pointCloud' in keys and 'presenceIndication' in keys
+    assert len(frame) == len(keys)
+    assert frame.getDecodeCounts() == (0, len(TLV_TYPES))
+    # numDetectedPoints comes from the TLV length
+    assert frame['numDetectedPoints'] == 50
+    assert frame.getDecodeCounts()[0] == 0
+
+def testOnlySubscribedTLVsAreDecoded():
+    frameData = generatedFrames(1)[0]
+    expected = parseStandardFrame(frameData)
+    frame = LazyFrame(frameData, ['heightData', 'trackData', 'numDetectedPoints'])
+    assert 'rangeProfile' not in frame and 'presenceIndication' not in frame
+    assert 'rangeProfile' not in frame.keys()
+
+    # Read the way main.py reads it. numDetectedPoints needs no point decoding
+    assert np.array_equal(frame['heightData'], expected['heightData'])
+    assert np.array_equal(frame['trackData'][:, :12], expected['trackData'][:, :12])
+    assert frame['numDetectedPoints'] == expected['numDetectedPoints']
+    assert decodedTypes(frame) == sorted([MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST, MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT])
+    # toDict() decodes everything subscribed and nothing else
+    outputDict = frame.toDict()
+    assert 'rangeProfile' not in outputDict and 'presenceIndication' not in outputDict
+    assert MMWDEMO_OUTPUT_MSG_RANGE_PROFILE not in decodedTypes(frame)
+
+def testSubscribingByTLVType():
+    frame = LazyFrame(generatedFrames(1)[0], [MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT])
+    assert list(frame.keys()).count('heightData') == 1
+    assert 'trackData' not in frame
+    frame.toDict()
+    assert decodedTypes(frame) == [MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT]
+
+def testUnsubscribedKeyDecodesWhenRead():
+    frameData = generatedFrames(1)[0]
+    expected = parseStandardFrame(frameData)
+    frame = LazyFrame(frameData, ['heightData'])
+    assert np.array_equal(frame['rangeProfile'], expected['rangeProfile'])
+    assert decodedTypes(frame) == [MMWDEMO_OUTPUT_MSG_RANGE_PROFILE]
+    # Once decoded it is part of the frame
+    assert 'rangeProfile' in frame
+    assert np.array_equal(frame['pointCloud'], expected['pointCloud'])
+
+def testMissingKeyRaises():
+    frame = LazyFrame(FrameGenerator(tlvTypes=[MMWDEMO_OUTPUT_MSG_TRACKERPROC_TARGET_HEIGHT]).frame(1))
+    assert frame.get('trackData') is None
+    assert frame.getDecodeCounts() == (0, 1)
+
+def testRetainCopiesPooledArrays():
+    pool = BufferPool(numBuffers=1)
+    frameA, frameB = generatedFrames(2)
+    subscriptions = ['heightData', 'trackData', 'pointCloud']
+
+    buffers = pool.acquire()
+    a = LazyFrame(frameA, subscriptions, buffers)
+    heights = a['heightData']
+    assert np.shares_memory(heights, buffers.heightData)
+    a.retain()
+    assert pool.getStats()['free'] == 1
+    assert a.buffers is None
+    assert not np.shares_memory(a['heightData'], buffers.heightData)
+    # Not decoded before retain(), so decoded into new arrays now
+    tracks = a['trackData']
+    assert not np.shares_memory(tracks, buffers.trackData)
+
+    expectedHeights = a['heightData'].copy()
+    expectedTracks = tracks[:, :12].copy()
+    assert pool.acquire() is buffers
+    b = LazyFrame(frameB, subscriptions, buffers)
+    b.toDict()
+    assert not np.array_equal(b['heightData'], expectedHeights)
+    assert np.array_equal(a['heightData'], expectedHeights)
+    assert np.array_equal(a['trackData'][:, :12], expectedTracks)
+
+def testReleaseReturnsBuffersOnce():
+    pool = BufferPool(numBuffers=1)
+    frame = LazyFrame(generatedFrames(1)[0], ['heightData'], pool.acquire())
+    assert pool.getStats()['free'] == 0
+    frame.release()
+    frame.release()
+    assert frame.buffers is None
+    assert pool.getStats()['free'] == 1
@@ -0,0 +1,47 @@
+import glob
+import json
+import os
+import numpy as np
+
+# Local Imports
+from main import core, LOG_FORMAT_NDJSON, LOG_FORMAT_COLUMNAR
+from column_store import ColumnStoreWriter, ColumnStoreReader
+from tracking_writer import TrackingLogWriter
+
+# Every frame at the same time, so chunks are only told apart by their number
+def frameJSON(frameNum):
+    return {'frameNumber': frameNum, 'timestamp': 1000.0, 'HeightData': [], 'PointsDetected': 0}
+
+# A writer started again after stopWriter() keeps the log format that was asked for
+def testColumnarLogFormatSurvivesStopWriter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    c = core()
+    c.logFormat = LOG_FORMAT_COLUMNAR
+    c.saveFrame(frameJSON(1))
+    assert isinstance(c.writer, ColumnStoreWriter)
+    directory = c.writer.directory
+    c.stopWriter()
+    c.saveFrame(frameJSON(2))
+    assert isinstance(c.writer, ColumnStoreWriter)
+    c.stopWriter()
+    reader = ColumnStoreReader(directory)
+    assert len(reader.chunks) == 2
+    frames = reader.read(['frames.frameNum'])
+    assert list(frames['frames.frameNum']) == [1, 2]
+
+# The NDJSON writer started again after stopWriter() adds a file instead of truncating the first one
+def testNDJSONLogSurvivesStopWriter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    c = core()
+    c.logFormat = LOG_FORMAT_NDJSON
+    c.saveFrame(frameJSON(1))
+    assert isinstance(c.writer, TrackingLogWriter)
+    directory = c.writer.directory
+    c.stopWriter()
+    c.saveFrame(frameJSON(2))
+    c.stopWriter()
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, 'replay_*.ndjson'))):
+        with open(path) as fp:
+            frames.extend(json.loads(line)['frameNumber'] for line in fp.readlines()[1:])
+    assert frames == [1, 2]
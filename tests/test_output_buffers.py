@@ -0,0 +1,45 @@
+import numpy as np
+
+# Local Imports
+from tlv_defines import *
+from parseFrame import parseStandardFrame, POINT_CLOUD_BUFFER
+from lazy_frame import LazyFrame
+from buffer_pool import BufferPool
+from benchmarks.frame_generator import FrameGenerator, PEOPLE_TRACKING_TLVS
+
+TLV_TYPES = PEOPLE_TRACKING_TLVS + [MMWDEMO_OUTPUT_MSG_RANGE_PROFILE]
+
+# Buffers for TLVs whose parser takes no out= (the point cloud TLVs, presence) must be ignored, not passed on
+def outputBuffers():
+    return {
+        POINT_CLOUD_BUFFER: np.zeros((200, 7)),
+        MMWDEMO_OUTPUT_MSG_RANGE_PROFILE: np.zeros(256, np.uint32),
+        MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST: np.zeros((20, 16)),
+        MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS: np.zeros((200, 7)),
+        MMWDEMO_OUTPUT_MSG_PRESCENCE_INDICATION: np.zeros(1),
+    }
+
+def testParseStandardFrameIgnoresUnbufferedTLVs():
+    frameData = FrameGenerator(tlvTypes=TLV_TYPES).frame(1)
+    buffers = outputBuffers()
+    expected = parseStandardFrame(frameData)
+    outputDict = parseStandardFrame(frameData, buffers)
+    assert outputDict['error'] == 0
+    assert np.array_equal(outputDict['pointCloud'], expected['pointCloud'])
+    # Columns 12 to 15 of trackData are never written
+    assert np.array_equal(outputDict['trackData'][:, :12], expected['trackData'][:, :12])
+    assert np.array_equal(outputDict['rangeProfile'], expected['rangeProfile'])
+    # Buffered TLVs did go to their buffers
+    assert np.shares_memory(outputDict['trackData'], buffers[MMWDEMO_OUTPUT_MSG_TRACKERPROC_3D_TARGET_LIST])
+    assert np.shares_memory(outputDict['rangeProfile'], buffers[MMWDEMO_OUTPUT_MSG_RANGE_PROFILE])
+
+def testLazyFrameIgnoresUnbufferedTLVs():
+    frameData = FrameGenerator(tlvTypes=TLV_TYPES).frame(1)
+    expected = parseStandardFrame(frameData)
+    buffers = BufferPool().acquire()
+    for tlvType, buffer in outputBuffers().items():
+        buffers.outputBuffers.setdefault(tlvType, buffer)
+    outputDict = LazyFrame(frameData, buffers=buffers).toDict()
+    for key in ('pointCloud', 'rangeProfile', 'numDetectedPoints'):
+        assert np.array_equal(outputDict[key], expected[key])
+    assert np.array_equal(outputDict['trackData'][:, :12], expected['trackData'][:, :12])
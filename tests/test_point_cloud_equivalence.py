@@ -0,0 +1,230 @@
+import logging
+import struct
+import numpy as np
+import pytest
+
+# Local Imports
+import parseFrame
+from tlv_defines import *
+from parseFrame import parseStandardFrame
+from parseTLVs import COMPRESSED_POINT_UNIT_STRUCT, COMPRESSED_SPHERICAL_POINT_DTYPE
+from gui_common import sphericalToCartesianPointCloud
+from benchmarks.frame_generator import FrameGenerator, PEOPLE_TRACKING_TLVS
+
+log = logging.getLogger(__name__)
+
+# The point cloud parsers numpy replaced, copied from the baseline parseTLVs.py. The numpy ones must give
+# bit-identical results
+
+def baselinePointCloudTLV(tlvData, tlvLength, outputDict):
+    pointCloud = outputDict['pointCloud']
+    pointStruct = '4f'  # X, Y, Z, and Doppler
+    pointStructSize = struct.calcsize(pointStruct)
+    numPoints = int(tlvLength/pointStructSize)
+
+    for i in range(numPoints):
+        try:
+            x, y, z, doppler = struct.unpack(pointStruct, tlvData[:pointStructSize])
+        except:
+            numPoints = i
+            log.error('Point Cloud TLV Parser Failed')
+            break
+        tlvData = tlvData[pointStructSize:]
+        pointCloud[i,0] = x 
+        pointCloud[i,1] = y
+        pointCloud[i,2] = z
+        pointCloud[i,3] = doppler
+    outputDict['numDetectedPoints'], outputDict['pointCloud'] = numPoints, pointCloud
+
+def baselinePointCloudExtTLV(tlvData, tlvLength, outputDict):
+    pointCloud = outputDict['pointCloud']
+    pUnitStruct = '4f2h' # Units for the 5 results to decompress them
+    pointStruct = '4h2B' # x y z doppler snr noise
+    pUnitSize = struct.calcsize(pUnitStruct)
+    pointSize = struct.calcsize(pointStruct)
+
+    # Parse the decompression factors
+    try:
+        pUnit = struct.unpack(pUnitStruct, tlvData[:pUnitSize])
+    except:
+            log.error('Point Cloud TLV Parser Failed')
+            outputDict['numDetectedPoints'], outputDict['pointCloud'] = 0, pointCloud
+    # Update data pointer
+    tlvData = tlvData[pUnitSize:]
+
+    # Parse each point
+    numPoints = int((tlvLength-pUnitSize)/pointSize)
+    for i in range(numPoints):
+        try:
+            x, y, z, doppler, snr, noise = struct.unpack(pointStruct, tlvData[:pointSize])
+        except:
+            numPoints = i
+            log.error('Point Cloud TLV Parser Failed')
+            break
+        
+        tlvData = tlvData[pointSize:]
+        # Decompress values
+        pointCloud[i,0] = x * pUnit[0]          # x
+        pointCloud[i,1] = y * pUnit[0]          # y
+        pointCloud[i,2] = z * pUnit[0]          # z
+        pointCloud[i,3] = doppler * pUnit[1]    # Doppler
+        pointCloud[i,4] = snr * pUnit[2]        # SNR
+        pointCloud[i,5] = noise * pUnit[3]      # Noise
+    outputDict['numDetectedPoints'], outputDict['pointCloud'] = numPoints, pointCloud
+
+def baselineSideInfoTLV(tlvData, tlvLength, outputDict):
+    pointCloud = outputDict['pointCloud']
+    pointStruct = '2H'  # Two unsigned shorts: SNR and Noise
+    pointStructSize = struct.calcsize(pointStruct)
+    numPoints = int(tlvLength/pointStructSize)
+
+    for i in range(numPoints):
+        try:
+            snr, noise = struct.unpack(pointStruct, tlvData[:pointStructSize])
+        except:
+            numPoints = i
+            log.error('Side Info TLV Parser Failed')
+            break
+        tlvData = tlvData[pointStructSize:]
+        # SNR and Noise are sent as uint16_t which are measured in 0.1 dB Steps
+        pointCloud[i,4] = snr * 0.1
+        pointCloud[i,5] = noise * 0.1
+    outputDict['pointCloud'] = pointCloud
+
+def baselineSphericalPointCloudTLV(tlvData, tlvLength, outputDict):
+    pointCloud = outputDict['pointCloud']
+    pointStruct = '4f'  # Range, Azimuth, Elevation, and Doppler
+    pointStructSize = struct.calcsize(pointStruct)
+    numPoints = int(tlvLength/pointStructSize)
+
+    for i in range(numPoints):
+        try:
+            rng, azimuth, elevation, doppler = struct.unpack(pointStruct, tlvData[:pointStructSize])
+        except:
+            numPoints = i
+            log.error('Point Cloud TLV Parser Failed')
+            break
+        tlvData = tlvData[pointStructSize:]
+        pointCloud[i,0] = rng
+        pointCloud[i,1] = azimuth
+        pointCloud[i,2] = elevation
+        pointCloud[i,3] = doppler
+    
+    # Convert from spherical to cartesian
+    pointCloud[:,0:3] = sphericalToCartesianPointCloud(pointCloud[:, 0:3])
+    outputDict['numDetectedPoints'], outputDict['pointCloud'] =  numPoints, pointCloud
+
+def baselineCompressedSphericalPointCloudTLV(tlvData, tlvLength, outputDict):
+    pointCloud = outputDict['pointCloud']
+    pUnitStruct = '5f' # Units for the 5 results to decompress them
+    pointStruct = '2bh2H' # Elevation, Azimuth, Doppler, Range, SNR
+    pUnitSize = struct.calcsize(pUnitStruct)
+    pointSize = struct.calcsize(pointStruct)
+
+    # Parse the decompression factors
+    try:
+        pUnit = struct.unpack(pUnitStruct, tlvData[:pUnitSize])
+    except:
+            log.error('Point Cloud TLV Parser Failed')
+            outputDict['numDetectedPoints'], outputDict['pointCloud'] = 0, pointCloud
+    # Update data pointer
+    tlvData = tlvData[pUnitSize:]
+
+    # Parse each point
+    numPoints = int((tlvLength-pUnitSize)/pointSize)
+    for i in range(numPoints):
+        try:
+            elevation, azimuth, doppler, rng, snr = struct.unpack(pointStruct, tlvData[:pointSize])
+        except:
+            numPoints = i
+            log.error('Point Cloud TLV Parser Failed')
+            break
+        
+        tlvData = tlvData[pointSize:]
+        if (azimuth >= 128):
+            log.error('Az greater than 127')
+            azimuth -= 256
+        if (elevation >= 128):
+            log.error('Elev greater than 127')
+            elevation -= 256
+        if (doppler >= 32768):
+            log.error('Doppler greater than 32768')
+            doppler -= 65536
+        # Decompress values
+        pointCloud[i,0] = rng * pUnit[3]          # Range
+        pointCloud[i,1] = azimuth * pUnit[1]      # Azimuth
+        pointCloud[i,2] = elevation * pUnit[0]    # Elevation
+        pointCloud[i,3] = doppler * pUnit[2]      # Doppler
+        pointCloud[i,4] = snr * pUnit[4]          # SNR
+
+    # Convert from spherical to cartesian
+    pointCloud[:,0:3] = sphericalToCartesianPointCloud(pointCloud[:, 0:3])
+    outputDict['numDetectedPoints'] = numPoints
+    outputDict['pointCloud'] = pointCloud
+
+BASELINE_PARSERS = {
+    MMWDEMO_OUTPUT_MSG_DETECTED_POINTS:             baselinePointCloudTLV,
+    MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS:         baselinePointCloudExtTLV,
+    MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO:   baselineSideInfoTLV,
+    MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS:            baselineSphericalPointCloudTLV,
+    MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS:           baselineCompressedSphericalPointCloudTLV,
+}
+
+# Sets of TLVs a frame can carry its point cloud in
+POINT_CLOUD_TLV_SETS = [
+    [MMWDEMO_OUTPUT_MSG_DETECTED_POINTS, MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO],
+    [MMWDEMO_OUTPUT_EXT_MSG_DETECTED_POINTS],
+    [MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS],
+    [MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS],
+    PEOPLE_TRACKING_TLVS,
+]
+
+def parseBoth(frameData, monkeypatch):
+    new = parseStandardFrame(frameData)
+    with monkeypatch.context() as patch:
+        for tlvType, parser in BASELINE_PARSERS.items():
+            patch.setitem(parseFrame.parserFunctions, tlvType, parser)
+        old = parseStandardFrame(frameData)
+    return old, new
+
+def assertSamePointCloud(old, new):
+    assert old['numDetectedPoints'] == new['numDetectedPoints']
+    assert old['pointCloud'].dtype == new['pointCloud'].dtype
+    assert np.array_equal(old['pointCloud'], new['pointCloud'])
+
+@pytest.mark.parametrize('tlvTypes', POINT_CLOUD_TLV_SETS)
+def testGeneratedFramesMatchBaseline(tlvTypes, monkeypatch):
+    generator = FrameGenerator(numPoints=150, numTracks=4, tlvTypes=tlvTypes, seed=len(tlvTypes))
+    for frameData in generator.frames(20):
+        old, new = parseBoth(frameData, monkeypatch)
+        assertSamePointCloud(old, new)
+
+def testEmptyPointCloudMatchesBaseline(monkeypatch):
+    generator = FrameGenerator(numPoints=0, tlvTypes=[MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS, MMWDEMO_OUTPUT_MSG_SPHERICAL_POINTS])
+    old, new = parseBoth(generator.frame(1), monkeypatch)
+    assertSamePointCloud(old, new)
+
+# Negative elevation, azimuth and doppler are sent in two's complement. The baseline unpacked them signed
+# (and had a fix up for values at or above 128 / 32768), the dtype reads them signed directly
+def testCompressedSignWraparound(monkeypatch):
+    units = COMPRESSED_POINT_UNIT_STRUCT.pack(0.01, 0.01, 0.00028, 0.00025, 0.04)
+    points = np.zeros(6, COMPRESSED_SPHERICAL_POINT_DTYPE)
+    raw = points.view(np.uint8).reshape(6, COMPRESSED_SPHERICAL_POINT_DTYPE.itemsize)
+    # Elevation and azimuth bytes at and around the sign bit: 0x7F, 0x80, 0xFF ...
+    raw[:, 0] = [0x7F, 0x80, 0x81, 0xFF, 0x00, 0x01]
+    raw[:, 1] = [0x80, 0xFF, 0x7F, 0x00, 0xC0, 0x01]
+    points['doppler'] = np.array([0x7FFF, 0x8000, 0xFFFF, 0, 0xC000, 1], np.uint16).view(np.int16)
+    points['range'] = [1200, 24000, 65535, 0, 4000, 8000]
+    points['snr'] = [100, 0, 65535, 2000, 1, 7]
+    payload = units + points.tobytes()
+
+    generator = FrameGenerator(numPoints=len(points), tlvTypes=[MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS])
+    generator.payloadFunctions[MMWDEMO_OUTPUT_MSG_COMPRESSED_POINTS] = lambda numPoints, numTracks: payload
+    old, new = parseBoth(generator.frame(1), monkeypatch)
+    assertSamePointCloud(old, new)
+    pointCloud = new['pointCloud']
+    # 0x80 is -128 units, not 128: azimuth of point 0 and elevation of point 1 point the other way
+    assert pointCloud[0, 0] < 0 and pointCloud[1, 2] < 0
+    # Doppler 0x8000 and 0xFFFF are -32768 and -1 units
+    assert pointCloud[1, 3] == -32768 * np.float64(np.float32(0.00028))
+    assert pointCloud[2, 3] == -1 * np.float64(np.float32(0.00028))
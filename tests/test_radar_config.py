@@ -0,0 +1,66 @@
+import logging
+import os
+import pytest
+
+# Local Imports
+from radar_config import *
+from fall_detection import FallDetection
+import new_fall_detection
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def readCfg(name):
+    with open(os.path.join(REPO, name)) as fp:
+        return fp.readlines()
+
+def testFinalConfig():
+    config = parseRadarConfig(readCfg('Final_config_6m.cfg'))
+    assert config.framePeriod == 55.0
+    assert config.chirpStartIndex == 0 and config.chirpEndIndex == 2 and config.numLoops == 96
+    assert config.trackingEnabled
+    assert config.maxPoints == 800 and config.maxTracks == 20
+    assert 'frameCfg' in config.commands and 'trackingCfg' in config.commands
+
+def testFramesIn():
+    config = parseRadarConfig(['frameCfg 0 2 96 0 55.00 1 0'])
+    assert config.framesIn(1.5) == 27
+    assert config.framesIn(4.5) == 82
+    assert config.framesIn(5.5) == 100
+    assert config.framesIn(0) == 1
+    assert parseRadarConfig(['frameCfg 0 2 96 0 100 1 0']).framesIn(4.5) == 45
+    assert parseRadarConfig(['frameCfg 0 2 96 0 100 1 0']).frameRate == 10.0
+
+def testDefaultsWithoutFrameCfg(caplog):
+    with caplog.at_level(logging.WARNING):
+        config = parseRadarConfig(['% comment', '', 'sensorStart'])
+    assert config.framePeriod == DEFAULT_FRAME_PERIOD and config.maxTracks == DEFAULT_MAX_TRACKS
+    assert config.commands == ['sensorStart']
+    assert 'no frameCfg' in caplog.text
+
+def testBoxes():
+    config = parseRadarConfig(['boundaryBox -4 4 0 6 -0.5 3', 'presenceBoundaryBox -3 3 0.5 5 0 3', 'sensorPosition 2 0 15'])
+    assert config.boundaryBox == (-4, 4, 0, 6, -0.5, 3)
+    assert config.presenceBoundaryBox == (-3, 3, 0.5, 5, 0, 3)
+    assert (config.sensorHeight, config.azimuthTilt, config.elevationTilt) == (2, 0, 15)
+
+# Errors name the line of the cfg they are on, counting comments and blank lines
+@pytest.mark.parametrize('line, message', [
+    ('frameCfg 0 2 96 0', 'needs 5 arguments'),
+    ('frameCfg 0 2 96 0 fast 1 0', 'non numeric'),
+    ('frameCfg 0 2 96 0 0 1 0', 'frame period must be positive'),
+    ('trackingCfg 1 4 800 251 37 33 120 1', 'trackingCfg needs 1 to 250 tracks'),
+    ('trackingCfg 1 4 0 20 37 33 120 1', 'trackingCfg needs 1 to 250 tracks'),
+    ('boundaryBox 4 -4 0 6 -0.5 3', 'xMin 4 above xMax -4'),
+])
+def testInvalidLines(line, message):
+    with pytest.raises(ValueError, match='cfg line 3: .*' + message):
+        parseRadarConfig(['% header', '', line])
+
+# The default fall detectors keep the 82 frame (4.5 s) height history and 30 tracks their thresholds were tuned with
+@pytest.mark.parametrize('fallDetectionClass', [FallDetection, new_fall_detection.FallDetection])
+def testFallDetectionDefaults(fallDetectionClass):
+    fallDetection = fallDetectionClass()
+    assert fallDetection.heightHistoryLen == 82
+    assert len(fallDetection.heightBuffer) == 30
+    # The same 4.5 s at another frame period
+    assert fallDetectionClass(frameTime=100).heightHistoryLen == 45
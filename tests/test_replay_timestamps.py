@@ -0,0 +1,29 @@
+import glob
+import json
+import os
+import shutil
+
+# Local Imports
+from main import core, runReplay
+from capture import CaptureWriter
+from benchmarks.frame_generator import FrameGenerator, PEOPLE_TRACKING_TLVS
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDED_START = 1600000000.0
+
+# A replayed capture is logged with the times its frames were recorded at, even replayed as fast as possible
+def testReplayLogsRecordedTimes(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(REPO, 'Final_config_6m.cfg'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    recordedTimes = [RECORDED_START + n * 0.055 for n in range(5)]
+    with CaptureWriter(str(tmp_path / 'capture')) as writer:
+        for recordedTime, frameData in zip(recordedTimes, FrameGenerator(20, 2, PEOPLE_TRACKING_TLVS, seed=0).frames(5)):
+            writer.write(frameData, recordedTime)
+    c = core()
+    runReplay(c, str(tmp_path / 'capture'), 0)
+    assert c.parser.lastFrameTime == recordedTimes[-1]
+    timestamps = []
+    for path in glob.glob(os.path.join('TrackingData', c.filepath, 'replay_*.ndjson')):
+        with open(path) as fp:
+            timestamps.extend(json.loads(line)['timestamp'] for line in fp.readlines()[1:])
+    assert timestamps == recordedTimes
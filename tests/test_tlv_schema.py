@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+# Local Imports
+import parseFrame
+import tlv_schema
+from tlv_defines import *
+from tlv_schema import TLVSchema, registerSchema
+from parseFrame import parseStandardFrame
+from lazy_frame import LazyFrame
+from benchmarks.frame_generator import FrameGenerator
+
+# A TLV from unusedTLVs, which has no parser until a schema is registered for it
+QUICK_EVAL_SCHEMA = TLVSchema('Quick Eval Info', 'quickEvalInfo', [('rangeBin', '<u2'), ('power', '<u2', 1, 0.5)], repeat=True)
+
+@pytest.fixture
+def quickEvalSchema():
+    schema = registerSchema(MMWDEMO_OUTPUT_EXT_MSG_QUICK_EVAL_INFO, QUICK_EVAL_SCHEMA)
+    yield schema
+    tlv_schema.tlvSchemas.pop(MMWDEMO_OUTPUT_EXT_MSG_QUICK_EVAL_INFO, None)
+    parseFrame.parserFunctions.pop(MMWDEMO_OUTPUT_EXT_MSG_QUICK_EVAL_INFO, None)
+    parseFrame.tlvOutputKeys.pop(MMWDEMO_OUTPUT_EXT_MSG_QUICK_EVAL_INFO, None)
+
+def quickEvalFrame(records):
+    generator = FrameGenerator(numPoints=0, tlvTypes=[MMWDEMO_OUTPUT_EXT_MSG_QUICK_EVAL_INFO])
+    generator.payloadFunctions[MMWDEMO_OUTPUT_EXT_MSG_QUICK_EVAL_INFO] = lambda numPoints, numTracks: records.tobytes()
+    return generator.frame(1)
+
+def testSchemaRegisteredAfterImportIsParsed(quickEvalSchema):
+    records = np.zeros(3, quickEvalSchema.dtype)
+    records['rangeBin'] = [10, 20, 30]
+    records['power'] = [1, 3, 5]
+    frameData = quickEvalFrame(records)
+
+    outputDict = parseStandardFrame(frameData)
+    assert outputDict['error'] == 0
+    assert list(outputDict['quickEvalInfo']['rangeBin']) == [10, 20, 30]
+    assert list(outputDict['quickEvalInfo']['power']) == [0.5, 1.5, 2.5]
+
+    frame = LazyFrame(frameData, ['quickEvalInfo'])
+    assert 'quickEvalInfo' in frame
+    assert np.array_equal(frame['quickEvalInfo'], outputDict['quickEvalInfo'])
+
+def testUnregisteredTLVIsSkipped():
+    records = np.zeros(3, QUICK_EVAL_SCHEMA.dtype)
+    outputDict = parseStandardFrame(quickEvalFrame(records))
+    assert outputDict['error'] == 0
+    assert 'quickEvalInfo' not in outputDict
+
+def testSingleRecordSchema():
+    schema = TLVSchema('Stats', 'stats', [('a', '<u4'), ('b', '<i2', 2), ('c', '<u2', 1, 0.1)])
+    assert schema.size == 10
+    record = schema.decodeRecord(np.array([7], '<u4').tobytes() + np.array([-1, 2], '<i2').tobytes() + np.array([30], '<u2').tobytes())
+    assert record['a'] == 7
+    assert list(record['b']) == [-1, 2]
+    assert record['c'] == pytest.approx(3.0)
@@ -0,0 +1,47 @@
+import json
+import time
+
+# Local Imports
+from tracking_writer import TrackingLogWriter
+
+def readFrames(directory):
+    frames = []
+    for path in sorted(directory.glob('replay_*.ndjson')):
+        with open(path) as fp:
+            records = [json.loads(line) for line in fp]
+        assert records[0]['type'] == 'header'
+        frames.extend(record['frameNumber'] for record in records[1:])
+    return frames
+
+# Records arriving one at a time at the frame rate are synced in batches, not one by one
+def testSyncIsBatchedAtTheFrameRate(tmp_path):
+    writer = TrackingLogWriter(str(tmp_path), [], 'demo', 'device', syncInterval=0.5)
+    writer.start()
+    for frameNum in range(40):
+        writer.write({'frameNumber': frameNum})
+        time.sleep(0.02)
+    writer.stop()
+    stats = writer.getStats()
+    assert stats['framesWritten'] == 40
+    # 0.8 s of frames: a couple of interval syncs plus the one on close
+    assert stats['syncTime']['count'] <= 4
+    assert readFrames(tmp_path) == list(range(40))
+
+# syncRecords records waiting are synced without waiting for the interval
+def testSyncAfterSyncRecords(tmp_path):
+    writer = TrackingLogWriter(str(tmp_path), [], 'demo', 'device', syncInterval=60.0, syncRecords=10)
+    writer.start()
+    for frameNum in range(25):
+        writer.write({'frameNumber': frameNum})
+    writer.stop()
+    assert writer.getStats()['syncTime']['count'] == 3
+
+# A writer started again on the same directory adds files after the earlier ones instead of overwriting them
+def testRestartedWriterKeepsEarlierFiles(tmp_path):
+    for frameNum in (1, 2):
+        writer = TrackingLogWriter(str(tmp_path), [], 'demo', 'device')
+        writer.start()
+        writer.write({'frameNumber': frameNum})
+        writer.stop()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['replay_1.ndjson', 'replay_2.ndjson']
+    assert readFrames(tmp_path) == [1, 2]
@@ -0,0 +1,246 @@
+import struct
+import time
+import sys
+import numpy as np
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from tlv_defines import *
+
+# Declarative TLV layouts. A schema lists the fields of one record as tuples of
+#   (name, dtype)                   eg. ('presence', '<u4')
+#   (name, dtype, count)            a fixed size array inside the record, eg. ('waveform', '<f4', 15)
+#   (name, dtype, count, scale)     values are multiplied by scale and returned as float64
+# The struct.Struct and numpy dtype for the record are compiled once, when the schema is created.
+#   repeat=False    the TLV holds one record, stored in outputDict as a dict of field values
+#                   (or just the value when the record has a single field)
+#   repeat=True     the TLV holds as many records as fit in its length, stored as a numpy array
+#                   (a structured array, or a plain array when the record has a single field)
+#   repeat=N        the TLV holds exactly N records
+
+# numpy (kind, itemsize) to struct format character, always used with standard sizes ('<')
+_STRUCT_CHARS = {
+    ('b', 1): '?',
+    ('i', 1): 'b', ('u', 1): 'B',
+    ('i', 2): 'h', ('u', 2): 'H',
+    ('i', 4): 'i', ('u', 4): 'I',
+    ('i', 8): 'q', ('u', 8): 'Q',
+    ('f', 4): 'f', ('f', 8): 'd'
+}
+
+class TLVSchema():
+    def __init__(self, name, outputKey, fields, repeat=False):
+        self.name = name
+        self.outputKey = outputKey
+        self.repeat = repeat
+        self.fields = []
+        self.scales = {}
+        numpyFields = []
+        structFormat = '<'
+        for fieldDef in fields:
+            fieldName, fieldType = fieldDef[0], np.dtype(fieldDef[1])
+            count = fieldDef[2] if len(fieldDef) > 2 else 1
+            scale = fieldDef[3] if len(fieldDef) > 3 else None
+            if ((fieldType.kind, fieldType.itemsize) not in _STRUCT_CHARS):
+                raise ValueError('%s: unsupported dtype %s for field %s' % (name, fieldType, fieldName))
+            self.fields.append((fieldName, count))
+            if (scale is not None):
+                self.scales[fieldName] = scale
+            numpyFields.append((fieldName, fieldType.newbyteorder('<'), (count,)) if count > 1 else (fieldName, fieldType.newbyteorder('<')))
+            structFormat += ('%d' % count if count > 1 else '') + _STRUCT_CHARS[(fieldType.kind, fieldType.itemsize)]
+
+        # Compiled layouts. Both are packed, so their sizes always agree
+        self.struct = struct.Struct(structFormat)
+        self.dtype = np.dtype(numpyFields)
+        self.size = self.struct.size
+
+        # Scaled fields come out as float64
+        self.outputDtype = np.dtype([(n, np.float64 if n in self.scales else self.dtype[n].base, self.dtype[n].shape) for n in self.dtype.names])
+
+    # Decode a single record with the precompiled struct
+    def decodeRecord(self, tlvData, offset=0):
+        values = self.struct.unpack_from(tlvData, offset)
+        record = {}
+        i = 0
+        for fieldName, count in self.fields:
+            if (count > 1):
+                value = np.asarray(values[i:i + count])
+            else:
+                value = values[i]
+            if (fieldName in self.scales):
+                value = value * self.scales[fieldName]
+            record[fieldName] = value
+            i += count
+        if (len(self.fields) == 1):
+            return record[self.fields[0][0]]
+        return record
+
+    # Decode every record in one np.frombuffer call, scaling whole columns at a time
+    def decodeRecords(self, tlvData, tlvLength):
+        if (self.repeat is True):
+            numRecords = int(tlvLength/self.size)
+        else:
+            numRecords = self.repeat
+        available = len(tlvData) // self.size
+        if (numRecords > available):
+            log.error('%s TLV Parser Failed: %d records expected, %d received' % (self.name, numRecords, available))
+            numRecords = available
+        records = np.frombuffer(tlvData, self.dtype, numRecords)
+        if (len(self.scales) > 0):
+            scaled = np.empty(numRecords, self.outputDtype)
+            for fieldName in self.dtype.names:
+                if (fieldName in self.scales):
+                    np.multiply(records[fieldName], self.scales[fieldName], out=scaled[fieldName])
+                else:
+                    scaled[fieldName] = records[fieldName]
+            records = scaled
+        if (len(self.fields) == 1):
+            return records[self.fields[0][0]]
+        return records
+
+    # parserFunctions compatible entry point
+    def parse(self, tlvData, tlvLength, outputDict):
+        if (self.repeat is False):
+            try:
+                outputDict[self.outputKey] = self.decodeRecord(tlvData)
+            except struct.error:
+                log.error('%s TLV Parser Failed' % (self.name))
+                return None
+        else:
+            outputDict[self.outputKey] = self.decodeRecords(tlvData, tlvLength)
+
+    # A zero filled payload the size of a typical TLV of this type, for benchmarking
+    def samplePayload(self, numRecords=64):
+        if (self.repeat is False):
+            return bytes(self.size)
+        if (self.repeat is True):
+            return bytes(self.size * numRecords)
+        return bytes(self.size * self.repeat)
+
+# TLV type -> TLVSchema. parseFrame adds every entry to parserFunctions
+tlvSchemas = {}
+# Functions called with (tlvType, schema) for every schema registered, including the ones registered before
+# them. parseFrame adds one that keeps parserFunctions and tlvOutputKeys up to date, so schemas can be
+# registered at any time, before or after parseFrame is imported
+schemaListeners = []
+
+def registerSchema(tlvType, schema):
+    tlvSchemas[tlvType] = schema
+    for listener in schemaListeners:
+        listener(tlvType, schema)
+    return schema
+
+def addSchemaListener(listener):
+    schemaListeners.append(listener)
+    for tlvType, schema in tlvSchemas.items():
+        listener(tlvType, schema)
+
+# 16 bit complex samples, imaginary part first as sent by the SDK (cmplx16ImRe_t)
+COMPLEX_16_FIELDS = [('imag', '<i2'), ('real', '<i2')]
+
+# ================================================== Schemas ==================================================
+
+# Out-of-box demo TLVs
+registerSchema(MMWDEMO_OUTPUT_MSG_NOISE_PROFILE,
+    TLVSchema('Noise Profile', 'noiseProfile', [('noise', '<u2')], repeat=True))
+registerSchema(MMWDEMO_OUTPUT_MSG_AZIMUT_STATIC_HEAT_MAP,
+    TLVSchema('Azimuth Static Heat Map', 'azimuthStaticHeatMap', COMPLEX_16_FIELDS, repeat=True))
+# Flattened numRangeBins x numDopplerBins, the shape comes from the cfg
+registerSchema(MMWDEMO_OUTPUT_MSG_RANGE_DOPPLER_HEAT_MAP,
+    TLVSchema('Range Doppler Heat Map', 'rangeDopplerHeatMap', [('magnitude', '<u2')], repeat=True))
+registerSchema(MMWDEMO_OUTPUT_MSG_STATS,
+    TLVSchema('Stats', 'stats', [
+        ('interFrameProcessingTime', '<u4'),    # us
+        ('transmitOutputTime', '<u4'),          # us
+        ('interFrameProcessingMargin', '<u4'),  # us
+        ('interChirpProcessingMargin', '<u4'),  # us
+        ('activeFrameCPULoad', '<u4'),          # %
+        ('interFrameCPULoad', '<u4')            # %
+    ]))
+registerSchema(MMWDEMO_OUTPUT_MSG_AZIMUT_ELEVATION_STATIC_HEAT_MAP,
+    TLVSchema('Azimuth Elevation Static Heat Map', 'azimuthElevationStaticHeatMap', COMPLEX_16_FIELDS, repeat=True))
+registerSchema(MMWDEMO_OUTPUT_MSG_TEMPERATURE_STATS,
+    TLVSchema('Temperature Stats', 'temperatureStats', [
+        ('tempReportValid', '<i4'),             # 0 if the report below is valid
+        ('time', '<u4'),                        # ms since the RF front end was powered up
+        ('tmpRx0Sens', '<i2'),                  # degrees C
+        ('tmpRx1Sens', '<i2'),
+        ('tmpRx2Sens', '<i2'),
+        ('tmpRx3Sens', '<i2'),
+        ('tmpTx0Sens', '<i2'),
+        ('tmpTx1Sens', '<i2'),
+        ('tmpTx2Sens', '<i2'),
+        ('tmpPmSens', '<i2'),
+        ('tmpDig0Sens', '<i2'),
+        ('tmpDig1Sens', '<i2')
+    ]))
+
+# People tracking and gesture TLVs
+registerSchema(MMWDEMO_OUTPUT_MSG_PRESCENCE_INDICATION,
+    TLVSchema('Presence Indication', 'presenceIndication', [('presence', '<u4')]))
+registerSchema(MMWDEMO_OUTPUT_MSG_SURFACE_CLASSIFICATION,
+    TLVSchema('Surface Classification', 'surfaceClassificationOutput', [('classification', '<f4')]))
+registerSchema(MMWDEMO_OUTPUT_MSG_GESTURE_PRESENCE_x432,
+    TLVSchema('Gesture Presence Result', 'gesturePresence', [('presence', 'i1')]))
+registerSchema(MMWDEMO_OUTPUT_MSG_GESTURE_PRESENCE_THRESH_x432,
+    TLVSchema('Presence Threshold', 'presenceThreshold', [('threshold', '<u4')]))
+registerSchema(MMWDEMO_OUTPUT_EXT_MSG_MODE_SWITCH_INFO,
+    TLVSchema('Mode Switch', 'modeState', [('modeState', 'i1')]))
+
+# ================================================== Benchmark ==================================================
+
+# Time parsers over TLV payloads.
+#   parsers     TLV type -> parser function taking (tlvData, tlvLength, outputDict)
+#   payloads    TLV type -> list of payloads. Defaults to a zero filled sample for each schema
+# Returns TLV type -> {'name', 'calls', 'bytes', 'usPerCall', 'nsPerByte'}
+def benchmarkDecoders(parsers=None, payloads=None, iterations=1000):
+    if (parsers is None):
+        parsers = dict((tlvType, schema.parse) for tlvType, schema in tlvSchemas.items())
+    if (payloads is None):
+        payloads = dict((tlvType, [schema.samplePayload()]) for tlvType, schema in tlvSchemas.items())
+    results = {}
+    for tlvType, tlvPayloads in payloads.items():
+        if (tlvType not in parsers or len(tlvPayloads) == 0):
+            continue
+        parser = parsers[tlvType]
+        views = [(memoryview(payload), len(payload)) for payload in tlvPayloads]
+        numBytes = sum(tlvLength for view, tlvLength in views) * iterations
+        # Point cloud TLVs write into the point cloud parseStandardFrame allocates, make it big enough for any of them
+        outputDict = {'pointCloud': np.zeros((max(tlvLength for view, tlvLength in views) // 4, 7))}
+        start = time.perf_counter()
+        for i in range(iterations):
+            for view, tlvLength in views:
+                parser(view, tlvLength, outputDict)
+        elapsed = time.perf_counter() - start
+        calls = iterations * len(views)
+        results[tlvType] = {
+            'name': tlvSchemas[tlvType].name if tlvType in tlvSchemas else getattr(parser, '__name__', str(tlvType)),
+            'calls': calls,
+            'bytes': numBytes,
+            'usPerCall': elapsed / calls * 1e6,
+            'nsPerByte': elapsed / numBytes * 1e9 if numBytes > 0 else 0.0,
+        }
+    return results
+
+# python tlv_schema.py [capture] [iterations]
+# Without a capture the registered schemas are timed on zero filled samples (1000 iterations by default). With a
+# capture directory or raw .bin dump every TLV type found in it is timed with its parseFrame parser, using the
+# recorded payloads (10 passes over the recording by default).
+if __name__ == '__main__':
+    import json
+    if (len(sys.argv) > 1):
+        iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        from parseFrame import parserFunctions, iterTLVs
+        from replay import ReplaySource, REPLAY_UNTHROTTLED
+        payloads = {}
+        for timestamp, frameData in ReplaySource(sys.argv[1], REPLAY_UNTHROTTLED):
+            for tlvType, offset, tlvLength in iterTLVs(frameData):
+                payloads.setdefault(tlvType, []).append(bytes(frameData[offset:offset + tlvLength]))
+        results = benchmarkDecoders(parserFunctions, payloads, iterations)
+    else:
+        iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+        results = benchmarkDecoders(iterations=iterations)
+    print(json.dumps(results, indent=4, sort_keys=True))
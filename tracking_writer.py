@@ -0,0 +1,173 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from metrics import StreamingHistogram
+
+TRACKING_LOG_VERSION = 1
+TRACKING_LOG_EXTENSION = '.ndjson'
+DEFAULT_FRAMES_PER_FILE = 10000
+# Written data is fsynced once this much time has passed or this many records are waiting, whichever comes first
+DEFAULT_SYNC_INTERVAL = 1.0
+DEFAULT_SYNC_RECORDS = 200
+DEFAULT_MAX_BACKLOG = 10000
+
+# Background thread that appends frame records to newline delimited JSON files, so the loop reading the radar
+# only ever does a queue put. Each file starts with a header record holding the cfg, every other line is one frame:
+#
+#     {"type": "header", "version": 1, "cfg": [...], "demo": "3D People Tracking", "device": "xWR6843", "created": 1700000000.0}
+#     {"frameNumber": 1, "timestamp": 1700000000.05, "CurrTime": "...", "HeightData": [[0, 1.7, 0.1]], "PointsDetected": 40}
+#     ...
+#
+# Files are named <directory>/replay_<N>.ndjson and hold up to framesPerFile frames, a writer restarted on the same
+# directory numbers its files after the ones already there. Writes are flushed and fsynced in batches, every
+# syncInterval seconds or syncRecords records, and when a file is closed, so a crash loses at most the last batch. If the disk can't keep up and the queue holds maxBacklog records, new records are dropped (and
+# counted) rather than ever blocking the caller.
+#
+#     writer = TrackingLogWriter('TrackingData/' + timestamp, cfg, demo, device)
+#     writer.start()
+#     writer.write(frameJSON)
+#     ...
+#     writer.stop()       # writes out what is queued
+class TrackingLogWriter(threading.Thread):
+    def __init__(self, directory, cfg, demo, device, framesPerFile=DEFAULT_FRAMES_PER_FILE, syncInterval=DEFAULT_SYNC_INTERVAL, syncRecords=DEFAULT_SYNC_RECORDS, maxBacklog=DEFAULT_MAX_BACKLOG):
+        threading.Thread.__init__(self, name='TrackingLogWriter', daemon=True)
+        self.directory = directory
+        self.header = {'type': 'header', 'version': TRACKING_LOG_VERSION, 'cfg': cfg, 'demo': demo, 'device': device}
+        self.framesPerFile = framesPerFile
+        self.syncInterval = syncInterval
+        self.syncRecords = syncRecords
+        self.recordQueue = queue.Queue(maxsize=maxBacklog)
+        self.stopEvent = threading.Event()
+        self.fp = None
+        self.fileNumber = 0
+        self.firstFile = 0 # number of the last file already in the directory
+        self.framesInFile = 0
+        self.unsynced = [] # enqueue times of the records written since the last fsync
+
+        # Statistics
+        self.framesQueued = 0
+        self.framesWritten = 0
+        self.framesDropped = 0
+        self.bytesWritten = 0
+        self.maxBacklog = 0
+        self.writeErrors = 0
+        self.latency = StreamingHistogram() # from write() until the record is fsynced
+        self.syncTime = StreamingHistogram() # flush + fsync of one batch
+
+    # Queue one frame record (a dict of JSON types). Never blocks, returns False if the record had to be dropped
+    def write(self, record):
+        try:
+            self.recordQueue.put_nowait((time.perf_counter(), record))
+        except queue.Full:
+            self.framesDropped += 1
+            if (self.framesDropped == 1 or self.framesDropped % 100 == 0):
+                log.warning('Tracking log backlog full, %d frames dropped so far' % (self.framesDropped))
+            return False
+        self.framesQueued += 1
+        return True
+
+    def run(self):
+        # A writer restarted on the same directory carries on numbering after the files already there
+        for path in glob.glob(os.path.join(self.directory, 'replay_*' + TRACKING_LOG_EXTENSION)):
+            number = os.path.basename(path)[len('replay_'):-len(TRACKING_LOG_EXTENSION)]
+            if (number.isdigit()):
+                self.firstFile = max(self.firstFile, int(number))
+        lastSync = time.monotonic()
+        while (not self.stopEvent.is_set() or not self.recordQueue.empty()):
+            # Wake up in time for the next sync if records are waiting for one
+            timeout = self.syncInterval
+            if (len(self.unsynced) > 0):
+                timeout = max(0.0, lastSync + self.syncInterval - time.monotonic())
+            try:
+                queuedAt, record = self.recordQueue.get(timeout=timeout)
+            except queue.Empty:
+                queuedAt = None
+            if (queuedAt is not None):
+                self.maxBacklog = max(self.maxBacklog, self.recordQueue.qsize() + 1)
+                self._writeRecord(queuedAt, record)
+            if (len(self.unsynced) > 0 and (len(self.unsynced) >= self.syncRecords or time.monotonic() - lastSync >= self.syncInterval)):
+                self._sync()
+                lastSync = time.monotonic()
+        self._closeFile()
+
+    def _openFile(self):
+        if (not os.path.exists(self.directory)):
+            os.makedirs(self.directory)
+        self.fileNumber += 1
+        self.fp = open(os.path.join(self.directory, 'replay_%d%s' % (self.firstFile + self.fileNumber, TRACKING_LOG_EXTENSION)), 'w')
+        self.framesInFile = 0
+        header = dict(self.header)
+        header['created'] = time.time()
+        self._writeLine(header)
+
+    def _closeFile(self):
+        if (self.fp is not None):
+            self._sync()
+            self.fp.close()
+            self.fp = None
+
+    def _writeLine(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        self.fp.write(line)
+        self.bytesWritten += len(line)
+
+    def _writeRecord(self, queuedAt, record):
+        try:
+            if (self.fp is not None and self.framesInFile >= self.framesPerFile):
+                self._closeFile()
+            if (self.fp is None):
+                self._openFile()
+            self._writeLine(record)
+        except (OSError, TypeError, ValueError) as e:
+            self.writeErrors += 1
+            log.error('Could not write frame to the tracking log: %s' % (e))
+            return
+        self.framesInFile += 1
+        self.framesWritten += 1
+        self.unsynced.append(queuedAt)
+
+    def _sync(self):
+        start = time.perf_counter()
+        try:
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+        except OSError as e:
+            self.writeErrors += 1
+            log.error('Could not sync the tracking log: %s' % (e))
+        now = time.perf_counter()
+        self.syncTime.observe(now - start)
+        for queuedAt in self.unsynced:
+            self.latency.observe(now - queuedAt)
+        self.unsynced = []
+
+    # Records waiting to be written
+    def getBacklog(self):
+        return self.recordQueue.qsize()
+
+    def getStats(self):
+        return {
+            'framesQueued': self.framesQueued,
+            'framesWritten': self.framesWritten,
+            'framesDropped': self.framesDropped,
+            'bytesWritten': self.bytesWritten,
+            'backlog': self.recordQueue.qsize(),
+            'maxBacklog': self.maxBacklog,
+            'writeErrors': self.writeErrors,
+            'files': self.fileNumber,
+            'latency': self.latency.getStats(),
+            'syncTime': self.syncTime.getStats(),
+        }
+
+    # Write out everything queued so far, then stop
+    def stop(self, timeout=None):
+        self.stopEvent.set()
+        self.join(timeout)
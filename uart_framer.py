@@ -0,0 +1,146 @@
+import time
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+UART_MAGIC_WORD = bytearray(b'\x02\x01\x04\x03\x06\x05\x08\x07')
+
+# Frame header layout: magic word (8 bytes), version (4 bytes), totalPacketLen (4 bytes), ...
+FRAME_LENGTH_OFFSET = 12
+FRAME_PREAMBLE_LEN = 16
+# Anything longer than this is treated as a corrupted length field rather than a real frame
+MAX_FRAME_LENGTH = 1 << 20
+
+# Buffered framer for the radar UART output.
+# Instead of hunting for the magic word one byte (and one syscall) at a time, this reads whatever the
+# OS has buffered into a reusable bytearray, searches it with bytearray.find and hands out complete frames.
+# feed()/nextFrame() can be used without a port (replay, asyncio reader callbacks), readFrame() drives the port.
+class UARTFramer():
+    def __init__(self, port=None, maxFrameLength=MAX_FRAME_LENGTH):
+        self.port = port
+        self.maxFrameLength = maxFrameLength
+        self.buffer = bytearray()
+
+        # Statistics
+        self.bytesRead = 0
+        self.framesRead = 0
+        self.bytesDiscarded = 0
+        self.resyncs = 0
+        self.badLengths = 0
+        self.truncatedFrames = 0
+        self.startTime = time.monotonic()
+
+    # Drop any buffered data, eg. after the connection has been reset
+    def reset(self):
+        self.buffer = bytearray()
+
+    def resetStats(self):
+        self.bytesRead = 0
+        self.framesRead = 0
+        self.bytesDiscarded = 0
+        self.resyncs = 0
+        self.badLengths = 0
+        self.truncatedFrames = 0
+        self.startTime = time.monotonic()
+
+    # Append raw bytes received from the device
+    def feed(self, data):
+        self.buffer += data
+        self.bytesRead += len(data)
+
+    # Discard the first numBytes of the buffer. Deleting from the front of a bytearray is cheap in CPython
+    def _discard(self, numBytes):
+        del self.buffer[:numBytes]
+        self.bytesDiscarded += numBytes
+
+    # Return the next complete frame from the buffer, or None if more data is needed
+    def nextFrame(self):
+        while True:
+            index = self.buffer.find(UART_MAGIC_WORD)
+            if (index < 0):
+                # Keep the tail in case it holds the start of a magic word split across reads
+                keep = len(UART_MAGIC_WORD) - 1
+                if (len(self.buffer) > keep):
+                    self._discard(len(self.buffer) - keep)
+                    self.resyncs += 1
+                return None
+            if (index > 0):
+                self._discard(index)
+                self.resyncs += 1
+
+            if (len(self.buffer) < FRAME_PREAMBLE_LEN):
+                return None
+
+            frameLength = int.from_bytes(self.buffer[FRAME_LENGTH_OFFSET:FRAME_PREAMBLE_LEN], byteorder='little')
+            if (frameLength < FRAME_PREAMBLE_LEN or frameLength > self.maxFrameLength):
+                log.warning('Bad frame length %d in frame header, resynchronising' % (frameLength))
+                self.badLengths += 1
+                # Skip this magic word and search for the next one
+                self._discard(len(UART_MAGIC_WORD))
+                continue
+
+            if (len(self.buffer) < frameLength):
+                return None
+
+            # A magic word inside the frame means this one was cut short and the next frame started early
+            nextIndex = self.buffer.find(UART_MAGIC_WORD, len(UART_MAGIC_WORD), frameLength)
+            if (nextIndex > 0):
+                log.warning('Truncated frame detected, resynchronising')
+                self.truncatedFrames += 1
+                self._discard(nextIndex)
+                continue
+
+            frameData = bytearray(self.buffer[:frameLength])
+            del self.buffer[:frameLength]
+            self.framesRead += 1
+            return frameData
+
+    # Read the bytes the port has waiting (or at least minBytes). Returns the number of bytes read, 0 on timeout
+    def fill(self, minBytes=1):
+        data = self.port.read(max(self.port.in_waiting, minBytes))
+        if (len(data) > 0):
+            self.feed(data)
+        return len(data)
+
+    # Number of bytes still missing from the frame at the start of the buffer
+    def _bytesNeeded(self):
+        if (len(self.buffer) < FRAME_PREAMBLE_LEN):
+            return FRAME_PREAMBLE_LEN - len(self.buffer)
+        frameLength = int.from_bytes(self.buffer[FRAME_LENGTH_OFFSET:FRAME_PREAMBLE_LEN], byteorder='little')
+        return max(frameLength - len(self.buffer), 1)
+
+    # Read from the port until a complete frame is available.
+    # Returns None if the port read timed out before a full frame arrived.
+    def readFrame(self):
+        while True:
+            frameData = self.nextFrame()
+            if (frameData is not None):
+                return frameData
+
+            # If the device doesn't transmit any data, the COMPort read function will eventually timeout
+            if (self.fill(self._bytesNeeded()) == 0):
+                if (len(self.buffer) >= FRAME_PREAMBLE_LEN):
+                    # The stream stalled part way through a frame, don't glue its head onto the next one
+                    log.warning('Read timed out part way through a frame, dropping partial frame')
+                    self.truncatedFrames += 1
+                    self._discard(len(UART_MAGIC_WORD))
+                else:
+                    log.error("ERROR: No data detected on COM Port, read timed out")
+                    log.error("\tBe sure that the device is in the proper mode, and that the cfg you are sending is valid")
+                return None
+
+    # Throughput since creation (or the last resetStats call)
+    def getStats(self):
+        elapsed = max(time.monotonic() - self.startTime, 1e-9)
+        return {
+            'bytesRead': self.bytesRead,
+            'framesRead': self.framesRead,
+            'bytesDiscarded': self.bytesDiscarded,
+            'resyncs': self.resyncs,
+            'badLengths': self.badLengths,
+            'truncatedFrames': self.truncatedFrames,
+            'elapsed': elapsed,
+            'bytesPerSec': self.bytesRead / elapsed,
+            'framesPerSec': self.framesRead / elapsed,
+        }
@@ -0,0 +1,321 @@
+import os
+import tty
+import time
+import random
+import select
+import struct
+import threading
+import argparse
+import json
+
+# Logger
+import logging
+log = logging.getLogger(__name__)
+
+# Local Imports
+from benchmarks.frame_generator import FrameGenerator
+from replay import ReplaySource, REPLAY_UNTHROTTLED
+from uart_framer import FRAME_LENGTH_OFFSET
+from capture import FRAME_NUM_OFFSET
+
+CLI_PROMPT = 'mmwDemo:/>'
+DEFAULT_FRAME_PERIOD = 55.0 # ms, used until a frameCfg line is received
+
+# CLI commands of the people tracking demo, with the number of arguments each one needs at least.
+# Anything else is answered with "not recognized", and too few arguments with "Error -1" like the device does
+CLI_COMMANDS = {
+    'sensorStop': 0, 'sensorStart': 0, 'flushCfg': 0, 'baudRate': 1,
+    'dfeDataOutputMode': 1, 'channelCfg': 3, 'adcCfg': 2, 'adcbufCfg': 5, 'lowPower': 2,
+    'profileCfg': 14, 'chirpCfg': 8, 'frameCfg': 7, 'lvdsStreamCfg': 4, 'bpmCfg': 4, 'guiMonitor': 7,
+    'dynamicRACfarCfg': 14, 'staticRACfarCfg': 14, 'dynamicRangeAngleCfg': 5, 'dynamic2DAngleCfg': 9,
+    'staticRangeAngleCfg': 4, 'antGeometry0': 12, 'antGeometry1': 12, 'antPhaseRot': 12, 'fovCfg': 3,
+    'compRangeBiasAndRxChanPhase': 25, 'measureRangeBiasAndRxChanPhase': 3, 'clutterRemoval': 2,
+    'staticBoundaryBox': 6, 'boundaryBox': 6, 'sensorPosition': 3, 'gatingParam': 5, 'stateParam': 6,
+    'allocationParam': 6, 'maxAcceleration': 3, 'trackingCfg': 8, 'presenceBoundaryBox': 6,
+    'zoneDef': 7, 'occStateMach': 1, 'mpdBoundaryBox': 7, 'mpdBoundaryArc': 7, 'chirpComnCfg': 7,
+    'chirpTimingCfg': 5, 'sigProcChainCfg': 1, 'sigProcChainCfg2': 1, 'presenceDetectCfg': 1, 'version': 0
+}
+# What the version command prints, as an IWR6843 running the people tracking demo does
+VERSION_INFO = [
+    'Platform                : xWR68xx',
+    'mmWave SDK Version      : 03.05.00.04',
+    'Device Info             : IWR68XX QM non-secure ES 02.00',
+    'RF F/W Version          : 06.02.02.00.20.07.22',
+]
+
+# Faults injected into the data port stream. Each rate is the probability per frame
+FAULT_DROP = 'drop'                 # a run of bytes missing from the middle of the frame
+FAULT_TRUNCATE = 'truncate'         # the frame stops early and the next one starts straight after
+FAULT_BAD_LENGTH = 'badLength'      # totalPacketLen in the header doesn't match the frame
+FAULT_STALL = 'stall'               # nothing is sent for stallTime seconds before the frame
+FAULT_KINDS = [FAULT_DROP, FAULT_TRUNCATE, FAULT_BAD_LENGTH, FAULT_STALL]
+
+# One end of a pseudo-terminal, the other end (portName) is opened like a serial port, eg. by pyserial
+class PtyPort():
+    def __init__(self):
+        self.masterFd, self.slaveFd = os.openpty()
+        # No echo or newline translation, the data port carries binary frames
+        tty.setraw(self.slaveFd)
+        self.portName = os.ttyname(self.slaveFd)
+
+    def read(self, timeout):
+        readable, writable, errored = select.select([self.masterFd], [], [], timeout)
+        if (len(readable) == 0):
+            return b''
+        return os.read(self.masterFd, 4096)
+
+    # Write everything, waiting for the reader to make room. Returns False if stopEvent was set meanwhile
+    def write(self, data, stopEvent):
+        view = memoryview(data)
+        while (len(view) > 0):
+            if (stopEvent.is_set()):
+                return False
+            readable, writable, errored = select.select([], [self.masterFd], [], 0.1)
+            if (len(writable) > 0):
+                view = view[os.write(self.masterFd, view):]
+        return True
+
+    def close(self):
+        os.close(self.masterFd)
+        os.close(self.slaveFd)
+
+# A simulated IWR6843 running the people tracking demo, on two pseudo-terminals standing in for the CLI and data ports.
+#
+#     radar = VirtualRadar(faultRates={FAULT_TRUNCATE: 0.01})
+#     radar.start()
+#     parser.connectComPorts(radar.cliPort, radar.dataPort)   # unmodified UARTParser
+#     parser.sendCfg(cfg)                                      # frames start after sensorStart
+#
+# CLI lines are echoed and acknowledged with Done / Error like the device does. After sensorStart frames are
+# streamed on the data port at the frameCfg period divided by speed (0 = as fast as the reader takes them).
+# Frames come from a FrameGenerator, or are replayed in a loop from a recording when recording is set.
+class VirtualRadar():
+    def __init__(self, recording=None, speed=1.0, numPoints=100, numTracks=4, faultRates=None, stallTime=1.0, seed=0):
+        self.recording = recording
+        self.speed = speed
+        self.generator = FrameGenerator(numPoints, numTracks, seed=seed)
+        self.faultRates = dict(faultRates) if faultRates is not None else {}
+        for kind in self.faultRates:
+            if (kind not in FAULT_KINDS):
+                raise ValueError('Unknown fault ' + str(kind))
+        self.stallTime = stallTime
+        self.random = random.Random(seed)
+        self.framePeriod = DEFAULT_FRAME_PERIOD
+        self.cliPort = None
+        self.dataPort = None
+        self.cli = None
+        self.data = None
+        self.streaming = threading.Event()
+        self.stopEvent = threading.Event()
+        self.threads = []
+
+        # Statistics
+        self.cfgLines = []
+        self.framesSent = 0
+        self.bytesSent = 0
+        self.faultCounts = dict((kind, 0) for kind in FAULT_KINDS)
+        self.faultLog = [] # (time.monotonic(), frameNum, kind) of every injected fault
+        self.streamStartTime = None
+
+    def start(self):
+        self.cli = PtyPort()
+        self.data = PtyPort()
+        self.cliPort = self.cli.portName
+        self.dataPort = self.data.portName
+        self.stopEvent.clear()
+        self.threads = [threading.Thread(target=self._cliLoop, daemon=True), threading.Thread(target=self._dataLoop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        log.info('Virtual radar CLI port ' + self.cliPort + ', data port ' + self.dataPort)
+
+    def stop(self):
+        self.stopEvent.set()
+        self.streaming.clear()
+        for thread in self.threads:
+            thread.join()
+        self.cli.close()
+        self.data.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ================================================== CLI ==================================================
+
+    def _cliLoop(self):
+        pending = b''
+        while (not self.stopEvent.is_set()):
+            pending += self.cli.read(0.1)
+            while (b'\n' in pending):
+                line, pending = pending.split(b'\n', 1)
+                response = self.handleCommand(line.decode('ascii', 'replace').strip())
+                self.cli.write(response.encode('ascii'), self.stopEvent)
+
+    # The device echoes the line, answers it and prints the prompt again
+    def handleCommand(self, line):
+        args = line.split()
+        if (len(args) == 0):
+            return '\r\n' + CLI_PROMPT
+        if (args[0] not in CLI_COMMANDS):
+            return line + "\r\n'" + args[0] + "' is not recognized as a CLI command\r\n" + CLI_PROMPT
+        if (len(args) - 1 < CLI_COMMANDS[args[0]]):
+            return line + '\r\nError -1\r\n' + CLI_PROMPT
+
+        self.cfgLines.append(line)
+        if (args[0] == 'frameCfg'):
+            try:
+                self.framePeriod = float(args[5])
+            except ValueError:
+                return line + '\r\nError -1\r\n' + CLI_PROMPT
+        elif (args[0] == 'sensorStart'):
+            self.streamStartTime = time.monotonic()
+            self.streaming.set()
+        elif (args[0] == 'sensorStop'):
+            self.streaming.clear()
+        elif (args[0] == 'flushCfg'):
+            self.cfgLines = []
+        elif (args[0] == 'version'):
+            self.cfgLines.pop()
+            return line + '\r\n' + '\r\n'.join(VERSION_INFO) + '\r\nDone\r\n' + CLI_PROMPT
+        return line + '\r\nDone\r\n' + CLI_PROMPT
+
+    # ================================================== Data ==================================================
+
+    def _frames(self):
+        frameNum = 1
+        while (True):
+            if (self.recording is not None):
+                for timestamp, frameData in ReplaySource(self.recording, REPLAY_UNTHROTTLED):
+                    yield bytes(frameData)
+            else:
+                yield self.generator.frame(frameNum)
+                frameNum += 1
+
+    # The bytes to send for frameData, after fault injection
+    def _inject(self, frameData):
+        for kind in FAULT_KINDS:
+            if (self.random.random() >= self.faultRates.get(kind, 0)):
+                continue
+            frameNum = struct.unpack_from('I', frameData, FRAME_NUM_OFFSET)[0] if len(frameData) >= FRAME_NUM_OFFSET + 4 else -1
+            self.faultCounts[kind] += 1
+            self.faultLog.append((time.monotonic(), frameNum, kind))
+            if (kind == FAULT_DROP):
+                start = self.random.randrange(FRAME_LENGTH_OFFSET, len(frameData))
+                frameData = frameData[:start] + frameData[start + self.random.randint(1, 64):]
+            elif (kind == FAULT_TRUNCATE):
+                frameData = frameData[:self.random.randrange(FRAME_LENGTH_OFFSET, len(frameData))]
+            elif (kind == FAULT_BAD_LENGTH):
+                badLength = self.random.choice([0, self.random.randrange(len(frameData)), 0xFFFFFFFF])
+                frameData = frameData[:FRAME_LENGTH_OFFSET] + struct.pack('I', badLength) + frameData[FRAME_LENGTH_OFFSET + 4:]
+            elif (kind == FAULT_STALL):
+                self.stopEvent.wait(self.stallTime)
+        return frameData
+
+    def _dataLoop(self):
+        frames = self._frames()
+        nextFrameTime = None
+        while (not self.stopEvent.is_set()):
+            if (not self.streaming.wait(0.1)):
+                nextFrameTime = None
+                continue
+            if (self.speed > 0):
+                now = time.monotonic()
+                # Start again from now after a stall, or when the reader couldn't keep up, instead of bursting frames
+                if (nextFrameTime is None or now - nextFrameTime > self.framePeriod / 1000 / self.speed):
+                    nextFrameTime = now
+                elif (nextFrameTime > now):
+                    self.stopEvent.wait(nextFrameTime - now)
+                nextFrameTime += self.framePeriod / 1000 / self.speed
+            frameData = self._inject(next(frames))
+            if (not self.data.write(frameData, self.stopEvent)):
+                break
+            self.framesSent += 1
+            self.bytesSent += len(frameData)
+
+    def getStats(self):
+        elapsed = time.monotonic() - self.streamStartTime if self.streamStartTime is not None else 0
+        return {
+            'framesSent': self.framesSent,
+            'bytesSent': self.bytesSent,
+            'framesPerSec': self.framesSent / elapsed if elapsed > 0 else 0.0,
+            'faults': dict(self.faultCounts),
+        }
+
+# Drive an unmodified datastream.UARTParser against a VirtualRadar for duration seconds.
+# Returns the radar's stats plus what the parser saw: frames parsed per second, frames with errors, and for every
+# injected fault the recovery latency (time until the first error free frame with a later frame number was parsed)
+def loadTest(radar, cfg, duration):
+    from datastream import UARTParser
+    parser = UARTParser(type="DoubleCOMPort")
+    parser.connectComPorts(radar.cliPort, radar.dataPort)
+    parser.sendCfg(cfg)
+
+    parsed = [] # (time.monotonic(), frameNum, error)
+    startTime = time.monotonic()
+    while (time.monotonic() - startTime < duration):
+        outputDict = parser.readAndParseUartDoubleCOMPort()
+        parsed.append((time.monotonic(), outputDict.get('frameNum', -1), outputDict.get('error', 0)))
+    elapsed = time.monotonic() - startTime
+    parser.cliCom.close()
+    parser.dataCom.close()
+
+    recoveryLatencies = []
+    i = 0
+    for faultTime, faultFrameNum, kind in radar.faultLog:
+        while (i < len(parsed) and parsed[i][0] < faultTime):
+            i += 1
+        for parsedTime, frameNum, error in parsed[i:]:
+            if (error == 0 and frameNum > faultFrameNum):
+                recoveryLatencies.append(parsedTime - faultTime)
+                break
+    recoveryLatencies.sort()
+
+    results = radar.getStats()
+    results['framesParsed'] = len(parsed)
+    results['parsedPerSec'] = len(parsed) / elapsed
+    results['framesWithErrors'] = sum(1 for parsedTime, frameNum, error in parsed if error != 0)
+    results['recoveryLatencyMedian'] = recoveryLatencies[len(recoveryLatencies) // 2] if recoveryLatencies else None
+    results['recoveryLatencyMax'] = recoveryLatencies[-1] if recoveryLatencies else None
+    results['framerStats'] = parser.dataFramer.getStats()
+    return results
+
+# python virtual_radar.py [--recording path] [--speed N] [--truncate 0.01 ...]
+#   Print the port names and serve until interrupted, eg. for python main.py --cli-port ... --data-port ...
+# python virtual_radar.py --load-test 30 ...
+#   Run UARTParser against the simulator for 30 s and print the throughput and recovery latencies as JSON
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description='Simulated IWR6843 on pseudo-terminals')
+    argParser.add_argument('--recording', help='replay this recording in a loop instead of synthetic frames')
+    argParser.add_argument('--speed', type=float, default=1.0, help='N x the frameCfg rate, 0 = as fast as the reader takes frames')
+    argParser.add_argument('--points', type=int, default=100, help='points per synthetic frame')
+    argParser.add_argument('--tracks', type=int, default=4, help='tracks per synthetic frame')
+    argParser.add_argument('--stall-time', type=float, default=1.0, help='seconds of silence per stall fault')
+    for kind in FAULT_KINDS:
+        argParser.add_argument('--' + kind, type=float, default=0.0, metavar='RATE', help='probability of a %s fault per frame' % kind)
+    argParser.add_argument('--load-test', type=float, metavar='SECONDS', help='run UARTParser against the simulator and report')
+    argParser.add_argument('--cfg', default='Final_config_6m.cfg', help='cfg sent by --load-test')
+    args = argParser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    faultRates = dict((kind, getattr(args, kind)) for kind in FAULT_KINDS if getattr(args, kind) > 0)
+    radar = VirtualRadar(args.recording, args.speed, args.points, args.tracks, faultRates, args.stall_time)
+    radar.start()
+    try:
+        if (args.load_test is not None):
+            with open(args.cfg, 'r') as cfgFile:
+                cfg = cfgFile.readlines()
+            logging.getLogger('uart_framer').setLevel(logging.ERROR)
+            print(json.dumps(loadTest(radar, cfg, args.load_test), indent=4, sort_keys=True))
+        else:
+            print('CLI port:  ' + radar.cliPort)
+            print('Data port: ' + radar.dataPort)
+            while (True):
+                time.sleep(10)
+                log.info(str(radar.getStats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        radar.stop()